@@ -11,100 +11,630 @@
 
 """
 
-import json
+import argparse
+import bisect
+import gc
+import itertools
+import os
+from multiprocessing import Pool
+
+from json_stream import COMPRESSIONS, find_json, read_json, write_json
+from lazy_tree import update_node_store, write_node_store
+from movie_catalog import update_catalog, write_catalog
+from movie_records import load_movies
+from profiling import count, enable, timer
+from title_index import TitleIndex
+from tree_snapshot import write_snapshot
+
+try:
+    from movie_store import MovieStore
+except ImportError:  # NumPy is not installed
+    MovieStore = None
+
+try:
+    from similarity import SimilarityIndex
+except ImportError:  # NumPy is not installed
+    SimilarityIndex = None
+
 
 def get_categories_by_attribute(movies_info, attribute):
     """
     Get unique categories for a specified attribute in a dictionary of movie information.
 
     Parameters:
-    - movies_info (dict): A dictionary where keys are movie IDs and values are dictionaries containing movie information.
+    - movies_info (dict or MovieStore): A dictionary where keys are movie IDs and values are Movie records,
+      or a MovieStore, in which case the categories are read off its multi-hot matrix.
     - attribute (str): The attribute for which to extract categories.
 
     Returns:
     list of str: A list of unique categories for the specified attribute, sorted in alphabetical order.
     """
+    if MovieStore is not None and isinstance(movies_info, MovieStore) and attribute in movies_info.matrices:
+        return movies_info.categories(attribute)
+
     # Create a set to store categories, using a set ensures uniqueness
     categories = set()
     
     # Iterate through the movie information dictionary
     for movie_id, movie in movies_info.items():
-        # Check if the attribute exists in the movie information
-        if attribute in movie:
-            # Split the attribute value by comma if it contains a comma
-            values = movie[attribute].split(', ')
-            # Add each value to the categories set
-            categories.update(values)
+        # Multi-valued fields are tuples, the others single values
+        values = getattr(movie, attribute)
+        categories.update(values if isinstance(values, tuple) else [values])
     
     # Convert the set to a sorted list
     sorted_categories = sorted(list(categories))
     
     return sorted_categories
 
-def organize_movies_info_into_tree(movies_info):
+# Levels of the category tree, from the root down to the leaves. Any facet
+# in INDEX_FACETS can be used as a level with --levels.
+TREE_LEVELS = ['Language', 'Country', 'Genre', 'Awards']
+
+# Facets that get an inverted index
+INDEX_FACETS = TREE_LEVELS + ['Director', 'Actor', 'Decade', 'Rating']
+
+def get_movie_facets(movie):
+    '''
+    Get the values a movie has for every indexed facet.
+
+    Parameters:
+        movie (Movie): The record of a single movie.
+
+    Returns:
+        dict: Facet name -> list of values, for every facet in INDEX_FACETS.
+    '''
+    # People are only indexed when OMDb knows them
+    directors = [name for name in movie.Director if name != 'N/A']
+    actors = [name for name in movie.Actors if name != 'N/A']
+    decades = [f"{str(movie.Year)[:3]}0s"] if movie.Year is not None else []
+    # Rating bands are one point wide, e.g. '7-8', with 10 counted in '9-10'
+    rating = movie.imdbRating
+    bands = [f"{min(int(rating), 9)}-{min(int(rating), 9) + 1}"] if rating is not None else []
+
+    return {
+        'Language': list(movie.Language),
+        'Country': list(movie.Country),
+        'Genre': list(movie.Genre),
+        'Awards': [movie.Awards],
+        'Director': directors,
+        'Actor': actors,
+        'Decade': decades,
+        'Rating': bands,
+    }
+
+def get_movie_categories(movie, levels=TREE_LEVELS):
+    '''
+    Get the category values a movie is filed under at each level of the tree.
+
+    Parameters:
+        movie (Movie): The record of a single movie.
+        levels (list of str): The facets of the tree levels, from the root down.
+
+    Returns:
+        list of list of str: The values of the movie for every level, by
+        default its languages, countries, genres and awards category.
+    '''
+    facets = get_movie_facets(movie)
+    return [facets[level] for level in levels]
+
+def get_leaf_paths(categories):
+    '''
+    Expand the category values of a movie into the tree paths of its leaves.
+
+    Parameters:
+        categories (list of list of str): The result of get_movie_categories.
+
+    Returns:
+        list of tuple: One path per leaf, by default (language, country, genre, awards).
+    '''
+    return list(itertools.product(*categories))
+
+def add_to_leaf(tree, path, movie_id):
+    '''
+    Append a movie ID to a leaf, creating the nodes on the way.
+
+    Parameters:
+        tree (dict): The category tree.
+        path (tuple): The category names leading to the leaf.
+        movie_id (str): The IMDb ID to add.
+    '''
+    node = tree
+    for name in path[:-1]:
+        node = node.setdefault(name, {})
+    node.setdefault(path[-1], []).append(movie_id)
+
+# Numeric fields of the movie table, which get a presorted rank array
+SORT_KEYS = ['imdbRating', 'popularity', 'Year', 'imdbVotes']
+
+def build_rank_arrays(movies):
+    '''
+    Presort the IMDb IDs of the movie table by every key in SORT_KEYS.
+
+    Movies without a value sort first, ties are broken by IMDb ID so that
+    the order is deterministic.
+
+    Parameters:
+        movies (dict): The movie table, IMDb ID -> movie details.
+
+    Returns:
+        dict: Sort key -> list of all IMDb IDs in ascending order.
     '''
-    Organize movies information into a tree structure based on attributes.
+    return {
+        sort_key: sorted(movies, key=lambda movie_id: (movies[movie_id][sort_key] is not None,
+                                                       movies[movie_id][sort_key] or 0, movie_id))
+        for sort_key in SORT_KEYS
+    }
+
+def organize_movies_info_into_tree(movies_info, levels=TREE_LEVELS):
+    '''
+    Organize movies information into a normalized tree structure based on attributes.
+
+    Every movie is stored once in a movie table keyed by its IMDb ID, and the
+    leaves of the category tree only hold lists of those IDs. The size of the
+    result therefore grows with the number of movies, not with the number of
+    (language x country x genre x awards) combinations a movie falls into.
     
     Parameters:
-        movies_info (dict): A dictionary of movies information.
+        movies_info (dict): IMDb ID -> Movie record, see load_movies.
+        levels (list of str): The facets of the tree levels, from the root
+            down. Derived facets such as 'Decade' and 'Rating' can be used too.
         
     Returns:
-        dict: A dictionary of movies organized by attributes.
+        dict: A dictionary with three keys, 'movies' (IMDb ID -> movie details),
+        'tree' (nested categories whose leaves are lists of IMDb IDs) and
+        'ranks' (the IMDb IDs presorted by every key in SORT_KEYS).
+    '''
+    movies, tree = build_tree_shard(movies_info, movies_info, levels)
+    return {'movies': movies, 'tree': tree, 'ranks': build_rank_arrays(movies)}
+
+def build_tree_shard(movies_info, movie_ids, levels=TREE_LEVELS):
+    '''
+    Build the movie table and the category tree of some of the movies.
+
+    Parameters:
+        movies_info (dict): IMDb ID -> Movie record, see load_movies.
+        movie_ids (iterable of str): The IMDb IDs to add, in the order of movies_info.
+        levels (list of str): The facets of the tree levels, from the root down.
+
+    Returns:
+        tuple: (movie table, category tree) of those movies.
     '''
+    movies = {}
     tree = {}
-    for movie_id, movie_details in movies_info.items():
-        # Extract movie attributes
-        languages = movie_details.get('Language', 'Unknown Language').split(', ')
-        countries = movie_details.get('Country', 'Unknown Country').split(', ')
-        genres = movie_details.get('Genre', 'Unknown Genre').split(', ')
-        awards_value = movie_details.get('Awards', 'Unknown Awards')
+    leaf_entries = 0
+    for movie_id in movie_ids:
+        movie = movies_info[movie_id]
+        # Store the movie details once in the movie table
+        movies[movie_id] = movie.info()
         
-        # Determine the awards category
-        awards_category = 'Awards' if awards_value != 'N/A' else 'No Awards'
-        
-        # Create a dictionary with movie details
-        movie_info = {
-            'Title': movie_details['Title'],
-            'Year': movie_details['Year'],
-            'Director': movie_details['Director'],
-            'Actors': movie_details['Actors'],
-            'Plot': movie_details['Plot'],
-            'imdbRating': movie_details['imdbRating'],
-            'popularity': movie_details['tmdb_popularity'],
-            'imdbVotes': movie_details['imdbVotes'],
-            'Poster': movie_details['Poster'],
-        }
-        
-        # Create nested dictionaries based on attributes and awards category
-        for language in languages:
-            for country in countries:
-                for genre in genres:
-                    tree.setdefault(language, {}).setdefault(country, {}).setdefault(genre, {}).setdefault(awards_category, []).append(movie_info)
-    
-    return tree
+        # Create nested dictionaries based on the levels, the leaves only
+        # reference the movie by its ID
+        paths = get_leaf_paths(get_movie_categories(movie, levels))
+        leaf_entries += len(paths)
+        for path in paths:
+            add_to_leaf(tree, path, movie_id)
+    # The cartesian fan-out, leaf entries per movie is this over build.movies
+    count('build.movies', len(movies))
+    count('build.leaf_entries', leaf_entries)
+    return movies, tree
 
-def writeFile(filename, dict):
-    """
-    Write the contents of data to a JSON file.
+def build_facet_indexes(movies_info):
+    '''
+    Build an inverted index for every facet in INDEX_FACETS.
 
-    This function takes a filename and writes the contents of a dict
-    to a JSON file with that name. The JSON file is encoded in UTF-8 and 
-    the data is written in a formatted way with an indentation of 4 spaces.
+    Parameters:
+        movies_info (dict): IMDb ID -> Movie record, see load_movies.
 
-    Parameters
-    ----------
-    filename : str
-        The name of the file to which the data will be written. If the file
-        already exists, it will be overwritten.
-    
-    dict : dict
-        The dictionary to be written
-    """
-    with open(filename, 'w', encoding='utf-8') as file:
-        json.dump(dict, file, ensure_ascii=False, indent=4)
-
-fileName = 'movies_info_updated.json'
-with open(fileName, 'r', encoding='utf-8') as file:
-    movies_info_updated = json.load(file)
-movies_tree = organize_movies_info_into_tree(movies_info_updated)
-writeFile('movies_tree.json',movies_tree)
+    Returns:
+        dict: Facet name -> {facet value -> sorted list of IMDb IDs}.
+    '''
+    return build_index_shard(movies_info, sorted(movies_info))
+
+def build_index_shard(movies_info, movie_ids):
+    '''
+    Build the inverted indexes of some of the movies.
+
+    Parameters:
+        movies_info (dict): IMDb ID -> Movie record, see load_movies.
+        movie_ids (list of str): The sorted IMDb IDs to index.
+
+    Returns:
+        dict: Facet name -> {facet value -> sorted list of IMDb IDs}.
+    '''
+    indexes = {facet: {} for facet in INDEX_FACETS}
+    for movie_id in movie_ids:
+        for facet, values in get_movie_facets(movies_info[movie_id]).items():
+            for value in values:
+                indexes[facet].setdefault(value, []).append(movie_id)
+    return indexes
+
+def build_manifest(movies_info):
+    '''
+    Build the manifest used by the incremental builder.
+
+    Parameters:
+        movies_info (dict): IMDb ID -> Movie record, loaded with digests.
+
+    Returns:
+        dict: IMDb ID -> {'hash': content hash, 'facets': facet values}.
+    '''
+    return build_manifest_shard(movies_info, movies_info)
+
+def build_manifest_shard(movies_info, movie_ids):
+    '''
+    Build the manifest entries of some of the movies.
+
+    Parameters:
+        movies_info (dict): IMDb ID -> Movie record, loaded with digests.
+        movie_ids (iterable of str): The IMDb IDs, in the order of movies_info.
+
+    Returns:
+        dict: IMDb ID -> {'hash': content hash, 'facets': facet values}.
+    '''
+    return {
+        movie_id: {'hash': movies_info[movie_id].digest, 'facets': get_movie_facets(movies_info[movie_id])}
+        for movie_id in movie_ids
+    }
+
+# The catalog and tree levels of a build worker process, set by init_build_worker
+worker_movies_info = None
+worker_levels = TREE_LEVELS
+
+def init_build_worker(movies_info, levels=TREE_LEVELS):
+    '''
+    Give a build worker process the catalog. With the fork start method it
+    is inherited instead of being pickled.
+
+    Parameters:
+        movies_info (dict): IMDb ID -> Movie record, see load_movies.
+        levels (list of str): The facets of the tree levels, from the root down.
+    '''
+    global worker_movies_info, worker_levels
+    worker_movies_info = movies_info
+    worker_levels = levels
+    # A shard creates many small containers but no reference cycles, so
+    # garbage collection passes would only slow the worker down
+    gc.disable()
+
+def build_shard(movie_ids):
+    '''
+    Build the movie table, the category tree and the manifest of one shard in a worker.
+
+    Parameters:
+        movie_ids (list of str): The IMDb IDs of the shard, in the order of movies_info.
+
+    Returns:
+        tuple: (movie table, category tree, manifest) of the shard.
+    '''
+    movies, tree = build_tree_shard(worker_movies_info, movie_ids, worker_levels)
+    return movies, tree, build_manifest_shard(worker_movies_info, movie_ids)
+
+def index_shard(movie_ids):
+    '''
+    Build the inverted indexes of one shard in a worker.
+
+    Parameters:
+        movie_ids (list of str): The sorted IMDb IDs of the shard.
+
+    Returns:
+        dict: Facet name -> {facet value -> sorted list of IMDb IDs}.
+    '''
+    return build_index_shard(worker_movies_info, movie_ids)
+
+def split_shards(movie_ids, count):
+    '''
+    Cut a list of IMDb IDs into contiguous shards of nearly equal size.
+
+    Parameters:
+        movie_ids (list of str): The IMDb IDs.
+        count (int): The number of shards.
+
+    Returns:
+        list of list of str: The non-empty shards, in order.
+    '''
+    size = -(-len(movie_ids) // max(count, 1))
+    return [movie_ids[start:start + size] for start in range(0, len(movie_ids), max(size, 1))]
+
+def merge_tree(tree, shard_tree):
+    '''
+    Merge the category tree of a later shard into a tree, in place.
+
+    Categories keep the order in which they first appear and leaves keep
+    the order of their IDs, so merging the shards in order gives the tree
+    the serial build gives.
+
+    Parameters:
+        tree (dict): The tree of the earlier shards.
+        shard_tree (dict): The tree of the next shard.
+    '''
+    for name, child in shard_tree.items():
+        if name not in tree:
+            # Categories new to the tree are adopted as they are
+            tree[name] = child
+        elif isinstance(child, list):
+            tree[name].extend(child)
+        else:
+            merge_tree(tree[name], child)
+
+def build_in_parallel(movies_info, workers=None, levels=TREE_LEVELS):
+    '''
+    Build the tree, the manifest and the facet indexes on several processes.
+
+    The movies are cut into contiguous shards, in catalog order for the tree
+    and the manifest and in IMDb ID order for the indexes. Every worker
+    builds the partial results of a shard and the shards are merged in
+    order, so the output is identical to organize_movies_info_into_tree,
+    build_manifest and build_facet_indexes.
+
+    Parameters:
+        movies_info (dict): IMDb ID -> Movie record, see load_movies.
+        workers (int, optional): The number of processes, one per CPU by default.
+        levels (list of str): The facets of the tree levels, from the root down.
+
+    Returns:
+        tuple: (movies tree, manifest, facet indexes).
+    '''
+    workers = workers or os.cpu_count()
+    movie_ids = list(movies_info)
+    # Unpickling the shards creates millions of small containers, during
+    # which garbage collection passes cost more than the merge itself
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        with Pool(workers, initializer=init_build_worker, initargs=(movies_info, levels)) as pool:
+            tree_shards = pool.map_async(build_shard, split_shards(movie_ids, workers))
+            index_shards = pool.map(index_shard, split_shards(sorted(movie_ids), workers))
+            tree_shards = tree_shards.get()
+
+        movies, tree, manifest = {}, {}, {}
+        for shard_movies, shard_tree, shard_manifest in tree_shards:
+            movies.update(shard_movies)
+            merge_tree(tree, shard_tree)
+            manifest.update(shard_manifest)
+        indexes = {facet: {} for facet in INDEX_FACETS}
+        for shard_indexes in index_shards:
+            for facet, values in shard_indexes.items():
+                for value, ids in values.items():
+                    indexes[facet].setdefault(value, []).extend(ids)
+        ranks = build_rank_arrays(movies)
+    finally:
+        if collecting:
+            gc.enable()
+    return {'movies': movies, 'tree': tree, 'ranks': ranks}, manifest, indexes
+
+def update_facet_indexes(indexes, movie_id, old_facets, new_facets):
+    '''
+    Move one movie between the postings of the inverted indexes.
+
+    Parameters:
+        indexes (dict): The result of build_facet_indexes, updated in place.
+        movie_id (str): The IMDb ID of the movie.
+        old_facets (dict): The previous facet values, empty for an added movie.
+        new_facets (dict): The new facet values, empty for a removed movie.
+    '''
+    for facet in INDEX_FACETS:
+        old_values = set(old_facets.get(facet, []))
+        new_values = set(new_facets.get(facet, []))
+        for value in old_values - new_values:
+            postings = indexes[facet][value]
+            del postings[bisect.bisect_left(postings, movie_id)]
+            if not postings:
+                del indexes[facet][value]
+        for value in new_values - old_values:
+            bisect.insort(indexes[facet].setdefault(value, []), movie_id)
+
+def remove_from_leaf(tree, path, movie_id):
+    '''
+    Remove a movie ID from one leaf and prune the nodes left empty.
+
+    Parameters:
+        tree (dict): The category tree.
+        path (tuple): The category names leading to the leaf.
+        movie_id (str): The IMDb ID to remove.
+    '''
+    nodes = [tree]
+    for key in path[:-1]:
+        nodes.append(nodes[-1][key])
+    leaf = nodes[-1][path[-1]]
+    leaf.remove(movie_id)
+    if leaf:
+        return
+    # Walk back up and drop every node that no longer has children
+    del nodes[-1][path[-1]]
+    for depth in range(len(path) - 2, -1, -1):
+        if nodes[depth + 1]:
+            break
+        del nodes[depth][path[depth]]
+
+def update_movies_tree(movies_tree, manifest, movies_info, indexes=None, levels=TREE_LEVELS):
+    '''
+    Incrementally apply added, changed and removed movies to an existing tree.
+
+    The new movies information is compared against the manifest of the
+    previous build. Only the leaves of movies whose content hash differs are
+    touched: removed movies are taken out of their leaves, added movies are
+    appended to theirs, and changed movies are moved between leaves if their
+    categories changed. movies_tree, manifest and indexes are updated in place.
+
+    Parameters:
+        movies_tree (dict): A tree produced by organize_movies_info_into_tree.
+        manifest (dict): The manifest matching movies_tree.
+        movies_info (dict): The new IMDb ID -> Movie records, loaded with digests.
+        indexes (dict, optional): The facet indexes matching movies_tree.
+        levels (list of str): The levels movies_tree was built with.
+
+    Returns:
+        dict: The lists of 'added', 'changed' and 'removed' IMDb IDs, 'moves'
+        (IMDb ID -> (old leaf paths, new leaf paths) of all of them) and
+        'previous' (IMDb ID -> (old movie details, old facets) of the changed
+        movies).
+    '''
+    movies = movies_tree['movies']
+    tree = movies_tree['tree']
+    changes = {'added': [], 'changed': [], 'removed': [], 'moves': {}, 'previous': {}}
+
+    for movie_id in [movie_id for movie_id in manifest if movie_id not in movies_info]:
+        old_facets = manifest[movie_id]['facets']
+        old_paths = get_leaf_paths([old_facets.get(level, []) for level in levels])
+        for path in old_paths:
+            remove_from_leaf(tree, path, movie_id)
+        changes['moves'][movie_id] = (old_paths, [])
+        if indexes is not None:
+            update_facet_indexes(indexes, movie_id, old_facets, {})
+        del movies[movie_id]
+        del manifest[movie_id]
+        changes['removed'].append(movie_id)
+
+    for movie_id, movie in movies_info.items():
+        movie_hash = movie.digest
+        entry = manifest.get(movie_id)
+        if entry is not None and entry['hash'] == movie_hash:
+            continue
+
+        facets = get_movie_facets(movie)
+        old_facets = entry['facets'] if entry is not None else {}
+        new_paths = get_leaf_paths([facets[level] for level in levels])
+        old_paths = get_leaf_paths([old_facets.get(level, []) for level in levels]) if entry is not None else []
+        for path in old_paths:
+            if path not in new_paths:
+                remove_from_leaf(tree, path, movie_id)
+        for path in new_paths:
+            if path not in old_paths:
+                add_to_leaf(tree, path, movie_id)
+
+        if indexes is not None:
+            update_facet_indexes(indexes, movie_id, old_facets, facets)
+
+        changes['moves'][movie_id] = (old_paths, new_paths)
+        if entry is not None:
+            changes['previous'][movie_id] = (movies[movie_id], old_facets)
+        movies[movie_id] = movie.info()
+        manifest[movie_id] = {'hash': movie_hash, 'facets': facets}
+        changes['changed' if entry is not None else 'added'].append(movie_id)
+
+    # Resorting the parsed columns is cheap next to re-deriving the leaves
+    if any(changes.values()):
+        movies_tree['ranks'] = build_rank_arrays(movies)
+    return changes
+
+# The fields of the movie table, and the facets, each derived artifact is computed from
+TITLE_FIELDS = ['Title', 'Year']
+VECTOR_INPUTS = (['Plot', 'Director', 'Actors'], ['Genre'])
+
+def inputs_changed(changes, movies_tree, manifest, fields, facets=()):
+    '''
+    Check whether an incremental update changed the inputs of a derived artifact.
+
+    Parameters:
+        changes (dict): The result of update_movies_tree.
+        movies_tree (dict): The updated tree.
+        manifest (dict): The updated manifest.
+        fields (list of str): The fields of the movie table the artifact reads.
+        facets (list of str): The facets the artifact reads.
+
+    Returns:
+        bool: True if a movie was added or removed, or a changed movie has
+        new values for any of the fields or facets.
+    '''
+    if changes['added'] or changes['removed']:
+        return True
+    for movie_id, (old_movie, old_facets) in changes['previous'].items():
+        if any(old_movie[field] != movies_tree['movies'][movie_id][field] for field in fields):
+            return True
+        if any(old_facets.get(facet) != manifest[movie_id]['facets'][facet] for facet in facets):
+            return True
+    return False
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the movie tree from movies_info_updated.json.')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only apply movies that were added, changed or removed since the last build')
+    parser.add_argument('--levels', nargs='+', choices=INDEX_FACETS, default=TREE_LEVELS,
+                        help='the facets of the tree levels, from the root down (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes for a full build (0: one per CPU)')
+    parser.add_argument('--compress', choices=sorted(COMPRESSIONS),
+                        help='compress the JSON outputs (.gz or .zst)')
+    parser.add_argument('--profile', nargs='?', const='summary', metavar='TRACE',
+                        help='print the time of every stage at exit, and write a Chrome trace if TRACE ends in .json')
+    args = parser.parse_args()
+    if args.profile:
+        enable(args.profile)
+
+    fileName = 'movies_info_updated.json'
+    treeFileName = 'movies_tree.json'
+    manifestFileName = 'movies_tree_manifest.json'
+    indexFileName = 'movies_index.json'
+    snapshotFileName = 'movies_tree.bin'
+    nodeStoreFileName = 'movies_tree_nodes.sqlite'
+    catalogFileName = 'movies_catalog.sqlite'
+    titleIndexFileName = 'movies_title_index.json'
+    vectorsFileName = 'movies_vectors.npz'
+    with timer('build.load'):
+        movies_info_updated = load_movies(find_json(fileName) or fileName, digest=True)
+
+    changes = None
+    if args.incremental and all(find_json(name) for name in [treeFileName, manifestFileName, indexFileName]):
+        with timer('build.load_previous'):
+            stored = read_json(find_json(manifestFileName))
+        # Manifests of earlier versions are the bare movie table and record no levels
+        if stored.get('levels') == args.levels and stored.get('compress') == args.compress:
+            with timer('build.load_previous'):
+                movies_tree = read_json(find_json(treeFileName))
+                indexes = read_json(find_json(indexFileName))
+            manifest = stored['movies']
+            with timer('build.update'):
+                changes = update_movies_tree(movies_tree, manifest, movies_info_updated, indexes, args.levels)
+            print(f"Added {len(changes['added'])}, changed {len(changes['changed'])}, removed {len(changes['removed'])} movies.")
+            if not any(changes.values()):
+                raise SystemExit(0)
+        else:
+            print("The previous build used other --levels or --compress options, rebuilding everything.")
+    # Without a usable previous build, everything is built from scratch
+    if changes is None:
+        if args.workers != 1:
+            with timer('build.parallel'):
+                movies_tree, manifest, indexes = build_in_parallel(movies_info_updated, args.workers or None,
+                                                                   args.levels)
+        else:
+            with timer('build.tree'):
+                movies_tree = organize_movies_info_into_tree(movies_info_updated, args.levels)
+            with timer('build.manifest'):
+                manifest = build_manifest(movies_info_updated)
+            with timer('build.indexes'):
+                indexes = build_facet_indexes(movies_info_updated)
+
+    suffix = COMPRESSIONS[args.compress] if args.compress else ''
+    for name in [treeFileName, manifestFileName, indexFileName, titleIndexFileName]:
+        # A stale copy in another format would be found first
+        for other in ['', *COMPRESSIONS.values()]:
+            if other != suffix and os.path.exists(name + other):
+                os.remove(name + other)
+    with timer('build.write_json'):
+        write_json(treeFileName + suffix, movies_tree)
+        write_json(manifestFileName + suffix, {'levels': args.levels, 'compress': args.compress, 'movies': manifest})
+        write_json(indexFileName + suffix, indexes)
+    with timer('build.write_snapshot'):
+        write_snapshot(movies_tree, snapshotFileName)
+    # The SQLite stores are patched in place after an incremental update
+    with timer('build.write_node_store'):
+        if changes is not None and os.path.exists(nodeStoreFileName):
+            update_node_store(movies_tree, nodeStoreFileName, changes['moves'])
+        else:
+            write_node_store(movies_tree, nodeStoreFileName)
+    with timer('build.write_catalog'):
+        if changes is not None and os.path.exists(catalogFileName):
+            update_catalog(((movies_info_updated[movie_id], manifest[movie_id]['facets'])
+                            for movie_id in changes['added'] + changes['changed']),
+                           changes['removed'], catalogFileName)
+        else:
+            write_catalog(((movie, get_movie_facets(movie)) for movie in movies_info_updated.values()),
+                          catalogFileName, args.levels)
+    # The title index and the vectors are only rebuilt when their inputs changed
+    if changes is None or not find_json(titleIndexFileName) or inputs_changed(changes, movies_tree, manifest, TITLE_FIELDS):
+        with timer('build.title_index'):
+            write_json(titleIndexFileName + suffix, TitleIndex.from_movies(movies_tree['movies']).to_dict())
+    if SimilarityIndex is not None and (changes is None or not os.path.exists(vectorsFileName)
+                                        or inputs_changed(changes, movies_tree, manifest, *VECTOR_INPUTS)):
+        with timer('build.vectors'):
+            SimilarityIndex.from_movies_info(movies_info_updated).save(vectorsFileName)
@@ -11,8 +11,36 @@
 
 """
 
+import argparse
+import itertools
 import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from json_stream import write_items, write_json
+from movie_records import Movie
+from profiling import count, enable, timer
+from response_cache import ResponseCache
+
+TMDB_URL = "https://api.themoviedb.org/3"
+OMDB_URL = "http://www.omdbapi.com/"
+
+# Default requests per second sent to each API
+TMDB_RATE = 40
+OMDB_RATE = 10
+
+# Status codes worth retrying: rate limited or a temporary server failure
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Longest wait before a retry in seconds, whatever a 'Retry-After' header asks for
+MAX_RETRY_DELAY = 60
 
 def id_popularity_dict(fileName):
     """
@@ -39,7 +67,193 @@ def id_popularity_dict(fileName):
 
     return id_popularity_dict
 
-def get_imdb_id_from_tmdb(tmdb_id, tmdb_api_key):
+def positive_rate(text):
+    """
+    Parse a --tmdb-rate or --omdb-rate option.
+
+    Raises
+    ------
+    argparse.ArgumentTypeError
+        If the rate is not a positive number.
+    """
+    try:
+        rate = float(text)
+    except ValueError:
+        rate = None
+    if rate is None or not 0 < rate < float('inf'):
+        raise argparse.ArgumentTypeError(f"'{text}' is not a positive number of requests per second")
+    return rate
+
+class RateLimiter:
+    """
+    A thread-safe token bucket limiting how fast requests are sent to one API.
+
+    Parameters
+    ----------
+    rate : float
+        The number of requests allowed per second on average.
+    capacity : int, optional
+        The largest burst of requests allowed at once. Defaults to the rate.
+
+    Raises
+    ------
+    ValueError
+        If the rate is not positive.
+    """
+
+    def __init__(self, rate, capacity=None):
+        if not rate > 0:
+            raise ValueError(f"The rate must be positive, got {rate}.")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a token is available and take it.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def create_session(pool_size=10):
+    """
+    Create a requests session whose connection pool is shared by all workers.
+
+    Parameters
+    ----------
+    pool_size : int
+        The number of connections kept open per host. Should be at least the
+        number of concurrent workers.
+
+    Returns
+    -------
+    requests.Session
+        A session reusing keep-alive connections across requests.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def get_with_retry(session, url, params=None, rate_limiter=None, retries=3, backoff=0.5, timeout=10):
+    """
+    Send a GET request, retrying with exponential backoff on transient failures.
+
+    Connection errors, timeouts and the status codes in RETRY_STATUS_CODES are
+    retried. A 'Retry-After' header sent with a 429 response is honoured, up
+    to MAX_RETRY_DELAY seconds.
+
+    Parameters
+    ----------
+    session : requests.Session
+        The session used to send the request.
+    url : str
+        The URL to request.
+    params : dict, optional
+        The query string parameters.
+    rate_limiter : RateLimiter, optional
+        The token bucket of the API being called.
+    retries : int
+        The number of retries after the first attempt.
+    backoff : float
+        The delay before the first retry in seconds, doubled on every retry.
+    timeout : float
+        The timeout of a single attempt in seconds.
+
+    Returns
+    -------
+    requests.Response
+        The last response received.
+
+    Raises
+    ------
+    requests.RequestException
+        If the last attempt failed without a response.
+    """
+    name = f"http.{urlsplit(url).hostname}"
+    for attempt in range(retries + 1):
+        if rate_limiter is not None:
+            with timer('http.rate_limit_wait'):
+                rate_limiter.acquire()
+        if attempt:
+            count(f"{name}.retries")
+        delay = backoff * (2 ** attempt)
+        try:
+            with timer(name):
+                response = session.get(url, params=params, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUS_CODES or attempt == retries:
+                return response
+            retry_after = response.headers.get('Retry-After')
+            if retry_after is not None and retry_after.isascii() and retry_after.isdecimal():
+                delay = max(delay, int(retry_after))
+        time.sleep(min(delay, MAX_RETRY_DELAY))
+
+def report_progress(label, done, total):
+    """
+    Print a single, continuously updated progress line to stderr.
+
+    Parameters
+    ----------
+    label : str
+        The name of the running stage.
+    done : int
+        The number of finished items.
+    total : int
+        The total number of items.
+    """
+    end = "\n" if done == total else ""
+    print(f"\r{label}: {done}/{total}", end=end, file=sys.stderr, flush=True)
+
+def fetch_concurrently(fetch, items, max_workers=8, label=None):
+    """
+    Run a fetch function over items on a pool of worker threads.
+
+    Parameters
+    ----------
+    fetch : callable
+        A function taking one item and returning its result.
+    items : list
+        The items to fetch.
+    max_workers : int
+        The number of requests in flight at once.
+    label : str, optional
+        If given, progress is reported under this name.
+
+    Returns
+    -------
+    dict
+        A dictionary mapping each item to its result, in the order of items.
+        Items whose fetch raised an exception are left out.
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch, item): item for item in items}
+        for done, future in enumerate(as_completed(futures), start=1):
+            item = futures[future]
+            try:
+                results[item] = future.result()
+            except requests.RequestException as e:
+                print(f"Request failed for {item}: {e}", file=sys.stderr)
+            if label is not None:
+                report_progress(label, done, len(futures))
+    return {item: results[item] for item in items if item in results}
+
+def get_imdb_id_from_tmdb(tmdb_id, tmdb_api_key, session=None, rate_limiter=None, cache=None, base_url=TMDB_URL):
     """
     Retrieve the IMDb ID corresponding to a given TMDb ID using the TMDb API.
 
@@ -49,40 +263,73 @@ def get_imdb_id_from_tmdb(tmdb_id, tmdb_api_key):
         The Movie Database (TMDb) ID for the movie.
     tmdb_api_key : str
         Your personal API key for accessing the TMDb API.
+    session : requests.Session, optional
+        A pooled session to send the request with. A plain request is sent if omitted.
+    rate_limiter : RateLimiter, optional
+        The token bucket of the TMDb API.
+    cache : ResponseCache, optional
+        The response cache to look the ID up in first. Resolved IDs and 404s are stored in it.
+    base_url : str
+        The root URL of the TMDb API.
 
     Returns
     -------
     str
         The corresponding IMDb ID for the given TMDb ID. Returns an error message string if the request fails.
     """
-    url = f"https://api.themoviedb.org/3/movie/{tmdb_id}?api_key={tmdb_api_key}"
-    response = requests.get(url)
+    url = f"{base_url}/movie/{tmdb_id}"
+    params = {"api_key": tmdb_api_key}
+    if cache is not None:
+        key = cache.make_key(url, params)
+        hit, imdb_id = cache.get(key)
+        if hit:
+            return imdb_id
+
+    response = get_with_retry(session or requests, url, params=params, rate_limiter=rate_limiter)
 
     if response.status_code == 200:
         data = response.json()
-        return data.get('imdb_id')
+        imdb_id = data.get('imdb_id')
+    elif response.status_code == 404:
+        imdb_id = f"Error: {response.status_code}"
     else:
         return f"Error: {response.status_code}"
 
-def writeFile(filename, dict):
-    """
-    Write the contents of data to a JSON file.
+    if cache is not None:
+        cache.set(key, imdb_id, negative=response.status_code == 404 or not imdb_id)
+    return imdb_id
 
-    This function takes a filename and writes the contents of a dict
-    to a JSON file with that name. The JSON file is encoded in UTF-8 and 
-    the data is written in a formatted way with an indentation of 4 spaces.
+def get_imdb_ids_from_tmdb(tmdb_ids, tmdb_api_key, max_workers=8, requests_per_second=TMDB_RATE, cache=None,
+                           base_url=TMDB_URL):
+    """
+    Retrieve the IMDb IDs of many TMDb IDs concurrently.
 
     Parameters
     ----------
-    filename : str
-        The name of the file to which the data will be written. If the file
-        already exists, it will be overwritten.
-    
-    dict : dict
-        The dictionary to be written
+    tmdb_ids : list of int or str
+        The TMDb IDs to resolve.
+    tmdb_api_key : str
+        Your personal API key for accessing the TMDb API.
+    max_workers : int
+        The number of requests in flight at once.
+    requests_per_second : float
+        The rate limit applied to the TMDb API.
+    cache : ResponseCache, optional
+        The response cache shared by all lookups.
+    base_url : str
+        The root URL of the TMDb API.
+
+    Returns
+    -------
+    dict
+        A dictionary mapping each TMDb ID to the result of get_imdb_id_from_tmdb.
     """
-    with open(filename, 'w', encoding='utf-8') as file:
-        json.dump(dict, file, ensure_ascii=False, indent=4)
+    session = create_session(max_workers)
+    rate_limiter = RateLimiter(requests_per_second)
+    with session:
+        return fetch_concurrently(
+            lambda tmdb_id: get_imdb_id_from_tmdb(tmdb_id, tmdb_api_key, session, rate_limiter, cache, base_url),
+            tmdb_ids, max_workers, label="TMDb")
 
 def readFile(fileName,outputName):
     """
@@ -111,66 +358,85 @@ def readFile(fileName,outputName):
     with open(fileName, 'w', encoding='utf-8') as file:
         json.dump(outputName, file, ensure_ascii=False, indent=4)
 
-def fetch_movies_info(OMDB_key, movie_ids):
+def fetch_movie_info(OMDB_key, movie_id, session=None, rate_limiter=None, cache=None, base_url=OMDB_URL):
     """
-    Fetch and return movie information from the OMDB API for a given set of movie IDs.
+    Fetch the information of a single movie from the OMDB API.
 
     Parameters
     ----------
     OMDB_key : str
         The API key for accessing the OMDB API.
-    movie_ids : list of str
-        A list of movie IDs for which information will be fetched from the OMDB API.
+    movie_id : str
+        The IMDb ID of the movie.
+    session : requests.Session, optional
+        A pooled session to send the request with. A plain request is sent if omitted.
+    rate_limiter : RateLimiter, optional
+        The token bucket of the OMDB API.
+    cache : ResponseCache, optional
+        The response cache to look the movie up in first. Responses are stored in it.
+    base_url : str
+        The URL of the OMDB API.
 
     Returns
     -------
-    dict
-        A dictionary where each key is a movie ID and each value is the corresponding movie information. 
-        The information is in the form of a dictionary of movie details as returned by the OMDB API.
-
-    Raises
-    ------
-    requests.RequestException
-        If an error occurs during the API requests.
+    dict or None
+        The movie details as returned by the OMDB API, or None if the request failed.
     """
-    movies_info = {}
-
-    for movie_id in movie_ids:
-        url = f"http://www.omdbapi.com/?apikey={OMDB_key}&i={movie_id}"
-        try:
-            response = requests.get(url)
-
-            if response.status_code == 200:
-                movie_data = response.json()
-                movies_info[movie_id] = movie_data
-            else:
-                print(f"Error fetching data for movie ID {movie_id}: {response.status_code}")
-
-        except requests.RequestException as e:
-            print(f"Request failed: {e}")
-
-    return movies_info
-
-class Movie:
+    params = {"apikey": OMDB_key, "i": movie_id}
+    if cache is not None:
+        key = cache.make_key(base_url, params)
+        hit, movie_data = cache.get(key)
+        if hit:
+            return movie_data
+
+    response = get_with_retry(session or requests, base_url, params=params, rate_limiter=rate_limiter)
+    if response.status_code != 200:
+        print(f"Error fetching data for movie ID {movie_id}: {response.status_code}", file=sys.stderr)
+        return None
+
+    movie_data = response.json()
+    if cache is not None:
+        # OMDb answers unknown IDs with a 200 and "Response": "False"
+        cache.set(key, movie_data, negative=movie_data.get('Response') == 'False')
+    return movie_data
+
+def fetch_movies_info(OMDB_key, movie_ids, max_workers=8, requests_per_second=OMDB_RATE, cache=None,
+                      base_url=OMDB_URL):
     """
-    A class to represent a movie with various attributes.
+    Fetch and return movie information from the OMDB API for a given set of movie IDs.
+
+    The requests are sent concurrently over a pooled session and are rate
+    limited, failed requests are retried with exponential backoff.
 
     Parameters
     ----------
-    movie_data : dict
-        A dictionary containing movie attributes.
+    OMDB_key : str
+        The API key for accessing the OMDB API.
+    movie_ids : list of str
+        A list of movie IDs for which information will be fetched from the OMDB API.
+    max_workers : int
+        The number of requests in flight at once.
+    requests_per_second : float
+        The rate limit applied to the OMDB API.
+    cache : ResponseCache, optional
+        The response cache shared by all lookups.
+    base_url : str
+        The URL of the OMDB API.
 
-    Attributes
-    ----------
-    Dynamically added based on the keys in movie_data.
+    Returns
+    -------
+    dict
+        A dictionary where each key is a movie ID and each value is the corresponding movie information. 
+        The information is in the form of a dictionary of movie details as returned by the OMDB API.
+        Movies that could not be fetched are left out.
     """
-
-    def __init__(self, movie_data):
-        for key, value in movie_data.items():
-            setattr(self, key, value)
-
-    def __str__(self):
-        return f"Movie({', '.join(f'{k}: {v}' for k, v in self.__dict__.items())})"
+    session = create_session(max_workers)
+    rate_limiter = RateLimiter(requests_per_second)
+    with session:
+        results = fetch_concurrently(
+            lambda movie_id: fetch_movie_info(OMDB_key, movie_id, session, rate_limiter, cache, base_url),
+            movie_ids, max_workers, label="OMDb")
+    return {movie_id: movie_data for movie_id, movie_data in results.items() if movie_data is not None}
 
 def create_movie_objects(movie_data_dict):
     """
@@ -184,13 +450,16 @@ def create_movie_objects(movie_data_dict):
     Returns
     -------
     dict
-        A dictionary of Movie objects with keys formatted as 'movie_{movie_id}'.
+        A dictionary of Movie records with keys formatted as 'movie_{movie_id}'.
+        Unknown IDs, answered by OMDb with "Response": "False", are left out.
 
     """
     movies = {}
     for key, value in movie_data_dict.items():
+        if value.get('Response') == 'False':
+            continue
         movie_name = f"movie_{key}"
-        movies[movie_name] = Movie(value)
+        movies[movie_name] = Movie.from_omdb(key, value)
     return movies
 
 def add_popularity_to_movies(imdbPopularity_dict, movies_info):
@@ -211,24 +480,362 @@ def add_popularity_to_movies(imdbPopularity_dict, movies_info):
 
     return movies_info
 
-id_popularity_dict = id_popularity_dict('movie_ids_12_12_2023.json')
-movie_ids = list(id_popularity_dict.keys())
-movie_ids = movie_ids[:500] #sample 500 movies
+def read_tmdb_export(fileName):
+    """
+    Stream the records of the TMDb daily ID export one line at a time.
 
-tmdb_api_key = '7091325f03a84189b351cfc2a22417e0'
-IMDB_popularity_dict = {}
-for i in movie_ids:
-    IMDB_id = get_imdb_id_from_tmdb(i, tmdb_api_key)
-    if IMDB_id not in ['Error', None, '']:  # Check if a valid IMDb ID was returned
-        IMDB_popularity_dict[IMDB_id] = id_popularity_dict[i]
+    Parameters
+    ----------
+    fileName : str
+        The TMDb export, one JSON object with 'id' and 'popularity' per line.
 
-writeFile('IMDB_popularity_dict.json',IMDB_popularity_dict)
+    Yields
+    ------
+    dict
+        A record with the 'tmdb_id' and 'popularity' of one movie.
+    """
+    with open(fileName, 'r', encoding='ISO-8859-1') as file:
+        for line in file:
+            parts = json.loads(line)
+            yield {'tmdb_id': parts["id"], 'popularity': parts["popularity"]}
+
+def map_in_batches(func, records, executor, batch_size):
+    """
+    Apply a function to a stream of records on a thread pool, one batch at a time.
 
-IMDB_ids = list(IMDB_popularity_dict.keys())
-OMDB_key = 'abed733b'
-movies_info = fetch_movies_info(OMDB_key, IMDB_ids)
-writeFile('movies_info.json',movies_info)
+    Only one batch is held in memory, and the output keeps the order of the input.
 
-movies = create_movie_objects(movies_info)
-movies_info_updated = add_popularity_to_movies(IMDB_popularity_dict, movies_info)
-writeFile('movies_info_updated.json',movies_info_updated)
\ No newline at end of file
+    Parameters
+    ----------
+    func : callable
+        A function taking a record and returning the processed record.
+    records : iterable of dict
+        The input records.
+    executor : concurrent.futures.Executor
+        The pool running func.
+    batch_size : int
+        The number of records processed concurrently.
+
+    Yields
+    ------
+    dict
+        The processed records.
+    """
+    records = iter(records)
+    while True:
+        batch = list(itertools.islice(records, batch_size))
+        if not batch:
+            return
+        yield from executor.map(func, batch)
+
+def resolve_imdb_ids(records, tmdb_api_key, executor, batch_size, session=None, rate_limiter=None, cache=None,
+                     base_url=TMDB_URL):
+    """
+    Pipeline stage adding the IMDb ID of every record.
+
+    Records whose TMDb lookup fails are kept with an 'imdb_id' of None, so
+    that the checkpoint still accounts for them.
+
+    Parameters
+    ----------
+    records : iterable of dict
+        Records with a 'tmdb_id'.
+    tmdb_api_key : str
+        Your personal API key for accessing the TMDb API.
+    executor : concurrent.futures.Executor
+        The pool sending the requests.
+    batch_size : int
+        The number of lookups in flight at once.
+    session, rate_limiter, cache, base_url : optional
+        See get_imdb_id_from_tmdb.
+
+    Yields
+    ------
+    dict
+        The records with an 'imdb_id' added.
+    """
+    def resolve(record):
+        try:
+            imdb_id = get_imdb_id_from_tmdb(record['tmdb_id'], tmdb_api_key, session, rate_limiter, cache,
+                                            base_url)
+        except requests.RequestException as e:
+            print(f"Request failed for {record['tmdb_id']}: {e}", file=sys.stderr)
+            imdb_id = None
+        if not imdb_id or imdb_id.startswith('Error'):
+            imdb_id = None
+        return dict(record, imdb_id=imdb_id)
+
+    return map_in_batches(resolve, records, executor, batch_size)
+
+def fetch_omdb_info(records, OMDB_key, executor, batch_size, session=None, rate_limiter=None, cache=None,
+                    base_url=OMDB_URL):
+    """
+    Pipeline stage adding the OMDb information of every record with an IMDb ID.
+
+    Parameters
+    ----------
+    records : iterable of dict
+        Records with an 'imdb_id'.
+    OMDB_key : str
+        The API key for accessing the OMDB API.
+    executor : concurrent.futures.Executor
+        The pool sending the requests.
+    batch_size : int
+        The number of lookups in flight at once.
+    session, rate_limiter, cache, base_url : optional
+        See fetch_movie_info.
+
+    Yields
+    ------
+    dict
+        The records with a 'movie' added, None if it could not be fetched.
+    """
+    def fetch(record):
+        movie = None
+        if record['imdb_id'] is not None:
+            try:
+                movie = fetch_movie_info(OMDB_key, record['imdb_id'], session, rate_limiter, cache, base_url)
+            except requests.RequestException as e:
+                print(f"Request failed for {record['imdb_id']}: {e}", file=sys.stderr)
+        return dict(record, movie=movie)
+
+    return map_in_batches(fetch, records, executor, batch_size)
+
+def merge_popularity(records):
+    """
+    Pipeline stage copying the TMDb popularity into the movie information.
+
+    Parameters
+    ----------
+    records : iterable of dict
+        Records with a 'popularity' and a 'movie'.
+
+    Yields
+    ------
+    dict
+        The records, with 'tmdb_popularity' set on their movie.
+    """
+    for record in records:
+        if record['movie'] is not None:
+            record['movie']['tmdb_popularity'] = record['popularity']
+        yield record
+
+def count_checkpoint(checkpointName):
+    """
+    Count the complete records of a checkpoint file, dropping a partly written last line.
+
+    Parameters
+    ----------
+    checkpointName : str
+        The JSONL checkpoint written by write_checkpoint.
+
+    Returns
+    -------
+    int
+        The number of records already processed, 0 if there is no checkpoint.
+    """
+    if not os.path.exists(checkpointName):
+        return 0
+    count = 0
+    valid_size = 0
+    with open(checkpointName, 'rb') as file:
+        for line in file:
+            if not line.endswith(b'\n'):
+                break
+            count += 1
+            valid_size += len(line)
+    # A crash in the middle of a write leaves a truncated line behind
+    if valid_size != os.path.getsize(checkpointName):
+        with open(checkpointName, 'r+b') as file:
+            file.truncate(valid_size)
+    return count
+
+def write_checkpoint(records, checkpointName, batch_size=100):
+    """
+    Pipeline sink appending the records to a JSONL checkpoint file in batches.
+
+    Every batch is flushed to disk before the next one is started, so an
+    interrupted run loses at most one batch.
+
+    Parameters
+    ----------
+    records : iterable of dict
+        The finished records.
+    checkpointName : str
+        The JSONL file to append to.
+    batch_size : int
+        The number of records written per flush.
+
+    Returns
+    -------
+    int
+        The number of records written.
+    """
+    written = 0
+    records = iter(records)
+    with open(checkpointName, 'a', encoding='utf-8') as file:
+        while True:
+            batch = list(itertools.islice(records, batch_size))
+            if not batch:
+                return written
+            file.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in batch)
+            file.flush()
+            os.fsync(file.fileno())
+            written += len(batch)
+            print(f"Checkpointed {written} movies", file=sys.stderr)
+
+def read_checkpoint(checkpointName):
+    """
+    Stream the records of a checkpoint file.
+
+    Parameters
+    ----------
+    checkpointName : str
+        The JSONL checkpoint written by write_checkpoint.
+
+    Yields
+    ------
+    dict
+        One finished record per line.
+    """
+    with open(checkpointName, 'r', encoding='utf-8') as file:
+        for line in file:
+            yield json.loads(line)
+
+def run_streaming_pipeline(exportName, checkpointName, tmdb_api_key, OMDB_key, limit=None,
+                           max_workers=8, batch_size=100, cache=None, tmdb_rate=TMDB_RATE, omdb_rate=OMDB_RATE,
+                           tmdb_url=TMDB_URL, omdb_url=OMDB_URL):
+    """
+    Enrich the TMDb export with constant memory, resuming from the last checkpoint.
+
+    The stages are chained generators: read export -> resolve IMDb ID ->
+    fetch OMDb -> merge popularity -> checkpoint. Records are checkpointed
+    in export order, so a restart skips as many export lines as there are
+    records in the checkpoint.
+
+    Parameters
+    ----------
+    exportName : str
+        The TMDb daily ID export.
+    checkpointName : str
+        The JSONL checkpoint file, created if missing.
+    tmdb_api_key : str
+        Your personal API key for accessing the TMDb API.
+    OMDB_key : str
+        The API key for accessing the OMDB API.
+    limit : int, optional
+        The number of export records to process in total. All if omitted.
+    max_workers : int
+        The number of concurrent requests per API.
+    batch_size : int
+        The number of records per batch and per checkpoint flush.
+    cache : ResponseCache, optional
+        The response cache shared by all lookups.
+    tmdb_rate, omdb_rate : float
+        The requests per second sent to the TMDb and OMDb APIs.
+    tmdb_url, omdb_url : str
+        The URLs of the TMDb and OMDb APIs.
+
+    Returns
+    -------
+    int
+        The number of records processed by this run.
+    """
+    done = count_checkpoint(checkpointName)
+    if done:
+        print(f"Resuming after {done} checkpointed movies", file=sys.stderr)
+    records = itertools.islice(read_tmdb_export(exportName), done, limit)
+
+    session = create_session(max_workers)
+    with session, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        records = resolve_imdb_ids(records, tmdb_api_key, executor, batch_size, session, RateLimiter(tmdb_rate),
+                                   cache, tmdb_url)
+        records = fetch_omdb_info(records, OMDB_key, executor, batch_size, session, RateLimiter(omdb_rate),
+                                  cache, omdb_url)
+        records = merge_popularity(records)
+        return write_checkpoint(records, checkpointName, batch_size)
+
+def write_checkpoint_outputs(checkpointName, popularityName, moviesName):
+    """
+    Write IMDB_popularity_dict.json and movies_info_updated.json from a checkpoint.
+
+    The records are streamed from the checkpoint, once per output, and
+    written one entry at a time, so the outputs are never held in memory as
+    a whole. Only the IMDb IDs written so far are kept. When several TMDb
+    IDs map to the same IMDb ID, the first record is written and the others
+    are skipped, so that the outputs have no duplicate keys.
+
+    Parameters
+    ----------
+    checkpointName : str
+        The JSONL checkpoint written by write_checkpoint.
+    popularityName : str
+        The output file mapping IMDb IDs to TMDb popularity.
+    moviesName : str
+        The output file mapping IMDb IDs to movie information.
+    """
+    def found():
+        written = set()
+        for record in read_checkpoint(checkpointName):
+            if record['movie'] is None or record['movie'].get('Response') == 'False':
+                continue
+            if record['imdb_id'] not in written:
+                written.add(record['imdb_id'])
+                yield record
+
+    write_items(popularityName, ((record['imdb_id'], record['popularity']) for record in found()), indent=4)
+    write_items(moviesName, ((record['imdb_id'], record['movie']) for record in found()), indent=4)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fetch movie information from TMDb and OMDb.')
+    parser.add_argument('--limit', type=int, default=500, help='number of movies to sample from the TMDb export')
+    parser.add_argument('--workers', type=int, default=8, help='number of concurrent requests per API')
+    parser.add_argument('--stream', action='store_true',
+                        help='stream the export through a resumable pipeline checkpointed to movies_checkpoint.jsonl')
+    parser.add_argument('--all', action='store_true', help='with --stream, process the whole export instead of --limit movies')
+    parser.add_argument('--tmdb-rate', type=positive_rate, default=TMDB_RATE, help='requests per second sent to TMDb')
+    parser.add_argument('--omdb-rate', type=positive_rate, default=OMDB_RATE, help='requests per second sent to OMDb')
+    parser.add_argument('--tmdb-url', default=TMDB_URL, help='the root URL of the TMDb API')
+    parser.add_argument('--omdb-url', default=OMDB_URL, help='the URL of the OMDb API')
+    parser.add_argument('--profile', nargs='?', const='summary', metavar='TRACE',
+                        help='print API latencies and cache hits at exit, and write a Chrome trace if TRACE ends in .json')
+    args = parser.parse_args()
+    if args.profile:
+        enable(args.profile)
+
+    cache = ResponseCache('http_cache.sqlite')
+    tmdb_api_key = '7091325f03a84189b351cfc2a22417e0'
+    OMDB_key = 'abed733b'
+
+    if args.stream:
+        run_streaming_pipeline('movie_ids_12_12_2023.json', 'movies_checkpoint.jsonl', tmdb_api_key, OMDB_key,
+                               limit=None if args.all else args.limit, max_workers=args.workers, cache=cache,
+                               tmdb_rate=args.tmdb_rate, omdb_rate=args.omdb_rate,
+                               tmdb_url=args.tmdb_url, omdb_url=args.omdb_url)
+        write_checkpoint_outputs('movies_checkpoint.jsonl', 'IMDB_popularity_dict.json', 'movies_info_updated.json')
+        raise SystemExit(0)
+
+    tmdb_popularity_dict = id_popularity_dict('movie_ids_12_12_2023.json')
+    movie_ids = list(tmdb_popularity_dict.keys())
+    movie_ids = movie_ids[:args.limit] #sample 500 movies
+
+    IMDB_popularity_dict = {}
+    with timer('pipeline.tmdb'):
+        imdb_ids = get_imdb_ids_from_tmdb(movie_ids, tmdb_api_key, max_workers=args.workers,
+                                          requests_per_second=args.tmdb_rate, cache=cache, base_url=args.tmdb_url)
+    for i, IMDB_id in imdb_ids.items():
+        if IMDB_id and not IMDB_id.startswith('Error'):  # Check if a valid IMDb ID was returned
+            IMDB_popularity_dict[IMDB_id] = tmdb_popularity_dict[i]
+
+    write_json('IMDB_popularity_dict.json', IMDB_popularity_dict, indent=4)
+
+    IMDB_ids = list(IMDB_popularity_dict.keys())
+    with timer('pipeline.omdb'):
+        movies_info = fetch_movies_info(OMDB_key, IMDB_ids, max_workers=args.workers,
+                                        requests_per_second=args.omdb_rate, cache=cache, base_url=args.omdb_url)
+    write_json('movies_info.json', movies_info, indent=4)
+    print(f"Cache hits: {cache.hits}, misses: {cache.misses}")
+
+    movies = create_movie_objects(movies_info)
+    movies_info_updated = add_popularity_to_movies(IMDB_popularity_dict, movies_info)
+    write_json('movies_info_updated.json', movies_info_updated, indent=4)
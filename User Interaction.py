@@ -11,130 +11,54 @@
 
 """
 
-import json
-import requests
+import argparse
+from collections.abc import Mapping
 
-def get_wikipedia_summary(movie_title):
-    """
-    Fetches the Wikipedia summary for a given movie title.
+from profiling import enable
+from recommendation_engine import PAGE_SIZE, RecommendationEngine, run_batch
+
+# Number of listed movies whose summaries are fetched in the background
+PREFETCH_SUMMARIES = 20
 
-    This function queries the Wikipedia API to retrieve the introductory
-    extract of a Wikipedia page corresponding to the provided movie title.
-    If the data is successfully fetched and a summary is available, it is returned.
-    Otherwise, appropriate error messages are printed, and an empty string is returned.
+# Number of similar movies offered after a summary
+SIMILAR_MOVIES = 5
+
+def format_value(value):
+    """
+    Format a movie field for display, showing missing numbers as 'N/A'.
 
     Parameters
     ----------
-    movie_title : str
-        The title of the movie for which the Wikipedia summary is to be fetched.
+    value : str, int, float or None
+        The value of the field.
 
     Returns
     -------
     str
-        The introductory extract of the Wikipedia page of the movie, if available.
-        Returns an empty string if no extract is found or if there's an error in data fetching.
-
-    Notes
-    -----
-    The function makes an HTTP GET request to the Wikipedia API. Ensure that the
-    network connection is active while using this function. If the movie title does
-    not correspond to a Wikipedia page, or if there is an issue with the API request,
-    the function will print an error message and return an empty string.
+        The text to print.
     """
-    endpoint = "https://en.wikipedia.org/w/api.php"
-    params = {
-        "action": "query",
-        "format": "json",
-        "titles": movie_title,
-        "prop": "extracts",
-        "exintro": True,
-        "explaintext": True,
-    }
-    response = requests.get(endpoint, params=params)
-    data = response.json()
-
-    # Check if the 'pages' field is in the response and if it contains data
-    if "query" in data and "pages" in data["query"]:
-        page = next(iter(data["query"]["pages"].values()))
-        # Check if a page with a valid extract was found
-        if "extract" in page:
-            return page["extract"]
-        else:
-            print(f"No summary available for '{movie_title}'.")
-    else:
-        print(f"Failed to fetch data for '{movie_title}'.")
-
-    return ""
-
-
-def recommend_movie(movie_tree):
+    return 'N/A' if value is None else str(value)
+
+def recommend_movie(engine):
     """
     Interactively recommend movies based on a hierarchical movie tree structure.
 
     This function allows a user to navigate through a tree of movie categories,
     offering options to list, sort, and select movies for more information. The user
-    can choose to exit the recommendation system at any point.
+    can choose to exit the recommendation system at any point. Listings are
+    printed PAGE_SIZE movies at a time, the next page only on request. All
+    lookups go through the engine, this function only prompts and prints.
 
     Parameters
     ----------
-    movie_tree : dict or list
-        The hierarchical structure of movie categories. Each node in the tree
-        is either a dictionary representing a category with subcategories or
-        a list of movies.
+    engine : RecommendationEngine
+        The engine holding the movie tree and the optional title index,
+        movie store and similarity vectors.
 
     Returns
     -------
     None
     """
-    def collect_movies(node):
-        """
-        Recursively collects movies from a subtree of the movie tree.
-
-        Parameters
-        ----------
-        node : dict or list
-            A subtree of the movie tree, either a dictionary of subcategories
-            or a list of movies.
-
-        Returns
-        -------
-        list
-            A list of movies collected from the subtree.
-        """
-        if isinstance(node, list):
-            return [movie for movie in node]
-        else:
-            movies = []
-            for key in node:
-                movies.extend(collect_movies(node[key]))
-            return movies
-
-    def sort_movies(movies, sort_key, ascending):
-        """
-        Sorts a list of movies based on a specified key and order.
-
-        Parameters
-        ----------
-        movies : list
-            The list of movies to be sorted.
-        sort_key : str
-            The key to sort the movies by (e.g., 'year', 'imdbrating').
-        ascending : bool
-            The order of sorting (True for ascending, False for descending).
-
-        Returns
-        -------
-        list
-            The sorted list of movies.
-        """
-        for movie in movies:
-            if sort_key == 'year':
-                movie[sort_key] = int(movie[sort_key])
-            elif sort_key == 'imdbrating':
-                movie[sort_key] = float(movie[sort_key])
-
-        return sorted(movies, key=lambda x: x[sort_key], reverse=not ascending)
-
     def validate_input(prompt, valid_options):
         """
         Validates user input against a set of valid options.
@@ -156,53 +80,85 @@ def recommend_movie(movie_tree):
             if user_input in valid_options:
                 return user_input
             print("Invalid input. Please try again.")
-    
-    def deduplicate_movies(movies):
+
+    def show_summary(movie_selected):
         """
-        Removes duplicate movies from the list based on title and year.
+        Prints the summary of a movie, waiting only if its prefetch is not done yet.
+
+        With a title index the name is first resolved to a movie of the
+        catalog. If it does not match a title exactly, ranked suggestions are
+        offered, and names matching nothing are not sent to Wikipedia at all.
 
         Parameters
         ----------
-        movies : list
-            The list of movies from which duplicates need to be removed.
-
-        Returns
-        -------
-        list
-            The list of unique movies.
+        movie_selected : str
+            The name of the movie entered by the user.
         """
-        unique_movies = []
-        seen = set()
-        for movie in movies:
-            identifier = (movie['Title'], movie['Year'])
-            if identifier not in seen:
-                seen.add(identifier)
-                unique_movies.append(movie)
-        return unique_movies
-    
-    current_node = movie_tree
+        title_index = engine.title_index
+        if title_index is None:
+            if not engine.prefetcher.ready(movie_selected):
+                print("Please wait...")
+            print(engine.prefetcher.get(movie_selected))
+            return
 
-    while isinstance(current_node, dict):
+        # An exact title settles the search at once, suggestions are only ranked otherwise
+        matches = engine.search(movie_selected, limit=1)
+        if not matches:
+            print(f"No movie called '{movie_selected}' was found in the catalog.")
+            return
+        movie_id = matches[0]
+        if not title_index.is_exact(movie_selected, movie_id):
+            matches = engine.search(movie_selected)
+            print("Did you mean:")
+            for index, match in enumerate(matches, start=1):
+                title, year = title_index.titles[match]
+                print(f"{index}. {title} ({format_value(year)})")
+            choice = input("Enter the number of the movie (or press Enter to cancel): ")
+            if not choice.isdigit() or int(choice) - 1 not in range(len(matches)):
+                return
+            movie_id = matches[int(choice) - 1]
+
+        if not engine.summary_ready(movie_id):
+            print("Please wait...")
+        summary = engine.summary(movie_id)
+        print(summary or f"No summary available for '{title_index.titles[movie_id][0]}'.")
+
+        if engine.similarity is not None and movie_id in engine.similarity.rows:
+            if validate_input("Do you want to see similar movies? (yes/no): ", ['yes', 'no']) == 'yes':
+                for similar_id, score in engine.similar(movie_id, SIMILAR_MOVIES):
+                    movie = engine.movies[similar_id]
+                    print(f"Title: {movie['Title']}, Year: {format_value(movie['Year'])}, Director: {movie['Director']}, Similarity: {score:.2f}")
+
+    path = ()
+    current_node = engine.node(path)
+
+    while isinstance(current_node, Mapping):
         print_option = validate_input("\nDo you want to list all movies in this category? (yes/no): ", ['yes', 'no'])
         if print_option == 'yes':
-            all_movies = collect_movies(current_node)
-            all_movies = deduplicate_movies(all_movies)
-
-            sort_key = validate_input("Sort movies by (imdbRating/popularity/Year): ", ['imdbRating', 'popularity', 'Year'])
+            sort_key = validate_input("Sort movies by (imdbRating/popularity/Year/imdbVotes): ", ['imdbRating', 'popularity', 'Year', 'imdbVotes'])
             order = validate_input("Sort order (ascending/descending): ", ['ascending', 'descending'])
             ascending = order == 'ascending'
 
-            sorted_movies = sort_movies(all_movies, sort_key, ascending)
+            # Only one page is selected and printed at a time, the cursor fetches the next one
+            cursor = None
+            while True:
+                page_ids, cursor = engine.page(path, sort_key, ascending, cursor, PAGE_SIZE)
 
-            for movie in sorted_movies:
-                print(f"Title: {movie['Title']}, Year: {movie['Year']}, Director: {movie['Director']}, Actors: {movie['Actors']}, IMDb Rating: {movie['imdbRating']}, Popularity: {movie['popularity']}")
+                # The page is the most likely pick, fetch its summaries while the user reads
+                engine.prefetch_summaries(page_ids[:PREFETCH_SUMMARIES])
+
+                for movie_id in page_ids:
+                    movie = engine.movies[movie_id]
+                    print(f"Title: {movie['Title']}, Year: {format_value(movie['Year'])}, Director: {movie['Director']}, Actors: {movie['Actors']}, IMDb Rating: {format_value(movie['imdbRating'])}, Popularity: {format_value(movie['popularity'])}")
+                if cursor is None:
+                    break
+                if validate_input(f"Show the next {PAGE_SIZE} movies? (yes/no): ", ['yes', 'no']) == 'no':
+                    break
 
             ifInterested = input("Are you interested in some movies that you want to explore more? Answer yes/no: ")
             if ifInterested.lower() == 'yes':
                 movie_selected = input("Please enter the name of the movie: ")
-                print("Please wait...")
-                summary = get_wikipedia_summary(movie_selected)
-                print(summary)
+                show_summary(movie_selected)
     
                 decision = input("Have you decided the movie to watch? Answer yes/no: ")
                 if decision.lower() == 'yes':
@@ -216,10 +172,11 @@ def recommend_movie(movie_tree):
                         return
 
         # Print the options at the current level
-        options = list(current_node.keys())
+        options = engine.options(path)
+        counts = engine.counts(path)
         print("\nSelect an option:")
         for index, option in enumerate(options, start=1):
-            print(f"{index}. {option}")
+            print(f"{index}. {option} ({counts[option]} movies)")
 
         # Get and process user input
         choice = input("Enter your choice (or type 'exit' to quit): ")
@@ -230,7 +187,8 @@ def recommend_movie(movie_tree):
         try:
             choice_index = int(choice) - 1
             if choice_index in range(len(options)):
-                current_node = current_node[options[choice_index]]
+                path = path + (options[choice_index],)
+                current_node = engine.node(path)
             else:
                 print("Invalid choice. Please try again.")
         except ValueError:
@@ -239,14 +197,14 @@ def recommend_movie(movie_tree):
     # Display movie details at the leaf node
     if isinstance(current_node, list):
         print("\nAvailable movies:")
-        for movie in current_node:
-            print(f"Title: {movie['Title']}, Year: {movie['Year']}, Director: {movie['Director']}, Actors: {movie['Actors']}")
+        engine.prefetch_summaries(current_node[:PREFETCH_SUMMARIES])
+        for movie_id in current_node:
+            movie = engine.movies[movie_id]
+            print(f"Title: {movie['Title']}, Year: {format_value(movie['Year'])}, Director: {movie['Director']}, Actors: {movie['Actors']}")
             ifInterested = input("Are you interested in some movies that you want to explore more? Answer yes/no: ")
             if ifInterested.lower() == 'yes':
                 movie_selected = input("Please enter the name of the movie: ")
-                print("Please wait...")
-                summary = get_wikipedia_summary(movie_selected)
-                print(summary)
+                show_summary(movie_selected)
     
                 decision = input("Have you decided the movie to watch? Answer yes/no: ")
                 if decision.lower() == 'yes':
@@ -257,9 +215,35 @@ def recommend_movie(movie_tree):
                     print("Bye!")
                     return
 
-fileName = 'movies_tree.json'
-with open(fileName, 'r', encoding='utf-8') as file:
-    movies_tree = json.load(file)
-    
-print("Welcom to this movie recommendation system!")
-recommend_movie(movies_tree)
\ No newline at end of file
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Interactive movie recommendation system.')
+    parser.add_argument('--backend', choices=['snapshot', 'nodes', 'sql', 'json'],
+                        help='read the memory-mapped movies_tree.bin (default if it exists), fetch nodes lazily '
+                             'from movies_tree_nodes.sqlite, query the catalog in movies_catalog.sqlite, '
+                             'or load movies_tree.json')
+    parser.add_argument('--levels', nargs='+', metavar='FACET',
+                        help='browse in another order of facets, e.g. --levels Genre Decade Rating')
+    parser.add_argument('--batch', metavar='QUERIES',
+                        help='answer a JSONL file of queries instead of starting the interactive system')
+    parser.add_argument('--output', default='recommendations.jsonl',
+                        help='the JSONL file the batch results are written to')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of batch worker processes (default: one per CPU)')
+    parser.add_argument('--profile', nargs='?', const='summary', metavar='TRACE',
+                        help='print where the session spent its time at exit, and write a Chrome trace if TRACE ends in .json')
+    args = parser.parse_args()
+    if args.profile:
+        enable(args.profile)
+
+    if args.batch:
+        count = run_batch(args.batch, args.output, args.backend, args.workers)
+        print(f"Answered {count} queries into '{args.output}'.")
+        raise SystemExit(0)
+
+    engine = RecommendationEngine.load(args.backend)
+
+    print("Welcom to this movie recommendation system!")
+    try:
+        recommend_movie(engine.with_levels(args.levels) if args.levels else engine)
+    finally:
+        engine.close()
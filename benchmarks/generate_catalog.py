@@ -0,0 +1,185 @@
+"""
+############################## Final Projec: Synthetic Catalog ############################
+
+Generate OMDb-shaped movie catalogs of any size for the benchmarks.
+
+The movies have every field of movies_info_updated.json. Language, Country
+and Genre are multi-valued. The number of values per movie and the
+frequency of each value follow the collected catalog: English, the United
+States and Drama dominate, followed by a long tail that grows with the
+catalog, so the tree gets realistically wider as it grows. The output is
+deterministic for a given size and seed.
+
+Usage:
+    python benchmarks/generate_catalog.py --size 100000 --output catalog_100000.json
+
+"""
+
+import argparse
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from json_stream import write_json
+
+# (value, weight) pairs taken from the collected catalog
+LANGUAGES = [
+    ('English', 409), ('German', 100), ('French', 96), ('Spanish', 69), ('Italian', 53), ('Russian', 31),
+    ('Latin', 24), ('Japanese', 22), ('Polish', 15), ('Arabic', 14), ('Hebrew', 14), ('Mandarin', 11),
+    ('Swedish', 10), ('Danish', 10), ('Portuguese', 10), ('Cantonese', 8), ('Hindi', 7), ('Greek', 7),
+    ('Dutch', 6), ('Korean', 6), ('Turkish', 5), ('Czech', 5), ('Hungarian', 4), ('Finnish', 4),
+]
+COUNTRIES = [
+    ('United States', 335), ('United Kingdom', 84), ('France', 81), ('Germany', 77), ('Italy', 31),
+    ('Canada', 22), ('Japan', 16), ('Sweden', 15), ('Spain', 15), ('Poland', 13), ('Denmark', 12),
+    ('Austria', 10), ('West Germany', 9), ('Switzerland', 6), ('New Zealand', 6), ('Australia', 6),
+    ('Ireland', 5), ('India', 5), ('South Korea', 5), ('Hong Kong', 5), ('China', 4), ('Belgium', 4),
+]
+GENRES = [
+    ('Drama', 304), ('Comedy', 125), ('Crime', 111), ('Action', 108), ('Romance', 97), ('Adventure', 93),
+    ('Thriller', 78), ('Mystery', 57), ('Sci-Fi', 53), ('Fantasy', 30), ('Horror', 30), ('Music', 24),
+    ('Biography', 21), ('Documentary', 16), ('Animation', 14), ('History', 13), ('Family', 12), ('War', 12),
+    ('Short', 9), ('Western', 9), ('Sport', 5), ('Film-Noir', 5), ('Musical', 4), ('News', 1),
+]
+
+# Number of values per movie -> weight, taken from the collected catalog
+LANGUAGE_COUNTS = {1: 245, 2: 114, 3: 71, 4: 34, 5: 21, 6: 7, 7: 3, 8: 1, 9: 1}
+COUNTRY_COUNTS = {1: 317, 2: 115, 3: 36, 4: 16, 5: 8, 6: 2, 8: 1, 9: 1, 11: 1}
+GENRE_COUNTS = {1: 51, 2: 158, 3: 288}
+
+# Share of movies without awards
+NO_AWARDS = 0.05
+
+WORDS = '''
+love war city night family secret world life death man woman young old dark
+return journey last first lost king queen son daughter father mother brother
+sister friend enemy house road river island town school money power truth
+lie dream game story time day year home heart blood fire water stone star
+sky sea mountain forest island ghost killer detective soldier doctor thief
+'''.split()
+
+
+def long_tail(table, prefix, size, share=0.05):
+    """
+    Extend a (value, weight) table with rare values, more of them for bigger catalogs.
+
+    Parameters
+    ----------
+    table : list of tuple
+        The common values and their weights.
+    prefix : str
+        The name of the generated values, e.g. 'Language' gives 'Language 17'.
+    size : int
+        The number of movies of the catalog.
+    share : float
+        The share of all picks that go to the tail.
+
+    Returns
+    -------
+    tuple
+        (values, cumulative weights) for random.choices.
+    """
+    values = [value for value, weight in table]
+    weights = [weight for value, weight in table]
+    # The vocabulary of a catalog grows roughly with the square root of its size
+    tail = max(1, int(size ** 0.5) // 4)
+    total = sum(weights) * share
+    harmonic = sum(1 / rank for rank in range(1, tail + 1))
+    values += [f'{prefix} {rank}' for rank in range(1, tail + 1)]
+    weights += [total / (rank * harmonic) for rank in range(1, tail + 1)]
+    cumulative = []
+    running = 0
+    for weight in weights:
+        running += weight
+        cumulative.append(running)
+    return values, cumulative
+
+
+def pick(rng, values, cumulative, counts):
+    """
+    Pick distinct values, their number drawn from a count distribution.
+    """
+    count = rng.choices(list(counts), weights=list(counts.values()))[0]
+    count = min(count, len(values))
+    chosen = []
+    while len(chosen) < count:
+        value = rng.choices(values, cum_weights=cumulative)[0]
+        if value not in chosen:
+            chosen.append(value)
+    return chosen
+
+
+def generate_catalog(size, seed=0):
+    """
+    Generate an OMDb-shaped catalog.
+
+    Parameters
+    ----------
+    size : int
+        The number of movies.
+    seed : int
+        The seed of the random generator.
+
+    Returns
+    -------
+    dict
+        IMDb ID -> movie information, shaped like movies_info_updated.json.
+    """
+    rng = random.Random(seed)
+    languages = long_tail(LANGUAGES, 'Language', size)
+    countries = long_tail(COUNTRIES, 'Country', size)
+    genres = long_tail(GENRES, 'Genre', size, share=0.01)
+    people = max(50, size // 3)
+
+    catalog = {}
+    for number in range(size):
+        imdb_id = f'tt{number + 1:07d}'
+        year = rng.randint(1920, 2023)
+        rating = round(min(9.5, max(1.5, rng.gauss(6.6, 1.0))), 1)
+        votes = int(rng.lognormvariate(9, 2))
+        awards = 'N/A' if rng.random() < NO_AWARDS else f'{rng.randint(1, 30)} wins & {rng.randint(0, 60)} nominations'
+        title = ' '.join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(1, 4)))
+        catalog[imdb_id] = {
+            'Title': title,
+            'Year': str(year),
+            'Rated': rng.choice(['G', 'PG', 'PG-13', 'R', 'Not Rated', 'Passed']),
+            'Released': f'{rng.randint(1, 28):02d} Jan {year}',
+            'Runtime': f'{rng.randint(70, 180)} min',
+            'Genre': ', '.join(pick(rng, *genres, GENRE_COUNTS)),
+            'Director': f'Director {rng.randrange(people // 5 + 1)}',
+            'Writer': ', '.join(f'Writer {rng.randrange(people)}' for _ in range(rng.randint(1, 3))),
+            'Actors': ', '.join(f'Actor {rng.randrange(people)}' for _ in range(3)),
+            'Plot': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(12, 30))).capitalize() + '.',
+            'Language': ', '.join(pick(rng, *languages, LANGUAGE_COUNTS)),
+            'Country': ', '.join(pick(rng, *countries, COUNTRY_COUNTS)),
+            'Awards': awards,
+            'Poster': f'https://example.com/posters/{imdb_id}.jpg',
+            'Ratings': [{'Source': 'Internet Movie Database', 'Value': f'{rating}/10'}],
+            'Metascore': 'N/A',
+            'imdbRating': str(rating),
+            'imdbVotes': f'{votes:,}',
+            'imdbID': imdb_id,
+            'Type': 'movie',
+            'DVD': 'N/A',
+            'BoxOffice': 'N/A',
+            'Production': 'N/A',
+            'Website': 'N/A',
+            'Response': 'True',
+            'tmdb_popularity': round(rng.lognormvariate(2.5, 1.0), 3),
+        }
+    return catalog
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic OMDb-shaped movie catalog.')
+    parser.add_argument('--size', type=int, default=10000, help='number of movies')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random generator')
+    parser.add_argument('--output', default=None, help='the JSON file to write (default: catalog_<size>.json)')
+    args = parser.parse_args()
+
+    fileName = args.output or f'catalog_{args.size}.json'
+    write_json(fileName, generate_catalog(args.size, args.seed))
+    print(f"Wrote {args.size} movies to '{fileName}'.")
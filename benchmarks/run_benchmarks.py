@@ -0,0 +1,281 @@
+"""
+############################## Final Projec: Benchmarks ############################
+
+Time and memory-profile the build, serialization, load and listing stages
+on synthetic catalogs, and write the results as JSON.
+
+Every stage is timed over a few repeats without tracing (the best time is
+kept), then run once more under tracemalloc to record its peak memory. The
+results file holds one record per catalog size and stage, plus the Python
+version, the platform and the git revision, so that runs of different
+versions can be compared with --baseline.
+
+Usage:
+    python benchmarks/run_benchmarks.py --sizes 1000 10000 100000 --output results.json
+    python benchmarks/run_benchmarks.py --sizes 1000 10000 --baseline results.json
+
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generate_catalog import generate_catalog
+from json_stream import iter_json_items, read_json, write_json
+from lazy_tree import NodeStore, write_node_store
+from movie_catalog import MovieCatalog, write_catalog
+from movie_records import load_movies
+from recommendation_engine import RecommendationEngine
+from tree_snapshot import TreeSnapshot, write_snapshot
+
+try:
+    from movie_store import MovieStore
+except ImportError:  # NumPy is not installed, the store stages are skipped
+    MovieStore = None
+
+# Ratio above which a stage is reported as slower than the baseline
+REGRESSION_THRESHOLD = 1.2
+
+# Stages faster than this in both runs are too noisy to compare
+MIN_COMPARED_SECONDS = 0.001
+
+# Movies of the first page of a listing
+PAGE_SIZE = 20
+
+# The file written by each serialization stage
+OUTPUT_FILES = {
+    'serialize.json': 'movies_tree.json',
+    'serialize.snapshot': 'movies_tree.bin',
+    'serialize.nodes': 'movies_tree_nodes.sqlite',
+    'serialize.sql': 'movies_catalog.sqlite',
+}
+
+
+def load_script(fileName, name):
+    """
+    Import one of the scripts of the project, whose file names contain spaces.
+
+    Parameters
+    ----------
+    fileName : str
+        The file name, relative to the project directory.
+    name : str
+        The module name to give it.
+
+    Returns
+    -------
+    module
+        The imported module.
+    """
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, fileName))
+    module = importlib.util.module_from_spec(spec)
+    # Worker processes find the functions of the module by its name
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+build_trees = load_script('Build Trees.py', 'build_trees')
+
+
+def listing(engine, path, limit=None):
+    """
+    List every movie below a node, or the first page, sorted by rating, as the menu does.
+    """
+    return engine.listing(path, sort_key='imdbRating', ascending=False, limit=limit)
+
+
+def define_stages(directory):
+    """
+    Define the benchmarked stages.
+
+    Each stage is a (name, function) pair. The function takes the shared
+    state dictionary, in which the earlier stages left their results, and
+    returns its own result, which is stored under the stage name.
+
+    Parameters
+    ----------
+    directory : str
+        The directory the files are written to.
+
+    Returns
+    -------
+    list of tuple
+        The stages, in order.
+    """
+    catalogFileName = os.path.join(directory, 'catalog.json')
+    treeFileName = os.path.join(directory, 'movies_tree.json')
+    snapshotFileName = os.path.join(directory, 'movies_tree.bin')
+    nodeStoreFileName = os.path.join(directory, 'movies_tree_nodes.sqlite')
+    sqlFileName = os.path.join(directory, 'movies_catalog.sqlite')
+
+    def cold_listing(backend, language, limit=None):
+        def run(state):
+            # A fresh engine, so that nothing is memoized yet
+            store = state.get('build.store') if backend == 'json' else None
+            engine = RecommendationEngine(state[f'load.{backend}'], store=store)
+            tree = state['build.tree']['tree']
+            path = (max(tree, key=lambda name: len(tree[name])),) if language else ()
+            return listing(engine, path, limit)
+        return run
+
+    stages = [
+        ('load.catalog', lambda state: load_movies(catalogFileName, digest=True)),
+        ('build.tree', lambda state: build_trees.organize_movies_info_into_tree(state['load.catalog'])),
+        ('build.indexes', lambda state: build_trees.build_facet_indexes(state['load.catalog'])),
+        ('build.categories', lambda state: build_trees.get_categories_by_attribute(state['load.catalog'], 'Genre')),
+        ('build.parallel', lambda state: build_trees.build_in_parallel(state['load.catalog'])),
+        ('serialize.json', lambda state: write_json(treeFileName, state['build.tree'])),
+        ('serialize.snapshot', lambda state: write_snapshot(state['build.tree'], snapshotFileName)),
+        ('serialize.nodes', lambda state: write_node_store(state['build.tree'], nodeStoreFileName)),
+        ('serialize.sql', lambda state: write_catalog(
+            ((movie, build_trees.get_movie_facets(movie)) for movie in state['load.catalog'].values()), sqlFileName)),
+        ('load.json', lambda state: read_json(treeFileName)),
+        ('load.stream', lambda state: sum(1 for _ in iter_json_items(treeFileName, ('movies',)))),
+        ('load.snapshot', lambda state: TreeSnapshot(snapshotFileName)),
+        ('load.nodes', lambda state: NodeStore(nodeStoreFileName, prefetch=False)),
+        ('load.sql', lambda state: MovieCatalog(sqlFileName)),
+    ]
+    if MovieStore is not None:
+        stages.insert(3, ('build.store', lambda state: MovieStore(state['load.catalog'])))
+    for backend in ['json', 'snapshot', 'nodes', 'sql']:
+        stages.append((f'list.root.{backend}', cold_listing(backend, language=False)))
+        stages.append((f'list.language.{backend}', cold_listing(backend, language=True)))
+        stages.append((f'page.root.{backend}', cold_listing(backend, language=False, limit=PAGE_SIZE)))
+    return stages
+
+
+def run_stages(size, repeat, memory, seed):
+    """
+    Benchmark every stage on a catalog of one size.
+
+    Parameters
+    ----------
+    size : int
+        The number of movies.
+    repeat : int
+        The number of timed runs per stage.
+    memory : bool
+        Whether to record the peak memory of every stage.
+    seed : int
+        The seed of the catalog generator.
+
+    Returns
+    -------
+    list of dict
+        One record per stage.
+    """
+    records = []
+    with tempfile.TemporaryDirectory() as directory:
+        write_json(os.path.join(directory, 'catalog.json'), generate_catalog(size, seed))
+
+        state = {}
+        for name, function in define_stages(directory):
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                result = function(state)
+                times.append(time.perf_counter() - start)
+            record = {'size': size, 'stage': name, 'seconds': min(times), 'mean_seconds': sum(times) / len(times)}
+            if memory:
+                tracemalloc.start()
+                function(state)
+                record['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            if name.startswith('serialize.'):
+                record['file_bytes'] = os.path.getsize(os.path.join(directory, OUTPUT_FILES[name]))
+            state[name] = result
+            records.append(record)
+            print(f"{size:>9} {name:<24} {record['seconds'] * 1000:>10.2f} ms"
+                  + (f" {record['peak_bytes'] / 2 ** 20:>10.1f} MiB" if memory else ''))
+        state['load.snapshot'].close()
+    return records
+
+
+def git_revision():
+    """
+    Get the git revision of the project, None outside a git checkout.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """
+    Print the stages that got slower or faster than in a baseline run.
+
+    Parameters
+    ----------
+    results : dict
+        The results of this run.
+    baseline : dict
+        The results of an earlier run.
+
+    Returns
+    -------
+    int
+        The number of stages slower by more than REGRESSION_THRESHOLD.
+    """
+    previous = {(record['size'], record['stage']): record for record in baseline['results']}
+    regressions = 0
+    print(f"\nCompared with {baseline.get('revision') or 'the baseline'}:")
+    for record in results['results']:
+        old = previous.get((record['size'], record['stage']))
+        if old is None or max(record['seconds'], old['seconds']) < MIN_COMPARED_SECONDS:
+            continue
+        ratio = record['seconds'] / old['seconds']
+        flag = ''
+        if ratio > REGRESSION_THRESHOLD:
+            flag = '  slower'
+            regressions += 1
+        elif ratio < 1 / REGRESSION_THRESHOLD:
+            flag = '  faster'
+        print(f"{record['size']:>9} {record['stage']:<24} {ratio:>6.2f}x{flag}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the build, serialization, load and listing stages.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='catalog sizes to benchmark, e.g. 1000 10000 100000 1000000')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per stage, the best one is kept')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc run of every stage')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the catalog generator')
+    parser.add_argument('--output', default='benchmark_results.json', help='the JSON file to write')
+    parser.add_argument('--baseline', default=None, help='an earlier results file to compare with')
+    args = parser.parse_args()
+
+    results = {
+        'revision': git_revision(),
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': MovieStore is not None,
+        'repeat': args.repeat,
+        'results': [],
+    }
+    for size in args.sizes:
+        results['results'] += run_stages(size, args.repeat, not args.no_memory, args.seed)
+
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=4)
+    print(f"Wrote '{args.output}'.")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            if compare(results, json.load(file)):
+                raise SystemExit(1)
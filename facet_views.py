@@ -0,0 +1,174 @@
+"""
+############################## Final Projec: Facet Views ############################
+
+Browse the catalog in any order of facets, such as Genre -> Decade -> Rating,
+without building a tree for every order.
+
+A view is derived from the inverted indexes in movies_index.json. Its root
+holds every movie, and a node is split into children by the next facet
+only when the user opens it, using the facet values of its own movies, so
+opening a node costs time proportional to the movies below it. Split nodes
+are kept in a bounded LRU cache per view.
+
+"""
+
+from collections import OrderedDict
+from collections.abc import Mapping
+
+# The levels of movies_tree.json, see TREE_LEVELS in Build Trees.py
+DEFAULT_LEVELS = ('Language', 'Country', 'Genre', 'Awards')
+
+# Number of split nodes kept in memory per view
+VIEW_NODE_CACHE_SIZE = 1024
+
+
+class MovieFacets:
+    """
+    The facet values of every movie, inverted from the facet indexes on first use.
+
+    Parameters
+    ----------
+    indexes : dict
+        Facet name -> {facet value -> sorted list of IMDb IDs}.
+    """
+
+    def __init__(self, indexes):
+        self.indexes = indexes
+        self.inverted = {}
+
+    def values(self, facet):
+        """
+        Get the values of one facet for every movie.
+
+        Parameters
+        ----------
+        facet : str
+            A facet of the indexes.
+
+        Returns
+        -------
+        dict
+            IMDb ID -> list of values, in the order of the index. Movies
+            without a value are missing.
+        """
+        if facet not in self.inverted:
+            inverted = {}
+            for value, movie_ids in self.indexes[facet].items():
+                for movie_id in movie_ids:
+                    inverted.setdefault(movie_id, []).append(value)
+            self.inverted[facet] = inverted
+        return self.inverted[facet]
+
+
+class FacetView:
+    """
+    A lazily split category tree over an ordered list of facets.
+
+    Parameters
+    ----------
+    facets : MovieFacets
+        The facet values of the movies, shared between views.
+    levels : sequence of str
+        The facets of the levels, from the root down.
+    movie_ids : list of str
+        The movies of the root.
+
+    Raises
+    ------
+    ValueError
+        If a level is not a facet of the indexes, or appears twice.
+    """
+
+    def __init__(self, facets, levels, movie_ids):
+        unknown = [level for level in levels if level not in facets.indexes]
+        if unknown:
+            raise ValueError(f"Unknown facet '{unknown[0]}'.")
+        if not levels or len(set(levels)) != len(levels):
+            raise ValueError("The levels must be distinct facets.")
+        self.facets = facets
+        self.levels = tuple(levels)
+        self.nodes = OrderedDict()
+        self.root = ViewNode(self, (), sorted(movie_ids))
+
+    def split(self, path, movie_ids):
+        """
+        Group the movies of a node by the facet of the next level.
+
+        Parameters
+        ----------
+        path : tuple of str
+            The path of the node.
+        movie_ids : list of str
+            The sorted IMDb IDs of the node.
+
+        Returns
+        -------
+        dict
+            Child name -> sorted IMDb IDs, the children with the most movies
+            first and ties in alphabetical order.
+        """
+        if path in self.nodes:
+            self.nodes.move_to_end(path)
+            return self.nodes[path]
+        values = self.facets.values(self.levels[len(path)])
+        groups = {}
+        for movie_id in movie_ids:
+            for value in values.get(movie_id, ()):
+                groups.setdefault(value, []).append(movie_id)
+        children = {name: groups[name] for name in sorted(groups, key=lambda name: (-len(groups[name]), name))}
+        self.nodes[path] = children
+        if len(self.nodes) > VIEW_NODE_CACHE_SIZE:
+            self.nodes.popitem(last=False)
+        return children
+
+
+class ViewNode(Mapping):
+    """
+    An internal node of a FacetView, usable wherever a node of the tree is.
+
+    Children at the last level are lists of IMDb IDs, like the leaves of the
+    tree, and the others are ViewNodes.
+
+    Parameters
+    ----------
+    view : FacetView
+        The view the node belongs to.
+    path : tuple of str
+        The category names leading from the root to the node.
+    movie_ids : list of str
+        The sorted IMDb IDs below the node.
+    """
+
+    def __init__(self, view, path, movie_ids):
+        self.view = view
+        self.path = path
+        self.movie_ids = movie_ids
+
+    def children(self):
+        """
+        Split the node, or get its cached split.
+        """
+        return self.view.split(self.path, self.movie_ids)
+
+    def counts(self):
+        """
+        Get the number of distinct movies below each child.
+
+        Returns
+        -------
+        dict
+            Child name -> movie count.
+        """
+        return {name: len(movie_ids) for name, movie_ids in self.children().items()}
+
+    def __getitem__(self, name):
+        movie_ids = self.children()[name]
+        if len(self.path) + 1 == len(self.view.levels):
+            return movie_ids
+        return ViewNode(self.view, self.path + (name,), movie_ids)
+
+    def __iter__(self):
+        return iter(self.children())
+
+    def __len__(self):
+        return len(self.children())
@@ -0,0 +1,400 @@
+"""
+############################## Final Projec: JSON Streaming ############################
+
+Write and read the large JSON files of the project a piece at a time.
+
+json.dump encodes through the pure Python encoder and json.load reads the
+whole file into one string before decoding it, so both hold the data twice.
+write_json encodes dictionaries of dictionaries and large dictionaries one
+entry at a time with the C encoder and writes the text in chunks. read_json
+decodes every value that fits in its buffer at once, and objects that do
+not one entry at a time, so the buffer stays bounded. iter_json_items yields the entries of
+any object of a file, such as the movies of movies_tree.json, without
+decoding the rest.
+
+Files ending in .gz are gzip-compressed, and files ending in .zst are
+zstd-compressed when the zstandard package is installed.
+
+"""
+
+import gzip
+import json
+import os
+import re
+
+try:
+    import zstandard
+except ImportError:  # zstandard is not installed, .zst files are unsupported
+    zstandard = None
+
+# Suffix of the files of each compression
+COMPRESSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+
+# Dictionaries with more entries are written one entry at a time
+STREAM_ENTRIES = 1000
+
+# Characters written to the file at a time
+CHUNK_SIZE = 1 << 16
+
+# Characters read from the file at a time
+READ_SIZE = 1 << 16
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# Characters that can continue a number
+NUMBER_CHARS = set('0123456789.eE+-')
+
+
+def open_json(fileName, mode='r'):
+    """
+    Open a JSON file as UTF-8 text, decompressing it according to its suffix.
+
+    Parameters
+    ----------
+    fileName : str
+        The file name, ending in .gz for gzip or .zst for zstd.
+    mode : str
+        'r' to read or 'w' to write.
+
+    Returns
+    -------
+    file object
+        The text file.
+
+    Raises
+    ------
+    ImportError
+        If the file is zstd-compressed and zstandard is not installed.
+    """
+    if fileName.endswith(COMPRESSIONS['gzip']):
+        return gzip.open(fileName, mode + 't', encoding='utf-8')
+    if fileName.endswith(COMPRESSIONS['zstd']):
+        if zstandard is None:
+            raise ImportError(f"Reading or writing '{fileName}' requires the zstandard package.")
+        return zstandard.open(fileName, mode + 't', encoding='utf-8')
+    return open(fileName, mode, encoding='utf-8')
+
+def find_json(fileName):
+    """
+    Find a JSON file, plain or compressed.
+
+    Parameters
+    ----------
+    fileName : str
+        The name of the plain file, e.g. movies_tree.json.
+
+    Returns
+    -------
+    str or None
+        The first of the plain, .gz and .zst files that exists, None if
+        there is none.
+    """
+    for suffix in ['', *COMPRESSIONS.values()]:
+        if os.path.exists(fileName + suffix):
+            return fileName + suffix
+    return None
+
+def streamed(value):
+    """
+    Whether a value is a dictionary worth encoding an entry at a time.
+    """
+    return (isinstance(value, dict) and len(value) > 0
+            and (len(value) > STREAM_ENTRIES or isinstance(next(iter(value.values())), dict)))
+
+def encode_items(encoder, items, level=0):
+    """
+    Encode the entries of a dictionary piece by piece.
+
+    Values for which streamed() holds are encoded an entry at a time, and
+    the others at once, so that the output matches json.dump with the same
+    indentation.
+
+    Parameters
+    ----------
+    encoder : json.JSONEncoder
+        The encoder of the keys and values.
+    items : iterable of tuple
+        The (key, value) entries, the keys being strings.
+    level : int
+        The nesting level of the dictionary.
+
+    Yields
+    ------
+    str
+        The pieces of the JSON text.
+    """
+    if encoder.indent is None:
+        newline, closing = '', ''
+    else:
+        newline = '\n' + ' ' * (encoder.indent * (level + 1))
+        closing = '\n' + ' ' * (encoder.indent * level)
+    colon = encoder.key_separator
+    yield '{'
+    separator = None
+    for key, value in items:
+        yield f'{newline if separator is None else separator}{encoder.encode(key)}{colon}'
+        if streamed(value):
+            yield from encode_items(encoder, value.items(), level + 1)
+        elif encoder.indent is None:
+            yield encoder.encode(value)
+        else:
+            # Strings never contain a raw newline, so this only indents the lines
+            yield encoder.encode(value).replace('\n', newline)
+        separator = encoder.item_separator + newline
+    yield '}' if separator is None else closing + '}'
+
+def write_items(fileName, items, indent=None):
+    """
+    Write (key, value) entries as a JSON object, without holding the whole text.
+
+    Parameters
+    ----------
+    fileName : str
+        The file to write, compressed if it ends in .gz or .zst.
+    items : iterable of tuple
+        The (key, value) entries, the keys being strings. A generator works,
+        so the entries never need to be in memory together.
+    indent : int, optional
+        The indentation, as in json.dump. By default the output is compact.
+    """
+    separators = (',', ':') if indent is None else (',', ': ')
+    encoder = json.JSONEncoder(ensure_ascii=False, indent=indent, separators=separators)
+    with open_json(fileName, 'w') as file:
+        chunk = []
+        size = 0
+        for piece in encode_items(encoder, items):
+            chunk.append(piece)
+            size += len(piece)
+            if size >= CHUNK_SIZE:
+                file.write(''.join(chunk))
+                chunk = []
+                size = 0
+        file.write(''.join(chunk))
+
+def write_json(fileName, data, indent=None):
+    """
+    Write a dictionary to a JSON file, an entry at a time.
+
+    Parameters
+    ----------
+    fileName : str
+        The file to write, compressed if it ends in .gz or .zst.
+    data : dict
+        The dictionary to write, with string keys.
+    indent : int, optional
+        The indentation, as in json.dump. By default the output is compact.
+    """
+    write_items(fileName, data.items(), indent)
+
+
+class JSONReader:
+    """
+    Decode a JSON text file incrementally from a bounded buffer.
+
+    Values that fit in the buffer are decoded at once by the C decoder, and
+    objects that do not one entry at a time, so the buffer only grows to
+    hold a long string or array.
+
+    Parameters
+    ----------
+    file : file object
+        The text file, positioned at the start of a JSON value.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.decoder = json.JSONDecoder()
+        # json.load shares the key strings of the whole file, the decoder only those of one value
+        self.memo = {}
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def fill(self, size=0):
+        """
+        Drop the decoded text and read max(size, READ_SIZE) more characters.
+
+        Returns
+        -------
+        bool
+            False at the end of the file.
+        """
+        chunk = self.file.read(max(size, READ_SIZE))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self):
+        """
+        Skip whitespace and get the next character, '' at the end of the file.
+        """
+        while True:
+            self.position = WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        """
+        Consume the next character, which must be char.
+
+        Raises
+        ------
+        json.JSONDecodeError
+            If the next character is another one.
+        """
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self.buffer, self.position)
+        self.position += 1
+
+    def value(self):
+        """
+        Decode the next value, an object an entry at a time if it does not fit in the buffer.
+
+        Raises
+        ------
+        json.JSONDecodeError
+            If the file is not valid JSON.
+        """
+        char = self.peek()
+        while True:
+            try:
+                value, end = self.decoder.scan_once(self.buffer, self.position)
+                # A number cut by the end of the buffer decodes as a shorter number
+                if self.eof or (end < len(self.buffer) and self.buffer[end] not in NUMBER_CHARS):
+                    self.position = end
+                    return value
+            except StopIteration as error:
+                if self.eof:
+                    raise json.JSONDecodeError('Expecting value', self.buffer, error.value) from None
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if char == '{' and len(self.buffer) - self.position >= READ_SIZE:
+                return dict(self.items())
+            # Doubling the buffer keeps the retries of a long value linear
+            self.fill(len(self.buffer))
+
+    def keys(self):
+        """
+        Go through the keys of the next object.
+
+        The caller must consume the value of each key, with value(), keys()
+        or items(), before asking for the next key.
+
+        Yields
+        ------
+        str
+            The keys, in the order of the file.
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self.position += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise json.JSONDecodeError('Expecting property name enclosed in double quotes',
+                                           self.buffer, self.position)
+            self.expect(':')
+            yield key
+            char = self.peek()
+            self.position += 1
+            if char == '}':
+                return
+            if char != ',':
+                raise json.JSONDecodeError("Expecting ',' delimiter", self.buffer, self.position - 1)
+
+    def items(self):
+        """
+        Decode the entries of the next object one at a time.
+
+        Yields
+        ------
+        tuple
+            (key, value) entries.
+        """
+        memo = self.memo
+        for key in self.keys():
+            value = self.value()
+            if type(value) is dict:
+                value = {memo.setdefault(name, name): item for name, item in value.items()}
+            yield key, value
+
+    def find(self, path):
+        """
+        Decode the entries of the object at a path one at a time.
+
+        The values before the path are decoded and dropped, and the file is
+        not read beyond the object.
+
+        Parameters
+        ----------
+        path : sequence of str
+            The keys leading from the next object to the wanted one.
+
+        Yields
+        ------
+        tuple
+            (key, value) entries of the object.
+
+        Raises
+        ------
+        KeyError
+            If a key of the path is missing.
+        """
+        if not path:
+            yield from self.items()
+            return
+        for key in self.keys():
+            if key == path[0]:
+                yield from self.find(path[1:])
+                return
+            self.value()
+        raise KeyError(path[0])
+
+
+def iter_json_items(fileName, path=()):
+    """
+    Yield the entries of an object of a JSON file one at a time.
+
+    Parameters
+    ----------
+    fileName : str
+        The file to read, compressed if it ends in .gz or .zst.
+    path : sequence of str
+        The keys leading to the object, e.g. ('movies',) for the movies of
+        movies_tree.json. The root object by default.
+
+    Yields
+    ------
+    tuple
+        (key, value) entries, in the order of the file.
+    """
+    with open_json(fileName) as file:
+        yield from JSONReader(file).find(path)
+
+def read_json(fileName):
+    """
+    Read a JSON file without holding its whole text in memory.
+
+    Parameters
+    ----------
+    fileName : str
+        The file to read, compressed if it ends in .gz or .zst.
+
+    Returns
+    -------
+    object
+        The decoded data, like json.load.
+    """
+    with open_json(fileName) as file:
+        reader = JSONReader(file)
+        data = reader.value()
+        if reader.peek():
+            raise json.JSONDecodeError('Extra data', reader.buffer, reader.position)
+        return data
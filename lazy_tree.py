@@ -0,0 +1,384 @@
+"""
+############################## Final Projec: Lazy Tree ############################
+
+A key-value store of the movie tree keyed by node path, with lazy node
+proxies for User Interaction.py.
+
+Every node, every movie and every rank array is a separate entry of a
+SQLite key-value table. The proxies only fetch the entry of the node the
+user picks, and fetch the most populated children of a node in the
+background while the user is reading its menu, so the interactive front
+end can run against a catalog far bigger than RAM.
+
+"""
+
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+
+# Number of children fetched in the background when a menu is shown
+PREFETCH_CHILDREN = 4
+
+# Number of decoded entries kept in memory
+CACHE_SIZE = 4096
+
+
+def node_key(path):
+    """
+    Build the store key of a tree node.
+
+    Parameters
+    ----------
+    path : tuple of str
+        The category names leading from the root to the node.
+
+    Returns
+    -------
+    str
+        The key, 'node:' followed by the path as a JSON array.
+    """
+    return 'node:' + json.dumps(list(path), ensure_ascii=False)
+
+
+def write_node_store(movies_tree, fileName):
+    """
+    Write a movie tree to a path-keyed SQLite key-value store.
+
+    Internal nodes are stored as {'children': {name: movie count}, 'leaves':
+    bool}, leaves as their list of IMDb IDs.
+
+    Parameters
+    ----------
+    movies_tree : dict
+        A tree produced by organize_movies_info_into_tree.
+    fileName : str
+        The SQLite file to write. It is replaced if it exists.
+    """
+    entries = []
+
+    def add_node(path, node):
+        if isinstance(node, list):
+            entries.append((node_key(path), node))
+            return set(node)
+        ids = {}
+        for name, child in node.items():
+            ids[name] = add_node(path + (name,), child)
+        entries.append((node_key(path), {
+            'children': {name: len(child_ids) for name, child_ids in ids.items()},
+            'leaves': all(isinstance(child, list) for child in node.values()),
+        }))
+        return set().union(*ids.values())
+
+    add_node((), movies_tree['tree'])
+    entries += [(f'movie:{movie_id}', movie) for movie_id, movie in movies_tree['movies'].items()]
+    entries += [(f'ranks:{sort_key}', order) for sort_key, order in movies_tree['ranks'].items()]
+    entries.append(('movies', sorted(movies_tree['movies'])))
+    entries.append(('ranks', list(movies_tree['ranks'])))
+
+    connection = sqlite3.connect(fileName)
+    with connection:
+        connection.execute("DROP TABLE IF EXISTS entries")
+        connection.execute("CREATE TABLE entries (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        connection.executemany("INSERT INTO entries VALUES (?, ?)",
+                               ((key, json.dumps(value, ensure_ascii=False)) for key, value in entries))
+    connection.close()
+
+
+def update_node_store(movies_tree, fileName, moves):
+    """
+    Patch a store written by write_node_store after an incremental build.
+
+    Only the entries of the nodes and leaves on the paths of the moved
+    movies, the entries of those movies and the rank arrays are written.
+    The movie counts of the nodes are adjusted by the movies that entered
+    or left each child, so no subtree is walked.
+
+    Parameters
+    ----------
+    movies_tree : dict
+        The tree after update_movies_tree.
+    fileName : str
+        The SQLite file to patch, written from the tree before the update.
+    moves : dict
+        IMDb ID -> (old leaf paths, new leaf paths) of every added, changed
+        and removed movie, see update_movies_tree.
+    """
+    deltas = {}
+    leaves = set()
+    for old_paths, new_paths in moves.values():
+        old_paths = [tuple(path) for path in old_paths]
+        new_paths = [tuple(path) for path in new_paths]
+        leaves.update(old_paths, new_paths)
+        # A child pruned and added back moves to the end, so every node on the paths is rewritten
+        for path in old_paths + new_paths:
+            for depth in range(len(path)):
+                deltas.setdefault(path[:depth], {})
+        # (node path, child name) pairs the movie is below, before and after
+        old_edges = {(path[:depth], path[depth]) for path in old_paths for depth in range(len(path))}
+        new_edges = {(path[:depth], path[depth]) for path in new_paths for depth in range(len(path))}
+        for node_path, name in new_edges - old_edges:
+            deltas.setdefault(node_path, {}).setdefault(name, 0)
+            deltas[node_path][name] += 1
+        for node_path, name in old_edges - new_edges:
+            deltas.setdefault(node_path, {}).setdefault(name, 0)
+            deltas[node_path][name] -= 1
+
+    def tree_node(path):
+        node = movies_tree['tree']
+        for name in path:
+            if name not in node:
+                return None
+            node = node[name]
+        return node
+
+    connection = sqlite3.connect(fileName)
+    upserts = []
+    deletes = []
+    for path, changes in deltas.items():
+        node = tree_node(path)
+        if node is None:
+            deletes.append(node_key(path))
+            continue
+        row = connection.execute("SELECT value FROM entries WHERE key = ?", (node_key(path),)).fetchone()
+        counts = json.loads(row[0])['children'] if row is not None else {}
+        # The children keep the order of the tree, new ones are counted from their deltas
+        upserts.append((node_key(path), {
+            'children': {name: counts.get(name, 0) + changes.get(name, 0) for name in node},
+            'leaves': all(isinstance(child, list) for child in node.values()),
+        }))
+    for path in leaves:
+        leaf = tree_node(path)
+        if leaf is None:
+            deletes.append(node_key(path))
+        else:
+            upserts.append((node_key(path), leaf))
+    for movie_id in moves:
+        if movie_id in movies_tree['movies']:
+            upserts.append((f'movie:{movie_id}', movies_tree['movies'][movie_id]))
+        else:
+            deletes.append(f'movie:{movie_id}')
+    upserts += [(f'ranks:{sort_key}', order) for sort_key, order in movies_tree['ranks'].items()]
+    upserts.append(('movies', sorted(movies_tree['movies'])))
+
+    with connection:
+        connection.executemany("DELETE FROM entries WHERE key = ?", ((key,) for key in deletes))
+        connection.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?)",
+                               ((key, json.dumps(value, ensure_ascii=False)) for key, value in upserts))
+    connection.close()
+
+
+class NodeStore(Mapping):
+    """
+    Lazy access to a tree written by write_node_store.
+
+    It is a mapping with the keys 'movies', 'tree' and 'ranks', like the
+    dictionary loaded from movies_tree.json. Entries are fetched on access,
+    and a bounded LRU cache keeps the recently used ones.
+
+    Parameters
+    ----------
+    fileName : str
+        The SQLite file written by write_node_store.
+    prefetch : bool
+        Whether to fetch likely children in the background.
+    """
+
+    def __init__(self, fileName, prefetch=True):
+        self.fileName = fileName
+        self.local = threading.local()
+        # Thread -> its connection, all closed by close
+        self.connections = {}
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=2) if prefetch else None
+        self.parts = {
+            'movies': LazyMovies(self),
+            'tree': LazyNode(self, ()),
+            'ranks': LazyRanks(self),
+        }
+
+    def fetch(self, key):
+        """
+        Fetch and decode one entry, going through the cache.
+
+        Parameters
+        ----------
+        key : str
+            The entry key.
+
+        Returns
+        -------
+        object
+            The decoded value.
+
+        Raises
+        ------
+        KeyError
+            If the store has no such entry.
+        """
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+        # SQLite connections cannot be shared between threads, each thread
+        # has its own, but close may close it from another one
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = sqlite3.connect(self.fileName, check_same_thread=False)
+            with self.lock:
+                # The connections of finished threads are closed here
+                for thread in [thread for thread in self.connections if not thread.is_alive()]:
+                    self.connections.pop(thread).close()
+                self.connections[threading.current_thread()] = connection
+        row = connection.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        value = json.loads(row[0])
+        with self.lock:
+            self.cache[key] = value
+            if len(self.cache) > CACHE_SIZE:
+                self.cache.popitem(last=False)
+        return value
+
+    def prefetch(self, keys):
+        """
+        Fetch entries on a background thread so later accesses hit the cache.
+
+        Parameters
+        ----------
+        keys : list of str
+            The entry keys.
+        """
+        if self.executor is None:
+            return
+        for key in keys:
+            self.executor.submit(self.fetch, key)
+
+    def __getitem__(self, key):
+        return self.parts[key]
+
+    def __iter__(self):
+        return iter(self.parts)
+
+    def __len__(self):
+        return len(self.parts)
+
+    def close(self):
+        """
+        Stop the prefetch thread and close the connections of all threads.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+        with self.lock:
+            connections, self.connections = self.connections, {}
+        for connection in connections.values():
+            connection.close()
+
+
+class LazyNode(Mapping):
+    """
+    A proxy for an internal node of the tree, fetched on first access.
+
+    Parameters
+    ----------
+    store : NodeStore
+        The store the node belongs to.
+    path : tuple of str
+        The category names leading from the root to the node.
+    """
+
+    def __init__(self, store, path):
+        self.store = store
+        self.path = path
+        self.entry = None
+
+    def load(self):
+        """
+        Fetch the node entry, and start prefetching its largest children.
+        """
+        if self.entry is None:
+            self.entry = self.store.fetch(node_key(self.path))
+            children = self.entry['children']
+            likely = sorted(children, key=children.get, reverse=True)[:PREFETCH_CHILDREN]
+            self.store.prefetch([node_key(self.path + (name,)) for name in likely])
+        return self.entry
+
+    def counts(self):
+        """
+        Get the number of distinct movies below each child, without fetching them.
+
+        Returns
+        -------
+        dict
+            Child name -> movie count.
+        """
+        return self.load()['children']
+
+    def __getitem__(self, name):
+        entry = self.load()
+        if name not in entry['children']:
+            raise KeyError(name)
+        if entry['leaves']:
+            return self.store.fetch(node_key(self.path + (name,)))
+        return LazyNode(self.store, self.path + (name,))
+
+    def __iter__(self):
+        return iter(self.load()['children'])
+
+    def __len__(self):
+        return len(self.load()['children'])
+
+
+class LazyMovies(Mapping):
+    """
+    The movie table of a NodeStore, fetching one movie per lookup.
+
+    Parameters
+    ----------
+    store : NodeStore
+        The store the table belongs to.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, movie_id):
+        try:
+            return self.store.fetch(f'movie:{movie_id}')
+        except KeyError:
+            raise KeyError(movie_id) from None
+
+    def __iter__(self):
+        return iter(self.store.fetch('movies'))
+
+    def __len__(self):
+        return len(self.store.fetch('movies'))
+
+
+class LazyRanks(Mapping):
+    """
+    The rank arrays of a NodeStore, fetched per sort key.
+
+    Parameters
+    ----------
+    store : NodeStore
+        The store the rank arrays belong to.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, sort_key):
+        try:
+            return self.store.fetch(f'ranks:{sort_key}')
+        except KeyError:
+            raise KeyError(sort_key) from None
+
+    def __iter__(self):
+        return iter(self.store.fetch('ranks'))
+
+    def __len__(self):
+        return len(self.store.fetch('ranks'))
@@ -0,0 +1,654 @@
+"""
+############################## Final Projec: Movie Catalog ############################
+
+The catalog as a normalized SQLite database, an alternative backend to
+movies_tree.json for User Interaction.py and the server.
+
+Movies are rows of one table, and their languages, countries, genres,
+directors and actors are rows of join tables to one table per kind of
+value, with B-tree indexes on the sort keys and on both directions of every
+join. No tree is stored: a node of the tree is the set of movies having
+the values of its path, so navigating, counting the movies of every option
+and listing the distinct movies below a node sorted and one page at a time
+are single indexed queries with LIMIT and OFFSET. Only the rows a query
+returns are read into memory, and any number of processes can read the
+file at once.
+
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from pathlib import Path
+
+from facet_views import DEFAULT_LEVELS
+
+# Facet -> (join table, value table, value key) of the multi-valued facets
+FACET_TABLES = {
+    'Language': ('movie_languages', 'languages', 'language_id'),
+    'Country': ('movie_countries', 'countries', 'country_id'),
+    'Genre': ('movie_genres', 'genres', 'genre_id'),
+    'Director': ('movie_directors', 'people', 'person_id'),
+    'Actor': ('movie_actors', 'people', 'person_id'),
+}
+
+# Facet -> column of the movies table, for the facets with one value per movie
+FACET_COLUMNS = {'Awards': 'awards', 'Decade': 'decade', 'Rating': 'rating_band'}
+
+# Sort key -> column of the movies table
+SORT_COLUMNS = {'imdbRating': 'imdb_rating', 'popularity': 'popularity', 'Year': 'year', 'imdbVotes': 'imdb_votes'}
+
+# Number of nodes whose children counts are kept in memory
+NODE_CACHE_SIZE = 1024
+
+# More values than any movie has for one facet, to order join rows by movie and position
+MAX_VALUES = 1 << 16
+
+SCHEMA = [
+    "CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    "CREATE TABLE movies ("
+    " id INTEGER PRIMARY KEY,"
+    " imdb_id TEXT NOT NULL UNIQUE,"
+    " title TEXT NOT NULL,"
+    " year INTEGER,"
+    " runtime INTEGER,"
+    " plot TEXT NOT NULL,"
+    " poster TEXT NOT NULL,"
+    " imdb_rating REAL,"
+    " imdb_votes INTEGER,"
+    " popularity REAL,"
+    " awards TEXT NOT NULL,"
+    " decade TEXT,"
+    " rating_band TEXT)",
+    *[f"CREATE TABLE {value_table} (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)"
+      for value_table in ['languages', 'countries', 'genres', 'people']],
+    *[f"CREATE TABLE {join_table} ("
+      f" movie_id INTEGER NOT NULL REFERENCES movies (id),"
+      f" {key} INTEGER NOT NULL REFERENCES {value_table} (id),"
+      f" position INTEGER NOT NULL,"
+      f" PRIMARY KEY (movie_id, {key})) WITHOUT ROWID"
+      for join_table, value_table, key in FACET_TABLES.values()],
+]
+
+# Built after the rows are inserted, which is faster than updating them row by row
+INDEXES = [
+    # Ties are broken by IMDb ID, as in the rank arrays of the tree
+    *[f"CREATE INDEX movies_{column} ON movies ({column}, imdb_id)" for column in SORT_COLUMNS.values()],
+    *[f"CREATE INDEX movies_{column} ON movies ({column})" for column in FACET_COLUMNS.values()],
+    *[f"CREATE INDEX {join_table}_{key} ON {join_table} ({key}, movie_id)"
+      for join_table, value_table, key in FACET_TABLES.values()],
+]
+
+
+def movie_row(movie, facets):
+    """
+    Get the columns of the movies table of a movie, without its row ID.
+
+    Parameters
+    ----------
+    movie : Movie
+        The record of the movie.
+    facets : dict
+        The values of every facet of the movie.
+
+    Returns
+    -------
+    tuple
+        The values of the columns from imdb_id to rating_band.
+    """
+    return (
+        movie.imdbID, movie.Title, movie.Year, movie.Runtime, movie.Plot, movie.Poster,
+        movie.imdbRating, movie.imdbVotes, movie.popularity, movie.Awards,
+        *[facets[facet][0] if facets[facet] else None for facet in ['Decade', 'Rating']],
+    )
+
+def write_catalog(movies, fileName, levels=DEFAULT_LEVELS):
+    """
+    Write the catalog to a normalized SQLite database.
+
+    The file is written next to its final name and moved into place, so
+    readers of the previous version are never disturbed.
+
+    Parameters
+    ----------
+    movies : iterable of tuple
+        (Movie record, facets) pairs in catalog order, the facets being the
+        values of every facet of the movie, see get_movie_facets in
+        Build Trees.py.
+    fileName : str
+        The SQLite file to write. It is replaced if it exists.
+    levels : sequence of str
+        The facets of the tree levels, from the root down.
+    """
+    value_ids = {value_table: {} for value_table in ['languages', 'countries', 'genres', 'people']}
+    movie_rows = []
+    join_rows = {join_table: [] for join_table, value_table, key in FACET_TABLES.values()}
+    for row_id, (movie, facets) in enumerate(movies, start=1):
+        movie_rows.append((row_id, *movie_row(movie, facets)))
+        for facet, (join_table, value_table, key) in FACET_TABLES.items():
+            ids = value_ids[value_table]
+            # A value listed twice by OMDb is joined once
+            for position, value in enumerate(dict.fromkeys(facets[facet])):
+                join_rows[join_table].append((row_id, ids.setdefault(value, len(ids) + 1), position))
+
+    temporary = fileName + '.tmp'
+    if os.path.exists(temporary):
+        os.remove(temporary)
+    connection = sqlite3.connect(temporary)
+    # The file is not in place yet, a crash only loses the temporary file
+    connection.execute("PRAGMA journal_mode = OFF")
+    connection.execute("PRAGMA synchronous = OFF")
+    with connection:
+        for statement in SCHEMA:
+            connection.execute(statement)
+        connection.execute("INSERT INTO meta VALUES ('levels', ?)", (json.dumps(list(levels)),))
+        connection.executemany(f"INSERT INTO movies VALUES ({', '.join('?' * 13)})", movie_rows)
+        for value_table, ids in value_ids.items():
+            connection.executemany(f"INSERT INTO {value_table} (name, id) VALUES (?, ?)", ids.items())
+        for join_table, rows in join_rows.items():
+            connection.executemany(f"INSERT INTO {join_table} VALUES (?, ?, ?)", rows)
+        for statement in INDEXES:
+            connection.execute(statement)
+    # Statistics let the planner choose between scanning a sort index and probing a join index
+    connection.execute("ANALYZE")
+    connection.close()
+    os.replace(temporary, fileName)
+
+def update_catalog(movies, removed, fileName):
+    """
+    Patch a catalog written by write_catalog after an incremental build.
+
+    Changed movies keep their row, so they keep their place in the catalog
+    order, added movies are appended, and only the join rows of these
+    movies are rewritten. Values no movie has any more are deleted and
+    the statistics are gathered again, as after write_catalog. The update
+    is one transaction, so readers see either the previous or the new
+    catalog.
+
+    Parameters
+    ----------
+    movies : iterable of tuple
+        (Movie record, facets) pairs of the added and changed movies.
+    removed : iterable of str
+        The IMDb IDs of the removed movies.
+    fileName : str
+        The SQLite file to patch.
+    """
+    connection = sqlite3.connect(fileName)
+    with connection:
+        def drop_joins(row_id):
+            for join_table, value_table, key in FACET_TABLES.values():
+                connection.execute(f"DELETE FROM {join_table} WHERE movie_id = ?", (row_id,))
+
+        for movie_id in removed:
+            row = connection.execute("SELECT id FROM movies WHERE imdb_id = ?", (movie_id,)).fetchone()
+            if row is not None:
+                drop_joins(row[0])
+                connection.execute("DELETE FROM movies WHERE id = ?", row)
+
+        columns = ['imdb_id', 'title', 'year', 'runtime', 'plot', 'poster', 'imdb_rating', 'imdb_votes',
+                   'popularity', 'awards', 'decade', 'rating_band']
+        for movie, facets in movies:
+            values = movie_row(movie, facets)
+            row = connection.execute("SELECT id FROM movies WHERE imdb_id = ?", (movie.imdbID,)).fetchone()
+            if row is not None:
+                row_id = row[0]
+                drop_joins(row_id)
+                connection.execute(f"UPDATE movies SET {', '.join(f'{column} = ?' for column in columns)} WHERE id = ?",
+                                   (*values, row_id))
+            else:
+                # Without AUTOINCREMENT the new row gets the largest ID plus one, the end of the catalog order
+                row_id = connection.execute(f"INSERT INTO movies ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                                            values).lastrowid
+            for facet, (join_table, value_table, key) in FACET_TABLES.items():
+                for position, value in enumerate(dict.fromkeys(facets[facet])):
+                    connection.execute(f"INSERT OR IGNORE INTO {value_table} (name) VALUES (?)", (value,))
+                    value_id = connection.execute(f"SELECT id FROM {value_table} WHERE name = ?", (value,)).fetchone()[0]
+                    connection.execute(f"INSERT INTO {join_table} VALUES (?, ?, ?)", (row_id, value_id, position))
+
+        # Values no movie has any more are dropped, as a full build would not write them
+        for value_table in dict.fromkeys(value_table for _, value_table, _ in FACET_TABLES.values()):
+            used = ' UNION '.join(f"SELECT {key} FROM {join_table}"
+                                  for join_table, table, key in FACET_TABLES.values() if table == value_table)
+            connection.execute(f"DELETE FROM {value_table} WHERE id NOT IN ({used})")
+    # The statistics of the planner follow the new row counts
+    connection.execute("ANALYZE")
+    connection.close()
+
+def facet_condition(facet, values, correlated=False):
+    """
+    Build the SQL condition for the movies m having one of some values of a facet.
+
+    Parameters
+    ----------
+    facet : str
+        A facet of FACET_TABLES or FACET_COLUMNS.
+    values : list of str
+        The accepted values.
+    correlated : bool
+        Whether to probe the join index once per movie instead of collecting
+        the movies of the values first. Probing is faster when the movies
+        are scanned in the order of a sort index and most of them match.
+
+    Returns
+    -------
+    tuple
+        (SQL condition, list of parameters).
+
+    Raises
+    ------
+    ValueError
+        If the facet is unknown.
+    """
+    if facet not in FACET_TABLES and facet not in FACET_COLUMNS:
+        raise ValueError(f"Unknown facet '{facet}'.")
+    values = list(values)
+    if not values:
+        return "0", []
+    marks = ', '.join('?' * len(values))
+    if facet in FACET_COLUMNS:
+        return f"m.{FACET_COLUMNS[facet]} IN ({marks})", values
+    join_table, value_table, key = FACET_TABLES[facet]
+    if correlated:
+        return (f"EXISTS (SELECT 1 FROM {join_table} j WHERE j.movie_id = m.id"
+                f" AND j.{key} IN (SELECT id FROM {value_table} WHERE name IN ({marks})))"), values
+    return (f"m.id IN (SELECT movie_id FROM {join_table}"
+            f" WHERE {key} IN (SELECT id FROM {value_table} WHERE name IN ({marks})))"), values
+
+
+class MovieCatalog(Mapping):
+    """
+    Read-only access to a catalog written by write_catalog.
+
+    It is a mapping with the keys 'movies', 'tree' and 'ranks', like the
+    dictionary loaded from movies_tree.json, whose values are answered by
+    SQL queries. Every thread reads through its own connection.
+
+    Parameters
+    ----------
+    fileName : str
+        The SQLite file written by write_catalog.
+    """
+
+    def __init__(self, fileName):
+        if not os.path.exists(fileName):
+            raise FileNotFoundError(f"No catalog at '{fileName}', run Build Trees.py first.")
+        # Read-only, so that opening the catalog never creates or locks it
+        self.uri = Path(fileName).resolve().as_uri() + '?mode=ro'
+        self.local = threading.local()
+        # Thread -> its connection, all closed by close
+        self.connections = {}
+        self.lock = threading.Lock()
+        # (levels, path) -> children counts, in LRU order
+        self.nodes = OrderedDict()
+        self.levels = tuple(json.loads(self.execute("SELECT value FROM meta WHERE key = 'levels'").fetchone()[0]))
+        self.size = self.execute("SELECT COUNT(*) FROM movies").fetchone()[0]
+        self.parts = {
+            'movies': CatalogMovies(self),
+            'tree': self.node(self.levels),
+            'ranks': CatalogRanks(self),
+        }
+
+    def execute(self, sql, parameters=()):
+        """
+        Run a query on the connection of the current thread.
+
+        Returns
+        -------
+        sqlite3.Cursor
+            The cursor of the query.
+        """
+        # SQLite connections cannot be shared between threads, each thread
+        # has its own, but close may close it from another one
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+            with self.lock:
+                # The connections of finished threads are closed here
+                for thread in [thread for thread in self.connections if not thread.is_alive()]:
+                    self.connections.pop(thread).close()
+                self.connections[threading.current_thread()] = connection
+        return connection.execute(sql, parameters)
+
+    def node(self, levels, path=()):
+        """
+        Get a node of the tree over some levels.
+
+        Parameters
+        ----------
+        levels : sequence of str
+            The facets of the levels, from the root down.
+        path : tuple of str
+            The category names leading from the root to the node.
+
+        Returns
+        -------
+        CatalogNode
+            The node.
+
+        Raises
+        ------
+        ValueError
+            If a level is not a facet, or appears twice.
+        """
+        levels = tuple(levels)
+        unknown = [level for level in levels if level not in FACET_TABLES and level not in FACET_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown facet '{unknown[0]}'.")
+        if not levels or len(set(levels)) != len(levels):
+            raise ValueError("The levels must be distinct facets.")
+        return CatalogNode(self, levels, tuple(path))
+
+    def where(self, levels, path=(), filters=None, operator='and', correlated=False):
+        """
+        Build the WHERE clause selecting the movies m below a node that match filters.
+
+        Parameters
+        ----------
+        levels : sequence of str
+            The facets of the levels of the path.
+        path : sequence of str
+            The category names leading from the root to the node.
+        filters : dict, optional
+            Facet name -> list of accepted values.
+        operator : str
+            How the facets of the filters are combined, 'and' or 'or'.
+        correlated : bool
+            Whether the conditions of the path probe the join indexes, see
+            facet_condition.
+
+        Returns
+        -------
+        tuple
+            (SQL clause, empty if nothing is selected, list of parameters).
+
+        Raises
+        ------
+        ValueError
+            If the operator or a facet is unknown.
+        """
+        if operator not in ('and', 'or'):
+            raise ValueError(f"Unknown operator '{operator}'.")
+        conditions = []
+        parameters = []
+        for facet, name in zip(levels, path):
+            condition, values = facet_condition(facet, [name], correlated)
+            conditions.append(condition)
+            parameters += values
+        if filters:
+            matches = []
+            for facet, values in filters.items():
+                condition, values = facet_condition(facet, values)
+                matches.append(condition)
+                parameters += values
+            conditions.append('(' + f' {operator.upper()} '.join(matches) + ')')
+        return (' WHERE ' + ' AND '.join(conditions) if conditions else ''), parameters
+
+    def query(self, levels, path=(), filters=None, operator='and', sort_key='imdbRating', ascending=False,
+              limit=None, offset=0):
+        """
+        List one page of the distinct movies below a node that match filters, sorted.
+
+        Movies without a value of the sort key come first in ascending order
+        and last in descending order, and ties are broken by IMDb ID, so the
+        order is that of the rank arrays of the tree.
+
+        Parameters
+        ----------
+        levels : sequence of str
+            The facets of the levels of the path.
+        path : sequence of str
+            The category names leading from the root to the node.
+        filters : dict, optional
+            Facet name -> list of accepted values.
+        operator : str
+            How the facets of the filters are combined, 'and' or 'or'.
+        sort_key : str
+            One of SORT_COLUMNS.
+        ascending : bool
+            The order of sorting.
+        limit : int, optional
+            The page size. All remaining movies if None.
+        offset : int
+            The number of movies to skip.
+
+        Returns
+        -------
+        list of str
+            The IMDb IDs of the page.
+
+        Raises
+        ------
+        ValueError
+            If the sort key, the operator or a facet is unknown.
+        """
+        if sort_key not in SORT_COLUMNS:
+            raise ValueError(f"Unknown sort key '{sort_key}'.")
+        # Walking the sort index reads about (offset + limit) * size / movies rows
+        # and collecting the node about movies rows, pick the cheaper one
+        movies = self.children(tuple(levels), tuple(path[:-1]))[path[-1]] if path else self.size
+        correlated = limit is not None and not filters and (offset + limit) * self.size < movies ** 2
+        where, parameters = self.where(levels, path, filters, operator, correlated)
+        direction = 'ASC' if ascending else 'DESC'
+        rows = self.execute(
+            f"SELECT m.imdb_id FROM movies m{where}"
+            f" ORDER BY m.{SORT_COLUMNS[sort_key]} {direction}, m.imdb_id {direction} LIMIT ? OFFSET ?",
+            parameters + [-1 if limit is None else limit, offset])
+        return [movie_id for movie_id, in rows]
+
+    def count(self, levels, path=(), filters=None, operator='and'):
+        """
+        Count the distinct movies below a node that match filters.
+
+        Parameters
+        ----------
+        levels, path, filters, operator
+            As in query.
+
+        Returns
+        -------
+        int
+            The number of movies.
+        """
+        where, parameters = self.where(levels, path, filters, operator)
+        return self.execute(f"SELECT COUNT(*) FROM movies m{where}", parameters).fetchone()[0]
+
+    def children(self, levels, path):
+        """
+        Count the movies below every child of a node, going through the cache.
+
+        Parameters
+        ----------
+        levels : tuple of str
+            The facets of the levels.
+        path : tuple of str
+            The path of the node.
+
+        Returns
+        -------
+        dict
+            Child name -> number of distinct movies. Over the levels of the
+            stored tree, the children are in the order they first appear in
+            the catalog, as in movies_tree.json. Over other levels, the
+            children with the most movies come first and ties are in
+            alphabetical order, as in a FacetView.
+        """
+        key = (levels, path)
+        with self.lock:
+            if key in self.nodes:
+                self.nodes.move_to_end(key)
+                return self.nodes[key]
+        facet = levels[len(path)]
+        where, parameters = self.where(levels, path)
+        stored = levels == self.levels
+        if facet in FACET_COLUMNS:
+            column = FACET_COLUMNS[facet]
+            order = "MIN(m.id)" if stored else f"movies DESC, m.{column}"
+            rows = self.execute(
+                f"SELECT m.{column}, COUNT(*) AS movies FROM movies m{where or ' WHERE 1'} AND m.{column} IS NOT NULL"
+                f" GROUP BY m.{column} ORDER BY {order}", parameters)
+        else:
+            join_table, value_table, key_column = FACET_TABLES[facet]
+            selected = f" WHERE j.movie_id IN (SELECT m.id FROM movies m{where})" if where else ''
+            # The first movie having a value, then the place of the value among those of that movie
+            order = f"MIN(j.movie_id * {MAX_VALUES} + j.position)" if stored else "movies DESC, v.name"
+            rows = self.execute(
+                f"SELECT v.name, COUNT(*) AS movies FROM {join_table} j JOIN {value_table} v ON v.id = j.{key_column}"
+                f"{selected} GROUP BY j.{key_column} ORDER BY {order}", parameters)
+        children = dict(rows.fetchall())
+        with self.lock:
+            self.nodes[key] = children
+            if len(self.nodes) > NODE_CACHE_SIZE:
+                self.nodes.popitem(last=False)
+        return children
+
+    def __getitem__(self, key):
+        return self.parts[key]
+
+    def __iter__(self):
+        return iter(self.parts)
+
+    def __len__(self):
+        return len(self.parts)
+
+    def close(self):
+        """
+        Close the connections of all threads.
+        """
+        with self.lock:
+            connections, self.connections = self.connections, {}
+        for connection in connections.values():
+            connection.close()
+
+
+class CatalogNode(Mapping):
+    """
+    An internal node of the tree of a MovieCatalog, usable wherever a node of the tree is.
+
+    Children at the last level are lists of IMDb IDs in catalog order, like
+    the leaves of the tree, and the others are CatalogNodes.
+
+    Parameters
+    ----------
+    catalog : MovieCatalog
+        The catalog the node belongs to.
+    levels : tuple of str
+        The facets of the levels, from the root down.
+    path : tuple of str
+        The category names leading from the root to the node.
+    """
+
+    def __init__(self, catalog, levels, path):
+        self.catalog = catalog
+        self.levels = levels
+        self.path = path
+
+    @property
+    def movie_ids(self):
+        """
+        The distinct IMDb IDs below the node, in catalog order.
+        """
+        where, parameters = self.catalog.where(self.levels, self.path)
+        return [movie_id for movie_id, in self.catalog.execute(
+            f"SELECT m.imdb_id FROM movies m{where} ORDER BY m.id", parameters)]
+
+    def counts(self):
+        """
+        Get the number of distinct movies below each child.
+
+        Returns
+        -------
+        dict
+            Child name -> movie count.
+        """
+        return self.catalog.children(self.levels, self.path)
+
+    def __getitem__(self, name):
+        if name not in self.counts():
+            raise KeyError(name)
+        child = CatalogNode(self.catalog, self.levels, self.path + (name,))
+        return child.movie_ids if len(child.path) == len(self.levels) else child
+
+    def __iter__(self):
+        return iter(self.counts())
+
+    def __len__(self):
+        return len(self.counts())
+
+
+class CatalogMovies(Mapping):
+    """
+    The movie table of a MovieCatalog, reading one movie per lookup.
+
+    Parameters
+    ----------
+    catalog : MovieCatalog
+        The catalog the table belongs to.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def __getitem__(self, movie_id):
+        row = self.catalog.execute(
+            "SELECT id, title, year, plot, imdb_rating, popularity, imdb_votes, poster FROM movies WHERE imdb_id = ?",
+            (movie_id,)).fetchone()
+        if row is None:
+            raise KeyError(movie_id)
+        row_id, title, year, plot, rating, popularity, votes, poster = row
+        people = {}
+        for facet in ['Director', 'Actor']:
+            join_table, value_table, key = FACET_TABLES[facet]
+            names = [name for name, in self.catalog.execute(
+                f"SELECT v.name FROM {join_table} j JOIN {value_table} v ON v.id = j.{key}"
+                f" WHERE j.movie_id = ? ORDER BY j.position", (row_id,))]
+            # People OMDb does not know are not stored
+            people[facet] = ', '.join(names) or 'N/A'
+        return {
+            'Title': title,
+            'Year': year,
+            'Director': people['Director'],
+            'Actors': people['Actor'],
+            'Plot': plot,
+            'imdbRating': rating,
+            'popularity': popularity,
+            'imdbVotes': votes,
+            'Poster': poster,
+        }
+
+    def __contains__(self, movie_id):
+        return self.catalog.execute("SELECT 1 FROM movies WHERE imdb_id = ?", (movie_id,)).fetchone() is not None
+
+    def __iter__(self):
+        return (movie_id for movie_id, in self.catalog.execute("SELECT imdb_id FROM movies ORDER BY id"))
+
+    def __len__(self):
+        return self.catalog.execute("SELECT COUNT(*) FROM movies").fetchone()[0]
+
+
+class CatalogRanks(Mapping):
+    """
+    The rank arrays of a MovieCatalog, read from the sort indexes per sort key.
+
+    Parameters
+    ----------
+    catalog : MovieCatalog
+        The catalog the rank arrays belong to.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def __getitem__(self, sort_key):
+        if sort_key not in SORT_COLUMNS:
+            raise KeyError(sort_key)
+        return self.catalog.query((), sort_key=sort_key, ascending=True)
+
+    def __iter__(self):
+        return iter(SORT_COLUMNS)
+
+    def __len__(self):
+        return len(SORT_COLUMNS)
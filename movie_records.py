@@ -0,0 +1,209 @@
+"""
+############################## Final Projec: Movie Records ############################
+
+Compact in-memory records of the OMDb catalog.
+
+A movie of movies_info_updated.json is a dictionary of about 25 strings,
+most of which nothing reads. A Movie keeps only the fields used by the
+build, the similarity index and the movie store, in __slots__ instead of an
+instance dictionary. Numbers are parsed once, multi-valued fields are
+tuples, and values that repeat across movies (genres, countries, languages,
+directors, actors, and the genre, country and language combinations, years
+and ratings) are shared so that every movie refers to one copy.
+load_movies streams the catalog, so the OMDb dictionaries are never all in
+memory at once.
+
+"""
+
+import hashlib
+import json
+import sys
+
+from json_stream import iter_json_items
+
+# The awards categories of the tree
+AWARDS = 'Awards'
+NO_AWARDS = 'No Awards'
+
+# Field -> the one copy of each of its values, for the fields with few distinct values
+SHARED = {}
+
+
+def parse_number(value, number_type):
+    """
+    Parse an OMDb number such as "8,123", "7.5" or "2019–2020".
+
+    Parameters
+    ----------
+    value : str, int or float
+        The raw value.
+    number_type : type
+        int or float.
+
+    Returns
+    -------
+    int, float or None
+        The parsed number, None if the value is missing.
+    """
+    if isinstance(value, (int, float)):
+        return number_type(value)
+    value = value.replace(',', '')
+    if number_type is int and not value.isdigit() and value[:4].isdigit():
+        # Years of series look like "2019–2020", keep the first one
+        value = value[:4]
+    try:
+        return number_type(value)
+    except ValueError:
+        return None
+
+def split_values(value):
+    """
+    Split a comma-separated OMDb field into a tuple of interned strings.
+    """
+    return tuple(sys.intern(part) for part in value.split(', '))
+
+def shared(field, value):
+    """
+    Get the shared copy of a value of a field, equal to value.
+
+    Every field has its own table, so that a rating of 9.0 never becomes a
+    runtime of 9.
+    """
+    values = SHARED.setdefault(field, {})
+    return values.setdefault(value, value)
+
+def get_movie_hash(movie_details):
+    """
+    Compute a content hash of the OMDb information of a movie.
+
+    Parameters
+    ----------
+    movie_details : dict
+        The OMDb information of a single movie.
+
+    Returns
+    -------
+    str
+        A hex digest that changes whenever any field of the movie changes.
+    """
+    content = json.dumps(movie_details, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+class Movie:
+    """
+    The fields of one movie that the project uses.
+
+    Attributes
+    ----------
+    imdbID, Title, Plot, Poster : str
+        As in OMDb.
+    Year, Runtime, imdbVotes : int or None
+        Parsed once, None if missing.
+    imdbRating, popularity : float or None
+        Parsed once, None if missing. popularity is tmdb_popularity.
+    Genre, Language, Country : tuple of str
+        Interned values, ('Unknown Genre',) and so on if missing.
+    Director, Actors : tuple of str
+        Interned names, ('N/A',) if OMDb does not know them.
+    Awards : str
+        The awards category, AWARDS or NO_AWARDS.
+    digest : str or None
+        The content hash of the OMDb information, if it was computed.
+    """
+
+    __slots__ = ('imdbID', 'Title', 'Year', 'Runtime', 'Genre', 'Director', 'Actors', 'Plot', 'Language',
+                 'Country', 'Awards', 'Poster', 'imdbRating', 'imdbVotes', 'popularity', 'digest')
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_omdb(cls, movie_id, movie_details, digest=False):
+        """
+        Make a record from the OMDb information of a movie.
+
+        Parameters
+        ----------
+        movie_id : str
+            The IMDb ID.
+        movie_details : dict
+            The OMDb information, with tmdb_popularity.
+        digest : bool
+            Whether to compute the content hash used by the incremental build.
+
+        Returns
+        -------
+        Movie
+            The record.
+        """
+        runtime = movie_details.get('Runtime', 'N/A')
+        return cls(
+            movie_id,
+            movie_details['Title'],
+            shared('Year', parse_number(movie_details.get('Year', 'N/A'), int)),
+            shared('Runtime', parse_number(runtime.split(' ')[0] if isinstance(runtime, str) else runtime, int)),
+            shared('Genre', split_values(movie_details.get('Genre', 'Unknown Genre'))),
+            split_values(movie_details.get('Director', 'N/A')),
+            split_values(movie_details.get('Actors', 'N/A')),
+            movie_details.get('Plot', ''),
+            shared('Language', split_values(movie_details.get('Language', 'Unknown Language'))),
+            shared('Country', split_values(movie_details.get('Country', 'Unknown Country'))),
+            AWARDS if movie_details.get('Awards', 'Unknown Awards') != 'N/A' else NO_AWARDS,
+            movie_details.get('Poster', 'N/A'),
+            shared('imdbRating', parse_number(movie_details.get('imdbRating', 'N/A'), float)),
+            parse_number(movie_details.get('imdbVotes', 'N/A'), int),
+            parse_number(movie_details.get('tmdb_popularity', 'N/A'), float),
+            get_movie_hash(movie_details) if digest else None,
+        )
+
+    def info(self):
+        """
+        Get the fields stored in the movie table of the tree.
+
+        Returns
+        -------
+        dict
+            The fields shown by the recommendation system.
+        """
+        return {
+            'Title': self.Title,
+            'Year': self.Year,
+            'Director': ', '.join(self.Director),
+            'Actors': ', '.join(self.Actors),
+            'Plot': self.Plot,
+            'imdbRating': self.imdbRating,
+            'popularity': self.popularity,
+            'imdbVotes': self.imdbVotes,
+            'Poster': self.Poster,
+        }
+
+    def __reduce__(self):
+        # Much smaller pickles for the build workers than the default for slots
+        return Movie, tuple(getattr(self, name) for name in self.__slots__)
+
+    def __str__(self):
+        return f"Movie({', '.join(f'{name}: {getattr(self, name)}' for name in self.__slots__)})"
+
+
+def load_movies(fileName, digest=False):
+    """
+    Load a catalog shaped like movies_info_updated.json as Movie records.
+
+    Parameters
+    ----------
+    fileName : str
+        The JSON file, plain or compressed.
+    digest : bool
+        Whether to compute the content hashes used by the incremental build.
+
+    Returns
+    -------
+    dict
+        IMDb ID -> Movie, in the order of the file. IDs that OMDb did not
+        know ("Response": "False") are left out.
+    """
+    return {movie_id: Movie.from_omdb(movie_id, movie_details, digest)
+            for movie_id, movie_details in iter_json_items(fileName)
+            if movie_details.get('Response') != 'False'}
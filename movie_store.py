@@ -0,0 +1,258 @@
+"""
+############################## Final Projec: Movie Store ############################
+
+A columnar, NumPy-backed view of movies_info_updated.json.
+
+Numeric fields are parsed once into typed arrays and the categorical fields
+are dictionary-encoded into multi-hot matrices, so filtering, sorting and
+counting run as vectorized array operations instead of loops over dicts.
+
+"""
+
+import numpy as np
+
+from movie_records import AWARDS, load_movies
+
+# Numeric columns and their dtypes. Missing integers are stored as -1 and
+# missing floats as NaN.
+NUMERIC_COLUMNS = {
+    'Year': np.int32,
+    'Runtime': np.int32,
+    'imdbRating': np.float32,
+    'imdbVotes': np.int64,
+    'popularity': np.float64,
+}
+
+# Comma-separated fields encoded as multi-hot matrices
+CATEGORICAL_COLUMNS = ['Genre', 'Country', 'Language']
+
+
+class MovieStore:
+    """
+    Typed columns of a movie catalog, one row per movie in IMDb ID order.
+
+    Parameters
+    ----------
+    movies_info : dict
+        IMDb ID -> Movie, see load_movies.
+
+    Attributes
+    ----------
+    ids : numpy.ndarray
+        The IMDb IDs, sorted.
+    columns : dict
+        Column name -> typed array, for every column in NUMERIC_COLUMNS.
+    vocabularies : dict
+        Categorical column -> sorted list of its values.
+    matrices : dict
+        Categorical column -> boolean matrix of shape (movies, values).
+    """
+
+    def __init__(self, movies_info):
+        ids = sorted(movies_info)
+        self.ids = np.array(ids)
+        self.positions = {movie_id: row for row, movie_id in enumerate(ids)}
+
+        self.columns = {}
+        for column, dtype in NUMERIC_COLUMNS.items():
+            # The records parsed their numbers already, only missing values need a stand-in
+            missing = np.nan if np.issubdtype(dtype, np.floating) else -1
+            values = (getattr(movies_info[movie_id], column) for movie_id in ids)
+            self.columns[column] = np.array([missing if value is None else value for value in values], dtype=dtype)
+
+        self.vocabularies = {}
+        self.matrices = {}
+        for column in CATEGORICAL_COLUMNS:
+            values = [getattr(movies_info[movie_id], column) for movie_id in ids]
+            vocabulary = sorted(set().union(*values))
+            codes = {value: code for code, value in enumerate(vocabulary)}
+            matrix = np.zeros((len(ids), len(vocabulary)), dtype=bool)
+            for row, row_values in enumerate(values):
+                matrix[row, [codes[value] for value in row_values]] = True
+            self.vocabularies[column] = vocabulary
+            self.matrices[column] = matrix
+
+        self.awards = np.array([movies_info[movie_id].Awards == AWARDS for movie_id in ids])
+
+        # Rank of every row for every numeric column. Missing values rank
+        # first and ties keep IMDb ID order, like the rank arrays of the tree.
+        self.ranks = {}
+        for column, values in self.columns.items():
+            keys = np.where(np.isnan(values), -np.inf, values) if np.issubdtype(values.dtype, np.floating) else values
+            order = np.argsort(keys, kind='stable')
+            ranks = np.empty(len(order), dtype=np.int64)
+            ranks[order] = np.arange(len(order))
+            self.ranks[column] = ranks
+
+    @classmethod
+    def from_json(cls, fileName):
+        """
+        Load a store from a JSON file of movie information.
+
+        Parameters
+        ----------
+        fileName : str
+            A file shaped like movies_info_updated.json.
+
+        Returns
+        -------
+        MovieStore
+            The loaded store.
+        """
+        return cls(load_movies(fileName))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rows_of(self, movie_ids):
+        """
+        Translate IMDb IDs into row numbers.
+
+        Parameters
+        ----------
+        movie_ids : iterable of str
+            IMDb IDs in the store.
+
+        Returns
+        -------
+        numpy.ndarray
+            The row of every ID.
+        """
+        return np.fromiter((self.positions[movie_id] for movie_id in movie_ids), dtype=np.int64)
+
+    def mask(self, filters=None, awards=None):
+        """
+        Select the movies matching categorical filters.
+
+        Values of the same column are combined with OR, the columns with AND.
+
+        Parameters
+        ----------
+        filters : dict, optional
+            Categorical column -> list of accepted values.
+        awards : bool, optional
+            Only keep movies with (True) or without (False) awards.
+
+        Returns
+        -------
+        numpy.ndarray
+            A boolean mask over the rows.
+        """
+        mask = np.ones(len(self.ids), dtype=bool)
+        for column, values in (filters or {}).items():
+            codes = [self.vocabularies[column].index(value) for value in values if value in self.vocabularies[column]]
+            mask &= self.matrices[column][:, codes].any(axis=1)
+        if awards is not None:
+            mask &= self.awards == awards
+        return mask
+
+    def sort(self, rows, column, ascending=True, limit=None):
+        """
+        Order rows by a numeric column.
+
+        Parameters
+        ----------
+        rows : numpy.ndarray
+            Row numbers, or a boolean mask over the rows.
+        column : str
+            A column in NUMERIC_COLUMNS.
+        ascending : bool
+            The order of sorting.
+        limit : int, optional
+            Only return the first rows. Selecting them uses a partial sort.
+
+        Returns
+        -------
+        numpy.ndarray
+            The sorted row numbers.
+        """
+        rows = np.flatnonzero(rows) if rows.dtype == bool else rows
+        keys = self.ranks[column][rows]
+        if not ascending:
+            keys = -keys
+        if limit is not None and limit < len(rows):
+            top = np.argpartition(keys, limit)[:limit]
+            return rows[top[np.argsort(keys[top])]]
+        return rows[np.argsort(keys)]
+
+    def sort_ids(self, movie_ids, column, ascending=True, limit=None):
+        """
+        Order IMDb IDs by a numeric column.
+
+        Parameters
+        ----------
+        movie_ids : iterable of str
+            The IMDb IDs to sort.
+        column : str
+            A column in NUMERIC_COLUMNS.
+        ascending : bool
+            The order of sorting.
+        limit : int, optional
+            Only return the first IDs.
+
+        Returns
+        -------
+        list of str
+            The sorted IMDb IDs.
+        """
+        return self.ids[self.sort(self.rows_of(movie_ids), column, ascending, limit)].tolist()
+
+    def categories(self, column, rows=None):
+        """
+        List the values of a categorical column that occur in the selected rows.
+
+        Parameters
+        ----------
+        column : str
+            A column in CATEGORICAL_COLUMNS.
+        rows : numpy.ndarray, optional
+            Row numbers or a boolean mask. All rows if omitted.
+
+        Returns
+        -------
+        list of str
+            The values in alphabetical order.
+        """
+        counts = self.value_counts(column, rows)
+        return [value for value, count in counts.items() if count]
+
+    def value_counts(self, column, rows=None):
+        """
+        Count the movies having each value of a categorical column.
+
+        Parameters
+        ----------
+        column : str
+            A column in CATEGORICAL_COLUMNS.
+        rows : numpy.ndarray, optional
+            Row numbers or a boolean mask. All rows if omitted.
+
+        Returns
+        -------
+        dict
+            Value -> number of movies, in alphabetical order of the values.
+        """
+        matrix = self.matrices[column] if rows is None else self.matrices[column][rows]
+        return dict(zip(self.vocabularies[column], matrix.sum(axis=0).tolist()))
+
+    def mean(self, column, rows=None):
+        """
+        Average a numeric column over the selected rows, ignoring missing values.
+
+        Parameters
+        ----------
+        column : str
+            A column in NUMERIC_COLUMNS.
+        rows : numpy.ndarray, optional
+            Row numbers or a boolean mask. All rows if omitted.
+
+        Returns
+        -------
+        float
+            The mean, NaN if no selected row has a value.
+        """
+        values = self.columns[column] if rows is None else self.columns[column][rows]
+        values = values.astype(np.float64)
+        if not np.issubdtype(self.columns[column].dtype, np.floating):
+            values[values < 0] = np.nan
+        return float(np.nanmean(values)) if np.any(~np.isnan(values)) else float('nan')
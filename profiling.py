@@ -0,0 +1,287 @@
+"""
+############################## Final Projec: Profiling ############################
+
+Opt-in timers, counters and latency histograms for the pipeline, the build
+and the recommendation sessions.
+
+Profiling is off unless the MOVIES_PROFILE environment variable is set, or
+enable() is called, for example by a --profile flag. When it is off, timer()
+returns one shared do-nothing context manager and count() returns at once,
+so the instrumented code pays a function call and nothing else.
+
+When it is on, every timer records its duration in the latency histogram of
+its name, and a summary of the timers and counters is printed to stderr at
+exit. If MOVIES_PROFILE (or the output of enable()) names a .json file, the
+timed spans are also written there in the Chrome trace format, which
+chrome://tracing and https://ui.perfetto.dev open.
+
+Usage:
+    MOVIES_PROFILE=1 python "Build Trees.py"
+    MOVIES_PROFILE=session_trace.json python "User Interaction.py"
+
+Names are dotted, the first part being the category of the trace, e.g.
+'build.tree', 'http.www.omdbapi.com' or 'engine.node_cache.hits'. Worker
+processes of the parallel build and the batch mode are not recorded.
+
+"""
+
+import atexit
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+
+ENV_VARIABLE = 'MOVIES_PROFILE'
+
+# Upper bounds of the histogram buckets in seconds, four per doubling from
+# one microsecond, so percentiles are accurate to about 19%
+BUCKETS = [1e-6 * 2 ** (step / 4) for step in range(4 * 32)]
+
+# Spans kept for the trace, the oldest are kept and later ones dropped
+MAX_TRACE_EVENTS = 1000000
+
+
+class Histogram:
+    """
+    The distribution of the durations recorded under one name.
+    """
+
+    __slots__ = ('counts', 'count', 'total', 'maximum')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, seconds):
+        """
+        Record one duration.
+        """
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+
+    def percentile(self, fraction):
+        """
+        Get the upper bound of the bucket holding a percentile.
+
+        Parameters
+        ----------
+        fraction : float
+            The percentile as a fraction, e.g. 0.99.
+
+        Returns
+        -------
+        float
+            The duration in seconds, never more than the maximum.
+        """
+        rank = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(BUCKETS[bucket] if bucket < len(BUCKETS) else self.maximum, self.maximum)
+        return self.maximum
+
+
+class Profiler:
+    """
+    The timers, counters and trace of one process.
+
+    Parameters
+    ----------
+    output : str, optional
+        A .json file to write the Chrome trace to at exit.
+    """
+
+    def __init__(self, output=None):
+        self.output = output
+        self.origin = time.perf_counter()
+        # Fetches run on thread pools, so updates take a lock
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.events = []
+
+    def count(self, name, amount=1):
+        """
+        Add to a counter.
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, start, seconds):
+        """
+        Record a timed span.
+
+        Parameters
+        ----------
+        name : str
+            The name of the timer.
+        start : float
+            The time.perf_counter() at the start of the span.
+        seconds : float
+            The duration of the span.
+        """
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(seconds)
+            if self.output and len(self.events) < MAX_TRACE_EVENTS:
+                self.events.append((name, start, seconds, threading.get_ident()))
+
+    def summary(self):
+        """
+        Format the timers and counters as a table.
+
+        Returns
+        -------
+        str
+            The summary, slowest timers first.
+        """
+        lines = [f"Profile of {' '.join(sys.argv) or 'python'} ({time.perf_counter() - self.origin:.2f} s)"]
+        if self.histograms:
+            lines.append(f"{'timer':<36}{'calls':>9}{'total ms':>12}{'mean ms':>10}"
+                         f"{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+            for name, histogram in sorted(self.histograms.items(), key=lambda item: -item[1].total):
+                lines.append(
+                    f"{name:<36}{histogram.count:>9}{histogram.total * 1000:>12.2f}"
+                    f"{histogram.total / histogram.count * 1000:>10.3f}"
+                    + ''.join(f"{histogram.percentile(fraction) * 1000:>10.3f}" for fraction in (0.5, 0.9, 0.99))
+                    + f"{histogram.maximum * 1000:>10.3f}")
+        if self.counters:
+            lines.append(f"{'counter':<36}{'value':>9}")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"{name:<36}{value:>9}")
+        return '\n'.join(lines)
+
+    def trace(self):
+        """
+        Build the Chrome trace of the recorded spans and the final counters.
+
+        Returns
+        -------
+        dict
+            The trace, in the JSON object format of the Trace Event Format.
+        """
+        pid = os.getpid()
+        events = [
+            {'name': name, 'cat': name.split('.')[0], 'ph': 'X', 'pid': pid, 'tid': tid,
+             'ts': (start - self.origin) * 1e6, 'dur': seconds * 1e6}
+            for name, start, seconds, tid in self.events
+        ]
+        end = (time.perf_counter() - self.origin) * 1e6
+        events += [{'name': name, 'ph': 'C', 'pid': pid, 'ts': end, 'args': {'value': value}}
+                   for name, value in sorted(self.counters.items())]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def dump(self):
+        """
+        Print the summary to stderr and write the trace, if it has a file.
+        """
+        print(self.summary(), file=sys.stderr)
+        if self.output:
+            with open(self.output, 'w', encoding='utf-8') as file:
+                json.dump(self.trace(), file)
+            print(f"Wrote the trace to '{self.output}'.", file=sys.stderr)
+
+
+class Timer:
+    """
+    A context manager that records the time spent in its block.
+    """
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        # The profiler may have been replaced meanwhile, record into the current one
+        if profiler is not None:
+            profiler.observe(self.name, self.start, time.perf_counter() - self.start)
+
+
+class NullTimer:
+    """
+    The timer handed out while profiling is off.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return None
+
+
+NULL_TIMER = NullTimer()
+
+# The active Profiler, None while profiling is off
+profiler = None
+
+
+def enable(output=None):
+    """
+    Turn profiling on for the rest of the process and report at exit.
+
+    Parameters
+    ----------
+    output : str, optional
+        A .json file to write the Chrome trace to. Other values only turn
+        the summary on.
+
+    Returns
+    -------
+    Profiler
+        The active profiler.
+    """
+    global profiler
+    if profiler is None:
+        profiler = Profiler(output if output and output.endswith('.json') else None)
+        atexit.register(profiler.dump)
+    return profiler
+
+def timer(name):
+    """
+    Time a block: with timer('build.tree'): ...
+
+    Parameters
+    ----------
+    name : str
+        The name of the timer, also the name of its histogram.
+
+    Returns
+    -------
+    Timer or NullTimer
+        A context manager.
+    """
+    return NULL_TIMER if profiler is None else Timer(name)
+
+def count(name, amount=1):
+    """
+    Add to a counter, if profiling is on.
+    """
+    if profiler is not None:
+        profiler.count(name, amount)
+
+def cache_lookup(name, hit):
+    """
+    Count a hit or a miss of a cache, as '<name>.hits' or '<name>.misses'.
+    """
+    if profiler is not None:
+        profiler.count(f'{name}.hits' if hit else f'{name}.misses')
+
+
+if os.environ.get(ENV_VARIABLE):
+    enable(os.environ[ENV_VARIABLE])
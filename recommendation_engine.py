@@ -0,0 +1,1180 @@
+"""
+############################## Final Projec: Recommendation Engine ############################
+
+The recommendation logic of User Interaction.py as plain functions.
+
+A RecommendationEngine loads the tree, the facet indexes and the optional
+title index, movie store and similarity vectors once, and answers
+navigation, filtering, sorting, pagination and summary lookups without any
+input() or print(). The interactive front end is built on it, and
+run_batch answers a JSONL file of queries with several processes.
+
+"""
+
+import copy
+import heapq
+import json
+import os
+from collections import OrderedDict
+from collections.abc import Mapping
+from multiprocessing import Pool, util
+
+from facet_views import DEFAULT_LEVELS, FacetView, MovieFacets, ViewNode
+from json_stream import find_json, read_json
+from lazy_tree import NodeStore
+from movie_catalog import CatalogNode, MovieCatalog
+from profiling import cache_lookup, timer
+from response_cache import ResponseCache
+from title_index import TitleIndex, wikipedia_titles
+from tree_snapshot import TreeSnapshot
+from wikipedia import SummaryPrefetcher
+
+try:
+    from movie_store import MovieStore
+except ImportError:  # NumPy is not installed, listings fall back to the rank arrays
+    MovieStore = None
+
+try:
+    from similarity import SimilarityIndex
+except ImportError:  # NumPy is not installed, similar movies are not offered
+    SimilarityIndex = None
+
+TREE_FILES = {
+    'snapshot': 'movies_tree.bin',
+    'nodes': 'movies_tree_nodes.sqlite',
+    'sql': 'movies_catalog.sqlite',
+    'json': 'movies_tree.json',
+}
+INFO_FILE = 'movies_info_updated.json'
+INDEX_FILE = 'movies_index.json'
+TITLE_INDEX_FILE = 'movies_title_index.json'
+VECTORS_FILE = 'movies_vectors.npz'
+CACHE_FILE = 'http_cache.sqlite'
+
+SORT_KEYS = ['imdbRating', 'popularity', 'Year', 'imdbVotes']
+
+# Number of nodes whose distinct movies are kept in memory
+NODE_CACHE_SIZE = 512
+
+# Number of browsing orders whose views are kept in memory
+VIEW_CACHE_SIZE = 8
+
+# Number of movies per page of a listing
+PAGE_SIZE = 20
+
+# Number of paged listings whose order is kept in memory
+LISTING_CACHE_SIZE = 32
+
+# A listing walks the rank array when its node holds at least 1/WALK_DENSITY
+# of the catalog, so a page reads at most about WALK_DENSITY times its size
+WALK_DENSITY = 8
+
+# Number of queries sent to a batch worker at a time
+BATCH_CHUNK_SIZE = 64
+
+def union_ids(id_lists):
+    """
+    Merge sorted lists of movie IDs into one sorted list without duplicates.
+
+    Parameters
+    ----------
+    id_lists : list of list of str
+        Sorted lists of IMDb IDs.
+
+    Returns
+    -------
+    list of str
+        The sorted union of the lists.
+    """
+    if len(id_lists) == 1:
+        return id_lists[0]
+    return sorted(set().union(*id_lists))
+
+def intersect_ids(id_lists):
+    """
+    Intersect sorted lists of movie IDs.
+
+    The intersection starts from the shortest list and only probes the
+    others, so it costs time proportional to the smallest input, not to the
+    size of the catalog.
+
+    Parameters
+    ----------
+    id_lists : list of list of str
+        Sorted lists of IMDb IDs.
+
+    Returns
+    -------
+    list of str
+        The sorted IDs present in every list.
+    """
+    id_lists = sorted(id_lists, key=len)
+    result = id_lists[0]
+    for ids in id_lists[1:]:
+        if not result:
+            break
+        members = set(ids)
+        result = [movie_id for movie_id in result if movie_id in members]
+    return result
+
+def query_movies(indexes, filters, operator='and'):
+    """
+    Find the movies matching facet filters using the inverted indexes.
+
+    Values listed for the same facet are combined with OR, so
+    {'Genre': ['Comedy', 'Drama']} matches either genre. The facets are then
+    combined with the given operator, so with 'and'
+    {'Country': ['South Korea'], 'Awards': ['Awards']} matches award-winning
+    Korean films.
+
+    Parameters
+    ----------
+    indexes : dict
+        Facet name -> {facet value -> sorted list of IMDb IDs}, as written
+        to movies_index.json by Build Trees.py.
+    filters : dict
+        Facet name -> list of accepted values.
+    operator : str
+        How the facets are combined, 'and' or 'or'.
+
+    Returns
+    -------
+    list of str
+        The sorted IMDb IDs of the matching movies.
+
+    Raises
+    ------
+    ValueError
+        If the operator or a facet name is unknown.
+    """
+    if operator not in ('and', 'or'):
+        raise ValueError(f"Unknown operator '{operator}'.")
+    facet_ids = []
+    for facet, values in filters.items():
+        if facet not in indexes:
+            raise ValueError(f"Unknown facet '{facet}'.")
+        facet_ids.append(union_ids([indexes[facet].get(value, []) for value in values]))
+    if not facet_ids:
+        return []
+    return intersect_ids(facet_ids) if operator == 'and' else union_ids(facet_ids)
+
+def paginate(items, offset=0, limit=None):
+    """
+    Cut one page out of a listing.
+
+    Parameters
+    ----------
+    items : list
+        The whole listing.
+    offset : int
+        The number of items to skip.
+    limit : int, optional
+        The page size. The rest of the listing if omitted.
+
+    Returns
+    -------
+    list
+        The items of the page.
+    """
+    return items[offset:] if limit is None else items[offset:offset + limit]
+
+def default_backend():
+    """
+    Get the backend used when none is chosen.
+
+    Returns
+    -------
+    str
+        'snapshot' if movies_tree.bin exists, 'json' otherwise.
+    """
+    return 'snapshot' if os.path.exists(TREE_FILES['snapshot']) else 'json'
+
+class Listing:
+    """
+    The sorted movies below a node, selected a page at a time.
+
+    With a MovieCatalog a page is one query with LIMIT and OFFSET. Otherwise,
+    for the whole catalog or a node holding at least 1/WALK_DENSITY of it,
+    the rank array of the sort key is walked from the requested end and the
+    walk stops once the page is full, so a page of k movies reads about
+    k * WALK_DENSITY entries of it at most. For sparser nodes a page is a
+    top-K selection with heapq over the rank positions of the movies ranked
+    after the last listed one, O(n log k) for n movies instead of sorting
+    them all. The movies listed so far are kept, so listing them again reads
+    nothing.
+
+    Parameters
+    ----------
+    engine : RecommendationEngine
+        The engine of the browsing order.
+    path : tuple of str
+        The path of the node.
+    filters : dict, optional
+        Facet name -> list of accepted values.
+    operator : str
+        How the facets are combined, 'and' or 'or'.
+    sort_key : str
+        One of SORT_KEYS.
+    ascending : bool
+        The order of sorting.
+    """
+
+    def __init__(self, engine, path, filters, operator, sort_key, ascending):
+        self.engine = engine
+        self.path = path
+        self.filters = filters
+        self.operator = operator
+        self.sort_key = sort_key
+        self.ascending = ascending
+        # Chosen on the first page: the movies of the node for a walk (None
+        # for every movie), or their rank positions for a heap selection
+        self.members = None
+        self.positions = None
+        # The number of entries of the rank array the walk has passed
+        self.walked = 0
+        self.listed = []
+        self.complete = False
+        self.started = False
+
+    def start(self):
+        """
+        Select the movies of the node and choose between the walk and the heap.
+        """
+        engine = self.engine
+        self.started = True
+        if not self.path and not self.filters:
+            return
+        movie_ids = engine.select(self.path, self.filters, self.operator)
+        if len(movie_ids) * WALK_DENSITY >= len(engine.movies):
+            self.members = set(movie_ids)
+        else:
+            order, positions = engine.rank_positions(self.sort_key)
+            self.positions = [positions[movie_id] for movie_id in movie_ids]
+
+    def extend(self, count):
+        """
+        List the next movies.
+
+        Parameters
+        ----------
+        count : int
+            The number of movies to add to the listed ones.
+        """
+        engine = self.engine
+        if engine.pages_natively:
+            movie_ids = engine.listing(self.path, self.filters, self.operator, self.sort_key, self.ascending,
+                                       count, len(self.listed))
+        else:
+            if not self.started:
+                self.start()
+            if self.positions is not None:
+                order, positions = engine.rank_positions(self.sort_key)
+                if self.ascending:
+                    last = positions[self.listed[-1]] if self.listed else -1
+                    chosen = heapq.nsmallest(count, (position for position in self.positions if position > last))
+                else:
+                    last = positions[self.listed[-1]] if self.listed else len(order)
+                    chosen = heapq.nlargest(count, (position for position in self.positions if position < last))
+                movie_ids = [order[position] for position in chosen]
+            else:
+                order = engine.movie_tree['ranks'][self.sort_key]
+                movie_ids = []
+                while len(movie_ids) < count and self.walked < len(order):
+                    movie_id = order[self.walked if self.ascending else len(order) - 1 - self.walked]
+                    self.walked += 1
+                    if self.members is None or movie_id in self.members:
+                        movie_ids.append(movie_id)
+        self.listed += movie_ids
+        self.complete = len(movie_ids) < count
+
+    def page(self, offset, limit):
+        """
+        Get one page of the listing, selecting the movies not listed yet.
+
+        Parameters
+        ----------
+        offset : int
+            The number of movies to skip.
+        limit : int
+            The page size.
+
+        Returns
+        -------
+        tuple
+            (IMDb IDs of the page, whether more movies follow it).
+        """
+        # One movie more tells whether there is a next page
+        if not self.complete and len(self.listed) <= offset + limit:
+            self.extend(offset + limit + 1 - len(self.listed))
+        return self.listed[offset:offset + limit], len(self.listed) > offset + limit
+
+class RecommendationEngine:
+    """
+    Query the movie tree without user interaction.
+
+    Parameters
+    ----------
+    movie_tree : Mapping
+        The normalized movie tree, loaded from movies_tree.json, opened as a
+        TreeSnapshot from movies_tree.bin, as a NodeStore from
+        movies_tree_nodes.sqlite or as a MovieCatalog from
+        movies_catalog.sqlite, with the keys 'movies', 'tree' and 'ranks'.
+    indexes : dict, optional
+        The facet indexes from movies_index.json, needed for filters.
+    store : MovieStore, optional
+        A columnar store of the catalog. If given, listings are sorted with
+        vectorized array operations instead of the rank arrays of the tree.
+    cache : ResponseCache, optional
+        The response cache used for Wikipedia summaries.
+    title_index : TitleIndex, optional
+        Resolves free-text movie names against the catalog.
+    similarity : SimilarityIndex, optional
+        Content-based vectors of the catalog, for similar movies.
+    """
+
+    def __init__(self, movie_tree, indexes=None, store=None, cache=None, title_index=None, similarity=None):
+        self.movie_tree = movie_tree
+        self.movies = movie_tree['movies']
+        self.tree = movie_tree['tree']
+        self.levels = DEFAULT_LEVELS
+        self.indexes = indexes
+        self.store = store
+        self.title_index = title_index
+        self.similarity = similarity
+        self.prefetcher = SummaryPrefetcher(cache)
+        # Path -> distinct IMDb IDs below the node, in LRU order
+        self.node_movies = OrderedDict()
+        # Engines browsing other orders of facets share everything but the tree
+        self.base = self
+        self.facets = MovieFacets(indexes) if indexes is not None else None
+        self.views = OrderedDict()
+        # Sort key -> (rank array, IMDb ID -> position in it), shared by all browsing orders
+        self.ranks = {}
+        # (path, filters, operator, sort key, ascending) -> Listing, in LRU order
+        self.listings = OrderedDict()
+
+    @classmethod
+    def load(cls, backend=None, use_cache=True):
+        """
+        Load an engine from the files written by Build Trees.py.
+
+        Parameters
+        ----------
+        backend : str, optional
+            'snapshot' to map movies_tree.bin, 'nodes' to fetch nodes lazily
+            from movies_tree_nodes.sqlite, 'sql' to query the normalized
+            catalog in movies_catalog.sqlite or 'json' to load
+            movies_tree.json, plain or compressed, together with a
+            MovieStore. Chosen by default_backend if omitted.
+        use_cache : bool
+            Whether to open the response cache for summaries.
+
+        Returns
+        -------
+        RecommendationEngine
+            The engine.
+        """
+        backend = backend or default_backend()
+        store = None
+        if backend == 'snapshot':
+            # Nothing is decoded until a node is visited
+            movie_tree = TreeSnapshot(TREE_FILES['snapshot'])
+        elif backend == 'nodes':
+            # Only visited nodes are fetched, their likely children are prefetched
+            movie_tree = NodeStore(TREE_FILES['nodes'])
+        elif backend == 'sql':
+            # Navigation and listings are indexed queries, only their rows are read
+            movie_tree = MovieCatalog(TREE_FILES['sql'])
+        else:
+            with timer('engine.load.tree'):
+                movie_tree = read_json(find_json(TREE_FILES['json']) or TREE_FILES['json'])
+            with timer('engine.load.store'):
+                store = MovieStore.from_json(INFO_FILE) if MovieStore is not None else None
+
+        with timer('engine.load.indexes'):
+            indexFileName = find_json(INDEX_FILE)
+            indexes = read_json(indexFileName) if indexFileName else None
+
+        with timer('engine.load.title_index'):
+            titleIndexFileName = find_json(TITLE_INDEX_FILE)
+            if titleIndexFileName:
+                title_index = TitleIndex.from_dict(read_json(titleIndexFileName))
+            else:
+                title_index = TitleIndex.from_movies(movie_tree['movies'])
+
+        similarity = None
+        if SimilarityIndex is not None and os.path.exists(VECTORS_FILE):
+            with timer('engine.load.vectors'):
+                similarity = SimilarityIndex.load(VECTORS_FILE)
+
+        cache = ResponseCache(CACHE_FILE) if use_cache else None
+        return cls(movie_tree, indexes, store, cache, title_index, similarity)
+
+    def node(self, path=()):
+        """
+        Navigate to a node of the tree.
+
+        Parameters
+        ----------
+        path : sequence of str
+            The category names leading from the root to the node.
+
+        Returns
+        -------
+        Mapping or list
+            The node, a mapping of subcategories or a list of IMDb IDs.
+
+        Raises
+        ------
+        KeyError
+            If the path does not exist.
+        """
+        node = self.tree
+        for name in path:
+            if not isinstance(node, Mapping):
+                raise KeyError(name)
+            node = node[name]
+        return node
+
+    def options(self, path=()):
+        """
+        List the subcategories of a node.
+
+        Parameters
+        ----------
+        path : sequence of str
+            The path of the node.
+
+        Returns
+        -------
+        list of str
+            The subcategory names, empty for a leaf.
+        """
+        node = self.node(path)
+        return list(node.keys()) if isinstance(node, Mapping) else []
+
+    def movie_ids(self, path=()):
+        """
+        Collect the distinct movies below a node.
+
+        The result of every node is memoized, and a node is merged from the
+        memoized results of its children, so each leaf is read once and a
+        repeated listing costs nothing. The returned list is shared with the
+        cache and must not be modified.
+
+        Parameters
+        ----------
+        path : sequence of str
+            The path of the node.
+
+        Returns
+        -------
+        list of str
+            The unique IMDb IDs, in order of first appearance.
+        """
+        def cached(path):
+            hit = path in self.node_movies
+            cache_lookup('engine.node_cache', hit)
+            if hit:
+                self.node_movies.move_to_end(path)
+                return self.node_movies[path]
+            return None
+
+        def collect(path, node):
+            if isinstance(node, list):
+                movie_ids = list(dict.fromkeys(node))
+            elif isinstance(node, (ViewNode, CatalogNode)):
+                movie_ids = node.movie_ids
+            else:
+                children = []
+                for name in node:
+                    child_ids = cached(path + (name,))
+                    children.append(child_ids if child_ids is not None else collect(path + (name,), node[name]))
+                movie_ids = list(dict.fromkeys(movie_id for child_ids in children for movie_id in child_ids))
+            self.node_movies[path] = movie_ids
+            if len(self.node_movies) > NODE_CACHE_SIZE:
+                self.node_movies.popitem(last=False)
+            return movie_ids
+
+        path = tuple(path)
+        movie_ids = cached(path)
+        if movie_ids is not None:
+            return movie_ids
+        with timer('engine.collect_movies'):
+            return collect(path, self.node(path))
+
+    def with_levels(self, levels):
+        """
+        Get an engine that browses the catalog in another order of facets.
+
+        The tree of the new order is a FacetView built lazily from the facet
+        indexes, or the same order of nodes of a MovieCatalog, so no tree has
+        to be built for it. The engines of the most
+        recently used orders are kept, up to VIEW_CACHE_SIZE. They share the
+        movie table, the indexes and the summaries with this engine, which
+        is the only one that needs to be closed.
+
+        Parameters
+        ----------
+        levels : sequence of str
+            Facets of movies_index.json, from the root down, e.g.
+            ['Genre', 'Decade', 'Rating'].
+
+        Returns
+        -------
+        RecommendationEngine
+            The engine, this one's base engine for the default levels.
+
+        Raises
+        ------
+        ValueError
+            If the engine has no facet indexes nor catalog, or the levels are
+            invalid.
+        """
+        base = self.base
+        levels = tuple(levels)
+        if levels == DEFAULT_LEVELS:
+            return base
+        if levels in base.views:
+            base.views.move_to_end(levels)
+            return base.views[levels]
+        if isinstance(base.movie_tree, MovieCatalog):
+            tree = base.movie_tree.node(levels)
+        elif base.facets is not None:
+            tree = FacetView(base.facets, levels, list(base.movies)).root
+        else:
+            raise ValueError(f"Browsing orders need the facet indexes in '{INDEX_FILE}'.")
+        engine = copy.copy(base)
+        engine.levels = levels
+        engine.tree = tree
+        engine.node_movies = OrderedDict()
+        engine.listings = OrderedDict()
+        base.views[levels] = engine
+        if len(base.views) > VIEW_CACHE_SIZE:
+            base.views.popitem(last=False)
+        return engine
+
+    def counts(self, path=()):
+        """
+        Count the distinct movies below each subcategory of a node.
+
+        The snapshot and the node store keep these counts in the tree, so
+        they are read without visiting the subcategories. With the JSON tree
+        they come from movie_ids.
+
+        Parameters
+        ----------
+        path : sequence of str
+            The path of the node.
+
+        Returns
+        -------
+        dict
+            Subcategory name -> movie count, empty for a leaf.
+        """
+        node = self.node(path)
+        if not isinstance(node, Mapping):
+            return {}
+        if hasattr(node, 'counts'):
+            return node.counts()
+        return {name: len(self.movie_ids(tuple(path) + (name,))) for name in node}
+
+    def invalidate(self, path=None):
+        """
+        Drop memoized movie lists after the tree was changed in place.
+
+        Parameters
+        ----------
+        path : sequence of str, optional
+            The changed node. Its entry, the entries of its ancestors and of
+            its descendants are dropped. Everything is dropped if omitted.
+        """
+        # A changed node may move any movie in the rank arrays
+        self.ranks.clear()
+        if path is None:
+            self.node_movies.clear()
+            self.listings.clear()
+            return
+        path = tuple(path)
+        for cached in list(self.node_movies):
+            if cached[:len(path)] == path or path[:len(cached)] == cached:
+                del self.node_movies[cached]
+        for key in list(self.listings):
+            if key[0][:len(path)] == path or path[:len(key[0])] == key[0]:
+                del self.listings[key]
+
+    def filter(self, filters, operator='and'):
+        """
+        Find the movies matching facet filters, see query_movies.
+
+        Parameters
+        ----------
+        filters : dict
+            Facet name -> list of accepted values.
+        operator : str
+            How the facets are combined, 'and' or 'or'.
+
+        Returns
+        -------
+        list of str
+            The sorted IMDb IDs of the matching movies.
+
+        Raises
+        ------
+        ValueError
+            If the engine has no facet indexes, or the filters are invalid.
+        """
+        if self.indexes is None:
+            raise ValueError(f"Filters need the facet indexes in '{INDEX_FILE}'.")
+        return query_movies(self.indexes, filters, operator)
+
+    def select(self, path=(), filters=None, operator='and'):
+        """
+        Find the movies below a node that match facet filters.
+
+        Parameters
+        ----------
+        path : sequence of str
+            The path of the node, the root if empty.
+        filters : dict, optional
+            Facet name -> list of accepted values.
+        operator : str
+            How the facets are combined, 'and' or 'or'.
+
+        Returns
+        -------
+        list of str
+            The unique IMDb IDs.
+        """
+        if not filters:
+            return self.movie_ids(path) if path else list(self.movies)
+        matches = self.filter(filters, operator)
+        if not path:
+            return matches
+        return intersect_ids([self.movie_ids(path), matches])
+
+    def sort(self, movie_ids, sort_key, ascending=True, limit=None):
+        """
+        Order movies by a sort key.
+
+        With a MovieStore the IDs are ordered by an argsort over its rank
+        columns. Otherwise the movies are not compared at all: the presorted
+        rank array of the key is walked forwards or backwards and the movies
+        of the listing are picked out of it, which takes linear time and
+        parses no strings.
+
+        Parameters
+        ----------
+        movie_ids : list of str
+            The unique IMDb IDs of the movies to be sorted.
+        sort_key : str
+            One of SORT_KEYS.
+        ascending : bool
+            The order of sorting.
+        limit : int, optional
+            Stop after this many movies.
+
+        Returns
+        -------
+        list of str
+            The sorted IMDb IDs.
+
+        Raises
+        ------
+        ValueError
+            If the sort key is unknown.
+        """
+        if sort_key not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key '{sort_key}'.")
+        if self.store is not None:
+            return self.store.sort_ids(movie_ids, sort_key, ascending, limit)
+
+        members = set(movie_ids)
+        order = self.movie_tree['ranks'][sort_key]
+        sorted_ids = []
+        for movie_id in (order if ascending else reversed(order)):
+            if movie_id in members:
+                sorted_ids.append(movie_id)
+                if len(sorted_ids) == limit:
+                    break
+        return sorted_ids
+
+    def listing(self, path=(), filters=None, operator='and', sort_key='imdbRating', ascending=False,
+                limit=None, offset=0):
+        """
+        Get one page of the sorted, distinct IMDb IDs below a node that match facet filters.
+
+        With a MovieCatalog this is one indexed query with LIMIT and OFFSET,
+        and only the page is read. Otherwise the movies are selected and
+        sorted, see select and sort.
+
+        Parameters
+        ----------
+        path : sequence of str
+            The path of the node, the root if empty.
+        filters : dict, optional
+            Facet name -> list of accepted values.
+        operator : str
+            How the facets are combined, 'and' or 'or'.
+        sort_key : str
+            One of SORT_KEYS.
+        ascending : bool
+            The order of sorting.
+        limit : int, optional
+            The page size. All remaining movies if None.
+        offset : int
+            The number of movies to skip.
+
+        Returns
+        -------
+        list of str
+            The IMDb IDs of the page.
+
+        Raises
+        ------
+        ValueError
+            If the sort key, the operator or a facet is unknown.
+        KeyError
+            If the path does not exist.
+        """
+        if self.pages_natively:
+            path = tuple(path)
+            # A missing category raises KeyError as with the other backends, without reading the leaf
+            if path and path[-1] not in self.node(path[:-1]):
+                raise KeyError(path[-1])
+            return self.movie_tree.query(self.tree.levels, path, filters, operator, sort_key, ascending,
+                                         limit, offset)
+        movie_ids = self.select(path, filters, operator)
+        sorted_ids = self.sort(movie_ids, sort_key, ascending, None if limit is None else offset + limit)
+        return paginate(sorted_ids, offset, limit)
+
+    @property
+    def pages_natively(self):
+        """
+        Whether listing reads only the requested page, as with a MovieCatalog.
+        """
+        return isinstance(self.movie_tree, MovieCatalog)
+
+    def total(self, path=(), filters=None, operator='and'):
+        """
+        Count the distinct movies below a node that match facet filters.
+
+        Parameters
+        ----------
+        path, filters, operator
+            As in listing.
+
+        Returns
+        -------
+        int
+            The number of movies listing pages through.
+
+        Raises
+        ------
+        ValueError
+            If the operator or a facet is unknown.
+        KeyError
+            If the path does not exist.
+        """
+        path = tuple(path)
+        if not filters and path:
+            # The menus already count the movies of every subcategory
+            counts = self.counts(path[:-1])
+            if path[-1] not in counts:
+                raise KeyError(path[-1])
+            return counts[path[-1]]
+        if self.pages_natively:
+            return self.movie_tree.count(self.tree.levels, path, filters, operator)
+        return len(self.select(path, filters, operator))
+
+    def rank_positions(self, sort_key):
+        """
+        Get the rank array of a sort key and the position of every movie in it.
+
+        Both are built on first use and kept for the session.
+
+        Parameters
+        ----------
+        sort_key : str
+            One of SORT_KEYS.
+
+        Returns
+        -------
+        tuple
+            (IMDb IDs in ascending order, IMDb ID -> position).
+        """
+        if sort_key not in self.ranks:
+            order = self.movie_tree['ranks'][sort_key]
+            self.ranks[sort_key] = order, {movie_id: position for position, movie_id in enumerate(order)}
+        return self.ranks[sort_key]
+
+    def page(self, path=(), sort_key='imdbRating', ascending=False, cursor=None, limit=PAGE_SIZE,
+             filters=None, operator='and'):
+        """
+        Get one page of the sorted, distinct movies below a node, and the cursor of the next one.
+
+        Only the movies up to the end of the page are selected, see Listing.
+        With the SQL catalog, and for the root or dense nodes with the other
+        backends, the cost of a page does not grow with the node. The
+        listings of the session are kept, up to LISTING_CACHE_SIZE, so the
+        next page continues where this one ended.
+
+        Parameters
+        ----------
+        path : sequence of str
+            The path of the node, the root if empty.
+        sort_key : str
+            One of SORT_KEYS.
+        ascending : bool
+            The order of sorting.
+        cursor : int, optional
+            The cursor returned with the previous page, the first page if None.
+        limit : int
+            The page size.
+        filters : dict, optional
+            Facet name -> list of accepted values.
+        operator : str
+            How the facets are combined, 'and' or 'or'.
+
+        Returns
+        -------
+        tuple
+            (IMDb IDs of the page, cursor of the next page or None after
+            the last one).
+
+        Raises
+        ------
+        ValueError
+            If the sort key, the operator or a facet is unknown.
+        KeyError
+            If the path does not exist.
+        """
+        if sort_key not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key '{sort_key}'.")
+        path = tuple(path)
+        key = (path, json.dumps(filters, sort_keys=True), operator, sort_key, ascending)
+        listing = self.listings.get(key)
+        cache_lookup('engine.listing_cache', listing is not None)
+        if listing is None:
+            listing = Listing(self, path, filters, operator, sort_key, ascending)
+        offset = cursor or 0
+        with timer('engine.page'):
+            movie_ids, more = listing.page(offset, limit)
+        # Only kept once its first page worked, so a missing path is not cached
+        self.listings[key] = listing
+        self.listings.move_to_end(key)
+        if len(self.listings) > LISTING_CACHE_SIZE:
+            self.listings.popitem(last=False)
+        return movie_ids, offset + len(movie_ids) if more else None
+
+    def movie(self, movie_id):
+        """
+        Get the details of a movie, with its IMDb ID under 'imdbID'.
+
+        Parameters
+        ----------
+        movie_id : str
+            The IMDb ID.
+
+        Returns
+        -------
+        dict
+            The movie details.
+        """
+        return {'imdbID': movie_id, **self.movies[movie_id]}
+
+    def recommend(self, path=(), filters=None, operator='and', sort_key='imdbRating', ascending=False,
+                  limit=10, offset=0):
+        """
+        Get one page of the sorted movies below a node that match facet filters.
+
+        Parameters
+        ----------
+        path : sequence of str
+            The path of the node, the root if empty.
+        filters : dict, optional
+            Facet name -> list of accepted values.
+        operator : str
+            How the facets are combined, 'and' or 'or'.
+        sort_key : str
+            One of SORT_KEYS.
+        ascending : bool
+            The order of sorting.
+        limit : int, optional
+            The page size. All remaining movies if None.
+        offset : int
+            The number of movies to skip.
+
+        Returns
+        -------
+        list of dict
+            The movies of the page, see movie.
+        """
+        with timer('engine.recommend'):
+            return [self.movie(movie_id)
+                    for movie_id in self.listing(path, filters, operator, sort_key, ascending, limit, offset)]
+
+    def search(self, text, limit=5):
+        """
+        Rank the movies whose title best matches free text.
+
+        Parameters
+        ----------
+        text : str
+            A movie name, possibly misspelled or followed by a year.
+        limit : int
+            The number of matches.
+
+        Returns
+        -------
+        list of str
+            IMDb IDs, best match first. Empty without a title index.
+        """
+        return self.title_index.search(text, limit) if self.title_index is not None else []
+
+    def page_titles(self, movie_ids):
+        """
+        List the Wikipedia page titles to look up for some movies.
+
+        Parameters
+        ----------
+        movie_ids : list of str
+            The IMDb IDs, most likely to be picked first.
+
+        Returns
+        -------
+        list of str
+            The page titles.
+        """
+        movies = [self.movies[movie_id] for movie_id in movie_ids]
+        if self.title_index is None:
+            return [movie['Title'] for movie in movies]
+        return [page_title for movie in movies for page_title in wikipedia_titles(movie['Title'], movie['Year'])]
+
+    def prefetch_summaries(self, movie_ids):
+        """
+        Start fetching the summaries of some movies in the background.
+
+        Parameters
+        ----------
+        movie_ids : list of str
+            The IMDb IDs, most likely to be picked first.
+        """
+        self.prefetcher.prefetch(self.page_titles(movie_ids))
+
+    def summary_ready(self, movie_id):
+        """
+        Check whether the summary of a movie can be returned without waiting.
+        """
+        return all(self.prefetcher.ready(title) for title in self.page_titles([movie_id]))
+
+    def summary(self, movie_id):
+        """
+        Get the Wikipedia summary of a movie.
+
+        Parameters
+        ----------
+        movie_id : str
+            The IMDb ID.
+
+        Returns
+        -------
+        str
+            The summary, an empty string if none is available.
+        """
+        # Includes the wait for a prefetch that has not finished yet
+        with timer('engine.summary'):
+            return self.prefetcher.get_first(self.page_titles([movie_id]))
+
+    def similar(self, movie_id, k=10):
+        """
+        Find the movies most similar to a movie.
+
+        Parameters
+        ----------
+        movie_id : str
+            The IMDb ID.
+        k : int
+            The number of movies.
+
+        Returns
+        -------
+        list of tuple
+            (IMDb ID, cosine similarity) pairs, most similar first. Empty
+            without similarity vectors or for a movie without a vector.
+        """
+        if self.similarity is None or movie_id not in self.similarity.rows:
+            return []
+        return self.similarity.most_similar(movie_id, k)
+
+    def run_query(self, query):
+        """
+        Answer a batch query.
+
+        Parameters
+        ----------
+        query : dict
+            The keys 'levels' (the browsing order, see with_levels), 'path',
+            'filters', 'operator', 'sort' (a sort key), 'order' ('ascending'
+            or 'descending'), 'limit' and 'offset', all optional. By default
+            the 10 best rated movies are returned.
+
+        Returns
+        -------
+        list of dict
+            The movies of the page, see movie.
+        """
+        engine = self.with_levels(query['levels']) if query.get('levels') else self
+        return engine.recommend(
+            path=query.get('path', []),
+            filters=query.get('filters'),
+            operator=query.get('operator', 'and'),
+            sort_key=query.get('sort', 'imdbRating'),
+            ascending=query.get('order', 'descending') == 'ascending',
+            limit=query.get('limit', 10),
+            offset=query.get('offset', 0),
+        )
+
+    def close(self):
+        """
+        Stop the summary prefetch and release the tree files.
+        """
+        self.prefetcher.close()
+        if hasattr(self.movie_tree, 'close'):
+            self.movie_tree.close()
+
+
+# The engine of a batch worker process, loaded once by init_worker
+worker_engine = None
+
+def init_worker(backend):
+    """
+    Load the engine of a batch worker process.
+
+    Parameters
+    ----------
+    backend : str
+        See RecommendationEngine.load.
+    """
+    global worker_engine
+    worker_engine = RecommendationEngine.load(backend, use_cache=False)
+
+def init_pool_worker(backend):
+    """
+    Load the engine of a pool worker, and close it when the worker exits.
+
+    Parameters
+    ----------
+    backend : str
+        See RecommendationEngine.load.
+    """
+    init_worker(backend)
+    # Pool workers leave with os._exit, which skips atexit but runs these finalizers
+    util.Finalize(worker_engine, worker_engine.close, exitpriority=10)
+
+def validate_query(query):
+    """
+    Check the types of the fields of a batch query.
+
+    Parameters
+    ----------
+    query : object
+        A decoded line of a batch query file.
+
+    Raises
+    ------
+    ValueError
+        If the query is not an object or a field has the wrong type.
+    """
+    if not isinstance(query, dict):
+        raise ValueError("A query must be a JSON object.")
+    for name in ['levels', 'path']:
+        value = query.get(name, [])
+        if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+            raise ValueError(f"'{name}' must be a list of strings.")
+    filters = query.get('filters') or {}
+    if not isinstance(filters, dict) or not all(
+            isinstance(values, list) and all(isinstance(value, str) for value in values) for values in filters.values()):
+        raise ValueError("'filters' must map facets to lists of strings.")
+    for name in ['operator', 'sort', 'order']:
+        if not isinstance(query.get(name, ''), str):
+            raise ValueError(f"'{name}' must be a string.")
+    for name in ['limit', 'offset']:
+        value = query.get(name, 0)
+        # bool is a subclass of int, but true is no page size
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            raise ValueError(f"'{name}' must be a non-negative integer.")
+
+def answer_line(line):
+    """
+    Answer one line of a batch query file in a worker process.
+
+    Parameters
+    ----------
+    line : str
+        A query as a JSON object.
+
+    Returns
+    -------
+    str
+        The JSON object {"query": ..., "results": [...]}, or {"query": ...,
+        "error": ...} if the line is not a valid query.
+    """
+    try:
+        query = json.loads(line)
+    except ValueError as error:
+        return json.dumps({'query': line.strip(), 'error': f"Invalid JSON: {error}."}, ensure_ascii=False)
+    try:
+        validate_query(query)
+        return json.dumps({'query': query, 'results': worker_engine.run_query(query)}, ensure_ascii=False)
+    except KeyError as error:
+        return json.dumps({'query': query, 'error': f"Unknown category '{error.args[0]}'."}, ensure_ascii=False)
+    except ValueError as error:
+        return json.dumps({'query': query, 'error': str(error)}, ensure_ascii=False)
+
+def run_batch(queriesFileName, resultsFileName, backend=None, workers=None):
+    """
+    Answer a JSONL file of queries and write the results as JSONL.
+
+    Every worker process loads the engine once and closes it when it
+    exits. The results are written in the order of the queries.
+
+    Parameters
+    ----------
+    queriesFileName : str
+        One query per line, see RecommendationEngine.run_query.
+    resultsFileName : str
+        The file to write, one result per line.
+    backend : str, optional
+        See RecommendationEngine.load.
+    workers : int, optional
+        The number of processes. One per CPU if omitted, and the queries are
+        answered in this process if 1.
+
+    Returns
+    -------
+    int
+        The number of queries answered.
+    """
+    backend = backend or default_backend()
+    with open(queriesFileName, 'r', encoding='utf-8') as queries, \
+            open(resultsFileName, 'w', encoding='utf-8') as results:
+        lines = (line for line in queries if line.strip())
+        count = 0
+        if workers == 1:
+            init_worker(backend)
+            try:
+                for answer in map(answer_line, lines):
+                    results.write(answer + '\n')
+                    count += 1
+            finally:
+                worker_engine.close()
+            return count
+        with Pool(workers, initializer=init_pool_worker, initargs=(backend,)) as pool:
+            for answer in pool.imap(answer_line, lines, chunksize=BATCH_CHUNK_SIZE):
+                results.write(answer + '\n')
+                count += 1
+            # Leaving the block terminates the workers, they must exit on their own to close their engine
+            pool.close()
+            pool.join()
+        return count
@@ -0,0 +1,398 @@
+"""
+############################## Final Projec: Recommendation Server ############################
+
+A small asyncio HTTP/1.1 server for the movie tree, so that many users can
+browse it at once instead of one terminal session.
+
+The engine is loaded once and shared by all connections. Sorted,
+deduplicated listings are kept in an LRU cache per node, filters and sort
+key, so that paging through a listing only slices a cached list. The SQL
+catalog reads a page with LIMIT and OFFSET instead, so with it only the
+number of movies of a listing is cached. Wikipedia summaries are fetched
+on a thread pool so they never block the event loop.
+
+Endpoints (GET, JSON responses):
+    /browse/<category>/...           the subcategories of a node
+    /movies/<category>/...           a page of the movies below a node, with
+                                     ?sort=&order=&limit=&offset= and facet
+                                     filters such as ?Genre=Comedy&Decade=1990s
+    ?levels=Genre,Decade             browse /browse and /movies in another
+                                     order of facets
+    /movie/<imdbID>                  the details of a movie
+    /summary/<imdbID>                the Wikipedia summary of a movie
+    /similar/<imdbID>?limit=         the most similar movies
+
+"""
+
+import argparse
+import asyncio
+import json
+from collections import OrderedDict
+from collections.abc import Mapping
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from profiling import cache_lookup, enable, timer
+from recommendation_engine import SORT_KEYS, RecommendationEngine
+
+# Number of sorted listings kept in memory
+LISTING_CACHE_SIZE = 1024
+
+# Page size when the request gives no limit, and the largest accepted one
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 1000
+
+# Longest accepted request head, in bytes
+MAX_HEADER_SIZE = 16384
+
+# Longest request body read and discarded, in bytes, the endpoints take none
+MAX_BODY_SIZE = 65536
+
+ENDPOINTS = {'browse', 'movies', 'movie', 'summary', 'similar'}
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class HTTPError(Exception):
+    """
+    An error answered with an HTTP status code and a JSON message.
+
+    Parameters
+    ----------
+    status : int
+        The status code.
+    message : str
+        The error message.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class RecommendationServer:
+    """
+    Serve a RecommendationEngine over HTTP.
+
+    Parameters
+    ----------
+    engine : RecommendationEngine
+        The engine shared by every request.
+    cache_size : int
+        The number of sorted listings kept in the LRU cache.
+    """
+
+    def __init__(self, engine, cache_size=LISTING_CACHE_SIZE):
+        self.engine = engine
+        self.cache_size = cache_size
+        self.listings = OrderedDict()
+        self.totals = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def cached(self, cache, key, compute):
+        """
+        Look a value up in one of the LRU caches, computing it on a miss.
+
+        Parameters
+        ----------
+        cache : OrderedDict
+            self.listings or self.totals.
+        key : tuple
+            The key of the value.
+        compute : callable
+            Computes the value.
+
+        Returns
+        -------
+        object
+            The value.
+        """
+        hit = key in cache
+        cache_lookup('server.listing_cache', hit)
+        if hit:
+            self.hits += 1
+            cache.move_to_end(key)
+            return cache[key]
+        self.misses += 1
+        value = cache[key] = compute()
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return value
+
+    def listing(self, engine, path, filters, sort_key, ascending):
+        """
+        Get the sorted, deduplicated IMDb IDs below a node, going through the cache.
+
+        Parameters
+        ----------
+        engine : RecommendationEngine
+            The engine of the browsing order.
+        path : tuple of str
+            The path of the node.
+        filters : dict
+            Facet name -> list of accepted values.
+        sort_key : str
+            One of SORT_KEYS.
+        ascending : bool
+            The order of sorting.
+
+        Returns
+        -------
+        list of str
+            The whole sorted listing.
+        """
+        key = (engine.levels, path, filter_key(filters), sort_key, ascending)
+        return self.cached(self.listings, key,
+                           lambda: engine.listing(path, filters, sort_key=sort_key, ascending=ascending))
+
+    def total(self, engine, path, filters):
+        """
+        Get the number of movies below a node that match filters, going through the cache.
+        """
+        return self.cached(self.totals, (engine.levels, path, filter_key(filters)),
+                           lambda: engine.total(path, filters))
+
+    def view(self, query):
+        """
+        Get the engine of the browsing order given by ?levels=, the default one without it.
+        """
+        if 'levels' not in query:
+            return self.engine
+        return self.engine.with_levels(first(query, 'levels', '').split(','))
+
+    def browse(self, path, query):
+        """
+        Describe a node: its subcategories with their movie counts, or the number of movies of a leaf.
+        """
+        engine = self.view(query)
+        node = engine.node(path)
+        if isinstance(node, Mapping):
+            return {'path': list(path), 'options': list(node.keys()), 'counts': engine.counts(path)}
+        return {'path': list(path), 'options': [], 'movies': len(node)}
+
+    def movies(self, path, query):
+        """
+        Get a page of the sorted movies below a node.
+
+        Parameters
+        ----------
+        path : tuple of str
+            The path of the node.
+        query : dict
+            The query string, see the module docstring.
+
+        Returns
+        -------
+        dict
+            The total number of movies, the offset and the movies of the page.
+
+        Raises
+        ------
+        HTTPError
+            If a parameter is invalid.
+        """
+        sort_key = first(query, 'sort', 'imdbRating')
+        if sort_key not in SORT_KEYS:
+            raise HTTPError(400, f"Unknown sort key '{sort_key}'.")
+        order = first(query, 'order', 'descending')
+        if order not in ('ascending', 'descending'):
+            raise HTTPError(400, f"Unknown order '{order}'.")
+        limit = min(integer(query, 'limit', DEFAULT_LIMIT), MAX_LIMIT)
+        offset = integer(query, 'offset', 0)
+        filters = {facet: values for facet, values in query.items()
+                   if facet not in ('levels', 'sort', 'order', 'limit', 'offset')}
+
+        engine = self.view(query)
+        if engine.pages_natively:
+            # Only the page is read, caching whole listings would read them all
+            total = self.total(engine, path, filters)
+            page_ids = engine.listing(path, filters, sort_key=sort_key, ascending=order == 'ascending',
+                                      limit=limit, offset=offset)
+        else:
+            movie_ids = self.listing(engine, path, filters, sort_key, order == 'ascending')
+            total = len(movie_ids)
+            page_ids = movie_ids[offset:offset + limit]
+        return {
+            'total': total,
+            'offset': offset,
+            'movies': [self.engine.movie(movie_id) for movie_id in page_ids],
+        }
+
+    async def respond(self, method, target):
+        """
+        Answer one request.
+
+        Parameters
+        ----------
+        method : str
+            The HTTP method.
+        target : str
+            The request target, path and query string.
+
+        Returns
+        -------
+        tuple
+            (status code, JSON-serializable body).
+        """
+        if method != 'GET':
+            return 405, {'error': f"Method '{method}' is not allowed."}
+        url = urlsplit(target)
+        segments = [unquote(segment) for segment in url.path.split('/') if segment]
+        query = parse_qs(url.query)
+        if not segments:
+            return 404, {'error': 'Unknown endpoint.'}
+        endpoint, arguments = segments[0], tuple(segments[1:])
+        # One latency histogram per endpoint
+        with timer(f'server.{endpoint}' if endpoint in ENDPOINTS else 'server.unknown'):
+            try:
+                if endpoint == 'browse':
+                    return 200, self.browse(arguments, query)
+                if endpoint == 'movies':
+                    return 200, self.movies(arguments, query)
+                if endpoint in ('movie', 'summary', 'similar') and len(arguments) == 1:
+                    movie_id = arguments[0]
+                    movie = self.engine.movie(movie_id)
+                    if endpoint == 'movie':
+                        return 200, movie
+                    if endpoint == 'similar':
+                        similar = self.engine.similar(movie_id, min(integer(query, 'limit', 10), MAX_LIMIT))
+                        return 200, {'imdbID': movie_id, 'similar': [
+                            {**self.engine.movie(similar_id), 'similarity': score} for similar_id, score in similar]}
+                    # Wikipedia is slow, wait for it on a worker thread
+                    summary = await asyncio.get_running_loop().run_in_executor(None, self.engine.summary, movie_id)
+                    return 200, {'imdbID': movie_id, 'Title': movie['Title'], 'summary': summary}
+            except KeyError as error:
+                return 404, {'error': f"Unknown category or movie '{error.args[0]}'."}
+            except HTTPError as error:
+                return error.status, {'error': str(error)}
+            except ValueError as error:
+                return 400, {'error': str(error)}
+            return 404, {'error': 'Unknown endpoint.'}
+
+    async def handle(self, reader, writer):
+        """
+        Serve the requests of one connection, keeping it alive between requests.
+        """
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ')
+                except ValueError:
+                    await self.send(writer, 400, {'error': 'Malformed request line.'}, False)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                # Without a valid length the body cannot be skipped, so the connection is closed
+                length = headers.get('content-length', '') or '0'
+                if not is_count(length) or int(length) > MAX_BODY_SIZE:
+                    await self.send(writer, 400, {
+                        'error': f"'Content-Length' must be a non-negative integer up to {MAX_BODY_SIZE}."}, False)
+                    break
+                if int(length):
+                    try:
+                        await reader.readexactly(int(length))
+                    except (asyncio.IncompleteReadError, ConnectionError):
+                        break
+
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+                try:
+                    status, body = await self.respond(method, target)
+                except Exception as error:
+                    status, body = 500, {'error': str(error)}
+                await self.send(writer, status, body, keep_alive)
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def send(self, writer, status, body, keep_alive):
+        """
+        Write a JSON response.
+        """
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + payload)
+        await writer.drain()
+
+    async def serve(self, host='127.0.0.1', port=8000):
+        """
+        Accept connections until the task is cancelled.
+
+        Parameters
+        ----------
+        host : str
+            The address to listen on.
+        port : int
+            The port to listen on.
+        """
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER_SIZE)
+        async with server:
+            await server.serve_forever()
+
+
+def filter_key(filters):
+    """
+    Make a hashable cache key of facet filters.
+    """
+    return tuple(sorted((facet, tuple(values)) for facet, values in filters.items()))
+
+def first(query, name, default):
+    """
+    Get the first value of a query string parameter.
+    """
+    return query[name][0] if name in query else default
+
+def is_count(text):
+    """
+    Check that a text is a non-negative integer in ASCII digits, which int() accepts.
+
+    str.isdigit also accepts digits such as '²' that int() rejects.
+    """
+    return text.isascii() and text.isdecimal()
+
+def integer(query, name, default):
+    """
+    Get a non-negative integer query string parameter.
+
+    Raises
+    ------
+    HTTPError
+        If the value is not a non-negative integer.
+    """
+    value = first(query, name, str(default))
+    if not is_count(value):
+        raise HTTPError(400, f"'{name}' must be a non-negative integer.")
+    return int(value)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the movie recommendation system over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1', help='the address to listen on')
+    parser.add_argument('--port', type=int, default=8000, help='the port to listen on')
+    parser.add_argument('--backend', choices=['snapshot', 'nodes', 'sql', 'json'],
+                        help='how the tree is loaded, see User Interaction.py')
+    parser.add_argument('--profile', nargs='?', const='summary', metavar='TRACE',
+                        help='print request latencies at exit, and write a Chrome trace if TRACE ends in .json')
+    args = parser.parse_args()
+    if args.profile:
+        enable(args.profile)
+
+    engine = RecommendationEngine.load(args.backend)
+    print(f"Serving on http://{args.host}:{args.port}/")
+    try:
+        asyncio.run(RecommendationServer(engine).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.close()
@@ -0,0 +1,164 @@
+"""
+############################## Final Projec: Response Cache ############################
+
+A persistent cache for the TMDb, OMDb and Wikipedia lookups, shared by
+Data Proccessing.py and User Interaction.py.
+
+Responses are stored in a SQLite file keyed by the normalized request, so
+repeated pipeline runs and repeated summary lookups do not hit the network.
+
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from urllib.parse import urlencode, urlsplit, urlunsplit
+
+from profiling import cache_lookup
+
+# Query parameters that identify the caller rather than the resource
+IGNORED_PARAMS = {'api_key', 'apikey'}
+
+DAY = 24 * 60 * 60
+
+# Number of writes between two checks of the size bound
+EVICT_INTERVAL = 100
+
+
+class ResponseCache:
+    """
+    A SQLite-backed cache with a TTL, negative caching and LRU eviction.
+
+    Parameters
+    ----------
+    path : str
+        The SQLite file the cache is stored in. Use ':memory:' for a cache
+        that only lives as long as the process.
+    ttl : float
+        The number of seconds a successful response stays valid.
+    negative_ttl : float
+        The number of seconds a negative response (a 404, a missing movie or
+        a missing Wikipedia extract) stays valid.
+    max_entries : int
+        The number of entries kept. The least recently used entries are
+        evicted once this is exceeded, checked every EVICT_INTERVAL writes.
+    """
+
+    def __init__(self, path='http_cache.sqlite', ttl=30 * DAY, negative_ttl=DAY, max_entries=100000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " negative INTEGER NOT NULL,"
+            " expires REAL NOT NULL,"
+            " accessed REAL NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self.connection.commit()
+
+    @staticmethod
+    def make_key(url, params=None):
+        """
+        Build the normalized cache key of a GET request.
+
+        The scheme and host are lower-cased, API keys are dropped and the
+        remaining query parameters are sorted, so equivalent requests share
+        one entry.
+
+        Parameters
+        ----------
+        url : str
+            The URL of the request.
+        params : dict, optional
+            The query string parameters of the request.
+
+        Returns
+        -------
+        str
+            The cache key.
+        """
+        parts = urlsplit(url)
+        query = {key: str(value) for key, value in (params or {}).items() if key not in IGNORED_PARAMS}
+        return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(sorted(query.items())), ''))
+
+    def get(self, key):
+        """
+        Look up a cached response.
+
+        Parameters
+        ----------
+        key : str
+            The key built by make_key.
+
+        Returns
+        -------
+        tuple
+            (True, value) on a hit, (False, None) on a miss or an expired entry.
+        """
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] < now:
+                self.misses += 1
+                cache_lookup('cache.responses', False)
+                return False, None
+            self.connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.connection.commit()
+            self.hits += 1
+        cache_lookup('cache.responses', True)
+        return True, json.loads(row[0])
+
+    def set(self, key, value, negative=False):
+        """
+        Store a response.
+
+        Parameters
+        ----------
+        key : str
+            The key built by make_key.
+        value : object
+            The JSON-serializable value to cache.
+        negative : bool
+            Whether the value records a missing resource, which expires
+            after negative_ttl instead of ttl.
+        """
+        now = time.time()
+        expires = now + (self.negative_ttl if negative else self.ttl)
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value, negative, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), int(negative), expires, now))
+            # Counting the entries is a table scan, so only check every EVICT_INTERVAL writes
+            self.writes += 1
+            if self.writes % EVICT_INTERVAL == 0:
+                self.evict()
+            self.connection.commit()
+
+    def evict(self):
+        """
+        Drop expired entries and the least recently used ones above max_entries.
+        """
+        count = self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        self.connection.execute("DELETE FROM responses WHERE expires < ?", (time.time(),))
+        self.connection.execute(
+            "DELETE FROM responses WHERE key IN ("
+            " SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,))
+
+    def close(self):
+        """
+        Close the underlying SQLite connection.
+        """
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,337 @@
+"""
+############################## Final Projec: Similarity ############################
+
+A "more like this" engine over the Plot, Genre, Director and Actors fields.
+
+The offline stage, run by Build Trees.py, turns every movie into a TF-IDF
+vector over plot words and genre, director and actor features, projects it
+to a short dense vector with a sparse random projection (which preserves
+cosine similarity) and stores the normalized vectors in movies_vectors.npz.
+The projection row of a feature is never stored: its few nonzero
+dimensions and signs are taken from a hash of the feature.
+
+Queries are one matrix-vector product over that matrix. Once the catalog is
+large, random-hyperplane LSH tables shortlist candidates first so that only
+a few thousand rows are scored.
+
+"""
+
+import hashlib
+import re
+
+import numpy as np
+
+# Length of the stored vectors
+DIMENSIONS = 256
+
+# Seed of the random projection and of the LSH hyperplanes
+SEED = 507
+
+# Nonzero entries, each +1 or -1, of the projection row of a feature
+PROJECTION_NONZEROS = 8
+
+# Catalog size from which queries go through the LSH tables
+LSH_THRESHOLD = 20000
+LSH_TABLES = 8
+LSH_BITS = 14
+
+# Weight of one structured feature relative to one plot word
+FEATURE_WEIGHTS = {'genre': 2.0, 'director': 2.0, 'actor': 1.0, 'word': 1.0}
+
+STOPWORDS = set('''
+a about after all also an and any are as at be been before being but by can
+could do does for from had has have he her his how i in into is it its just
+more most no not of on one only or other our out over she so some such than
+that the their them then there these they this those through to up very was
+we were what when where which while who whom why will with would you your
+'''.split())
+
+WORD_PATTERN = re.compile(r"[a-z][a-z']{2,}")
+
+
+def feature_projection(feature):
+    """
+    Hash a feature to the nonzero entries of its projection row.
+
+    Parameters
+    ----------
+    feature : str
+        A feature of movie_features.
+
+    Returns
+    -------
+    bytes
+        PROJECTION_NONZEROS dimensions, then PROJECTION_NONZEROS numbers
+        whose lowest bit is the sign, as little-endian uint16.
+    """
+    return hashlib.blake2b(feature.encode('utf-8'), digest_size=4 * PROJECTION_NONZEROS,
+                           key=SEED.to_bytes(2, 'little')).digest()
+
+
+def movie_features(movie):
+    """
+    Extract the weighted features of a movie.
+
+    Parameters
+    ----------
+    movie : Movie
+        The record of a single movie.
+
+    Returns
+    -------
+    dict
+        Feature -> weight. Plot words appear as 'word:<word>', the other
+        fields as 'genre:<genre>', 'director:<name>' and 'actor:<name>'.
+    """
+    features = {}
+
+    def add(kind, value):
+        feature = f'{kind}:{value}'
+        features[feature] = features.get(feature, 0.0) + FEATURE_WEIGHTS[kind]
+
+    for word in WORD_PATTERN.findall(movie.Plot.lower()):
+        if word not in STOPWORDS:
+            add('word', word)
+    for kind, values in [('genre', movie.Genre), ('director', movie.Director), ('actor', movie.Actors)]:
+        for value in values:
+            if value != 'N/A':
+                add(kind, value.lower())
+    return features
+
+
+class SimilarityIndex:
+    """
+    Normalized dense movie vectors with top-K cosine similarity queries.
+
+    Parameters
+    ----------
+    ids : list of str
+        The IMDb IDs, one per row.
+    vectors : numpy.ndarray
+        A float32 matrix of shape (movies, DIMENSIONS) with unit-length rows.
+    """
+
+    def __init__(self, ids, vectors):
+        self.ids = list(ids)
+        self.rows = {movie_id: row for row, movie_id in enumerate(self.ids)}
+        self.vectors = vectors
+        self.tables = None
+        if len(self.ids) >= LSH_THRESHOLD:
+            self.build_lsh()
+
+    @classmethod
+    def from_movies_info(cls, movies_info):
+        """
+        Compute the vectors of a catalog.
+
+        Parameters
+        ----------
+        movies_info : dict
+            IMDb ID -> Movie, see load_movies.
+
+        Returns
+        -------
+        SimilarityIndex
+            The index.
+        """
+        ids = sorted(movies_info)
+        features = [movie_features(movies_info[movie_id]) for movie_id in ids]
+
+        # Every distinct feature is hashed once, its projection takes
+        # 4 * PROJECTION_NONZEROS bytes instead of a dense row of DIMENSIONS floats
+        vocabulary = {}
+        hashes = bytearray()
+        for row in features:
+            for feature in row:
+                if feature not in vocabulary:
+                    vocabulary[feature] = len(vocabulary)
+                    hashes += feature_projection(feature)
+        hashes = np.frombuffer(bytes(hashes), dtype='<u2').reshape(len(vocabulary), 2 * PROJECTION_NONZEROS)
+        document_frequency = np.zeros(len(vocabulary), dtype=np.float64)
+        for row in features:
+            document_frequency[[vocabulary[feature] for feature in row]] += 1
+        idf = np.log((1 + len(ids)) / (1 + document_frequency)) + 1
+
+        vectors = np.zeros((len(ids), DIMENSIONS), dtype=np.float32)
+        for index, row in enumerate(features):
+            if not row:
+                continue
+            columns = np.fromiter((vocabulary[feature] for feature in row), dtype=np.int64, count=len(row))
+            weights = np.fromiter(row.values(), dtype=np.float64, count=len(row)) * idf[columns]
+            projection = hashes[columns]
+            dimensions = projection[:, :PROJECTION_NONZEROS] % DIMENSIONS
+            signs = np.where(projection[:, PROJECTION_NONZEROS:] & 1, weights[:, None], -weights[:, None])
+            vectors[index] = np.bincount(dimensions.ravel(), signs.ravel(), minlength=DIMENSIONS)
+        return cls(ids, normalize_rows(vectors))
+
+    def save(self, fileName):
+        """
+        Store the index in a compressed .npz file.
+
+        Parameters
+        ----------
+        fileName : str
+            The file to write.
+        """
+        np.savez_compressed(fileName, ids=np.array(self.ids), vectors=self.vectors)
+
+    @classmethod
+    def load(cls, fileName):
+        """
+        Load an index stored with save.
+
+        Parameters
+        ----------
+        fileName : str
+            The .npz file.
+
+        Returns
+        -------
+        SimilarityIndex
+            The index.
+        """
+        with np.load(fileName) as data:
+            return cls(data['ids'].tolist(), data['vectors'])
+
+    def build_lsh(self, tables=LSH_TABLES, bits=LSH_BITS):
+        """
+        Hash every row into random-hyperplane LSH tables.
+
+        Parameters
+        ----------
+        tables : int
+            The number of hash tables.
+        bits : int
+            The number of hyperplanes per table.
+        """
+        rng = np.random.default_rng(SEED + 1)
+        self.planes = rng.standard_normal((tables, DIMENSIONS, bits)).astype(np.float32)
+        self.powers = 1 << np.arange(bits, dtype=np.int64)
+        self.tables = []
+        for planes in self.planes:
+            codes = ((self.vectors @ planes) > 0) @ self.powers
+            order = np.argsort(codes, kind='stable')
+            unique, starts = np.unique(codes[order], return_index=True)
+            bounds = np.append(starts, len(order))
+            self.tables.append({code: order[bounds[i]:bounds[i + 1]] for i, code in enumerate(unique.tolist())})
+
+    def candidates(self, vector):
+        """
+        Shortlist the rows sharing an LSH bucket with a vector in any table.
+
+        Parameters
+        ----------
+        vector : numpy.ndarray
+            A unit-length query vector.
+
+        Returns
+        -------
+        numpy.ndarray
+            The candidate rows.
+        """
+        buckets = []
+        for planes, table in zip(self.planes, self.tables):
+            code = int(((vector @ planes) > 0) @ self.powers)
+            buckets.append(table.get(code, np.empty(0, dtype=np.int64)))
+        return np.unique(np.concatenate(buckets))
+
+    def most_similar(self, movie_id, k=10):
+        """
+        Find the movies most similar to a movie of the catalog.
+
+        Parameters
+        ----------
+        movie_id : str
+            The IMDb ID of the movie.
+        k : int
+            The number of movies to return.
+
+        Returns
+        -------
+        list of tuple
+            (IMDb ID, cosine similarity) pairs, most similar first.
+
+        Raises
+        ------
+        KeyError
+            If the movie is not in the index.
+        """
+        return self.most_similar_batch([movie_id], k)[0]
+
+    def most_similar_batch(self, movie_ids, k=10):
+        """
+        Find the most similar movies of several movies at once.
+
+        Without LSH tables all queries are scored in one matrix product.
+
+        Parameters
+        ----------
+        movie_ids : list of str
+            The IMDb IDs of the movies.
+        k : int
+            The number of movies to return per query.
+
+        Returns
+        -------
+        list of list of tuple
+            For every query, (IMDb ID, cosine similarity) pairs, most similar first.
+        """
+        rows = np.array([self.rows[movie_id] for movie_id in movie_ids], dtype=np.int64)
+        queries = self.vectors[rows]
+        results = []
+        if self.tables is None:
+            scores = queries @ self.vectors.T
+            scores[np.arange(len(rows)), rows] = -np.inf
+            for row_scores in scores:
+                results.append(self.top_k(np.arange(len(self.ids)), row_scores, k))
+            return results
+        for row, query in zip(rows, queries):
+            candidates = self.candidates(query)
+            candidates = candidates[candidates != row]
+            if len(candidates) < k:
+                candidates = np.delete(np.arange(len(self.ids)), row)
+            results.append(self.top_k(candidates, self.vectors[candidates] @ query, k))
+        return results
+
+    def top_k(self, rows, scores, k):
+        """
+        Select the k best scored rows.
+
+        Parameters
+        ----------
+        rows : numpy.ndarray
+            The scored rows.
+        scores : numpy.ndarray
+            The score of every row.
+        k : int
+            The number of rows to keep.
+
+        Returns
+        -------
+        list of tuple
+            (IMDb ID, score) pairs, best first.
+        """
+        k = min(k, len(rows))
+        if k == 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [(self.ids[rows[index]], float(scores[index])) for index in best if np.isfinite(scores[index])]
+
+
+def normalize_rows(vectors):
+    """
+    Scale the rows of a matrix to unit length, leaving zero rows unchanged.
+
+    Parameters
+    ----------
+    vectors : numpy.ndarray
+        The matrix.
+
+    Returns
+    -------
+    numpy.ndarray
+        The normalized matrix.
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
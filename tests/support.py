@@ -0,0 +1,70 @@
+"""
+############################## Final Projec: Test Support ############################
+
+Build the files of the project for a small synthetic catalog in a
+temporary directory, so that the tests never touch the files of the
+collected catalog.
+
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from generate_catalog import generate_catalog
+from json_stream import write_json
+
+# Movies of the synthetic test catalog
+CATALOG_SIZE = 300
+
+
+def run_build(directory, *options):
+    """
+    Run Build Trees.py in a directory holding a movies_info_updated.json.
+
+    Parameters
+    ----------
+    directory : str
+        The working directory of the build.
+    *options : str
+        The command line options.
+    """
+    subprocess.run([sys.executable, os.path.join(ROOT, 'Build Trees.py'), *options], cwd=directory,
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def build_catalog(size=CATALOG_SIZE, seed=0, *options):
+    """
+    Write a synthetic catalog to a new temporary directory and build it.
+
+    Parameters
+    ----------
+    size : int
+        The number of movies.
+    seed : int
+        The seed of the catalog generator.
+    *options : str
+        The command line options of Build Trees.py.
+
+    Returns
+    -------
+    str
+        The directory, to be removed with remove_directory.
+    """
+    directory = tempfile.mkdtemp(prefix='movies_test_')
+    write_json(os.path.join(directory, 'movies_info_updated.json'), generate_catalog(size, seed))
+    run_build(directory, *options)
+    return directory
+
+
+def remove_directory(directory):
+    """
+    Remove a directory made by build_catalog.
+    """
+    shutil.rmtree(directory, ignore_errors=True)
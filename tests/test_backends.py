@@ -0,0 +1,125 @@
+"""
+############################## Final Projec: Backend Tests ############################
+
+Test that the json, snapshot, nodes and sql backends of the engine give
+the same menus, counts, listings, pages and filtered listings for the same
+catalog.
+
+"""
+
+import os
+import random
+import unittest
+from collections.abc import Mapping
+
+from support import build_catalog, remove_directory
+
+from recommendation_engine import SORT_KEYS, RecommendationEngine
+
+BACKENDS = ['json', 'snapshot', 'nodes', 'sql']
+
+# Paths whose listings are compared in every sort order
+LISTED_PATHS = 40
+
+
+class BackendTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = build_catalog()
+        cls.cwd = os.getcwd()
+        os.chdir(cls.directory)
+        cls.engines = {backend: RecommendationEngine.load(backend, use_cache=False) for backend in BACKENDS}
+        cls.reference = cls.engines['json']
+        cls.paths = []
+
+        def walk(path, node):
+            cls.paths.append(path)
+            if isinstance(node, Mapping):
+                for name in node:
+                    walk(path + (name,), node[name])
+        walk((), cls.reference.tree)
+
+    @classmethod
+    def tearDownClass(cls):
+        for engine in cls.engines.values():
+            engine.close()
+        os.chdir(cls.cwd)
+        remove_directory(cls.directory)
+
+    def assertAgree(self, answer, message=None):
+        """
+        Check that a function of an engine gives the same answer on every backend.
+        """
+        expected = answer(self.reference)
+        for backend, engine in self.engines.items():
+            self.assertEqual(answer(engine), expected, (backend, message))
+
+    def test_movies(self):
+        movie_ids = list(self.reference.movies)
+        for engine in self.engines.values():
+            self.assertEqual(list(engine.movies), movie_ids)
+        for movie_id in movie_ids[::7]:
+            self.assertAgree(lambda engine: engine.movie(movie_id), movie_id)
+
+    def test_menus(self):
+        for path in self.paths:
+            if isinstance(self.reference.node(path), Mapping):
+                self.assertAgree(lambda engine: list(engine.options(path)), path)
+                self.assertAgree(lambda engine: engine.counts(path), path)
+            else:
+                self.assertAgree(lambda engine: sorted(engine.node(path)), path)
+
+    def test_listings(self):
+        for path in self.paths[:LISTED_PATHS]:
+            for sort_key in SORT_KEYS:
+                for ascending in (True, False):
+                    message = (path, sort_key, ascending)
+                    self.assertAgree(lambda engine: engine.listing(path, sort_key=sort_key, ascending=ascending),
+                                     message)
+                    self.assertAgree(lambda engine: engine.listing(path, sort_key=sort_key, ascending=ascending,
+                                                                   limit=7, offset=3), message)
+            self.assertAgree(lambda engine: engine.total(path), path)
+
+    def test_pages(self):
+        for engine in self.engines.values():
+            for path in self.paths[:LISTED_PATHS:4]:
+                full = engine.listing(path, sort_key='Year', ascending=False)
+                listed, cursor = [], None
+                while True:
+                    movie_ids, cursor = engine.page(path, 'Year', False, cursor, 9)
+                    listed += movie_ids
+                    if cursor is None:
+                        break
+                self.assertEqual(listed, full, path)
+
+    def test_filters(self):
+        rng = random.Random(0)
+        indexes = self.reference.indexes
+        for _ in range(100):
+            filters = {facet: rng.sample(sorted(indexes[facet]), min(2, len(indexes[facet])))
+                       for facet in rng.sample(sorted(indexes), rng.randint(1, 3))}
+            operator = rng.choice(['and', 'or'])
+            path = rng.choice(self.paths[:LISTED_PATHS])
+            message = (path, filters, operator)
+            self.assertAgree(lambda engine: engine.listing(path, filters, operator, 'popularity', False), message)
+            self.assertAgree(lambda engine: engine.total(path, filters, operator), message)
+
+    def test_other_levels(self):
+        for levels in [('Genre', 'Decade', 'Rating'), ('Director',), ('Awards', 'Country')]:
+            views = {backend: engine.with_levels(levels) for backend, engine in self.engines.items()}
+            reference = views['json']
+            for backend, view in views.items():
+                self.assertEqual(view.counts(), reference.counts(), (backend, levels))
+                for name in list(reference.tree)[:10]:
+                    self.assertEqual(view.listing((name,), sort_key='Year'), reference.listing((name,), sort_key='Year'),
+                                     (backend, levels, name))
+
+    def test_unknown_category(self):
+        for backend, engine in self.engines.items():
+            with self.subTest(backend=backend), self.assertRaises(KeyError):
+                engine.listing(('No Such Language', 'No Such Country'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+############################## Final Projec: Batch Tests ############################
+
+Test the batch mode of recommendation_engine.py: answers are the same with
+one process or several, invalid lines get an error, and every worker
+closes its engine.
+
+"""
+
+import json
+import multiprocessing
+import os
+import unittest
+from unittest import mock
+
+from support import build_catalog, remove_directory
+
+from recommendation_engine import RecommendationEngine, run_batch
+
+QUERIES = [
+    {},
+    {'path': ['English'], 'sort': 'Year', 'order': 'ascending', 'limit': 5},
+    {'levels': ['Genre', 'Decade'], 'path': ['Drama'], 'limit': 3, 'offset': 2},
+    {'filters': {'Genre': ['Comedy', 'Drama']}, 'operator': 'or', 'sort': 'popularity'},
+    {'path': ['No Such Language']},
+    {'limit': 'ten'},
+    [1, 2],
+]
+
+
+def record_close(engine):
+    """
+    Stand-in for RecommendationEngine.close that records the process closing an engine.
+    """
+    with open(os.environ['MOVIES_TEST_CLOSED'], 'a', encoding='utf-8') as file:
+        file.write(f'{os.getpid()}\n')
+
+
+class BatchTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = build_catalog()
+        cls.cwd = os.getcwd()
+        os.chdir(cls.directory)
+        with open('queries.jsonl', 'w', encoding='utf-8') as file:
+            file.writelines(json.dumps(query) + '\n' for query in QUERIES)
+            file.write('{"path": [\n')
+
+    @classmethod
+    def tearDownClass(cls):
+        os.chdir(cls.cwd)
+        remove_directory(cls.directory)
+
+    def run_batch(self, workers):
+        closed = os.path.join(self.directory, f'closed_{workers}.txt')
+        if os.path.exists(closed):
+            os.remove(closed)
+        with mock.patch.dict(os.environ, {'MOVIES_TEST_CLOSED': closed}), \
+                mock.patch.object(RecommendationEngine, 'close', record_close):
+            count = run_batch('queries.jsonl', 'results.jsonl', 'json', workers)
+        with open('results.jsonl', encoding='utf-8') as file:
+            answers = [json.loads(line) for line in file]
+        closers = []
+        if os.path.exists(closed):
+            with open(closed, encoding='utf-8') as file:
+                closers = file.read().split()
+        self.assertEqual(count, len(answers))
+        return answers, closers
+
+    def test_answers(self):
+        answers, closers = self.run_batch(1)
+        self.assertEqual(len(answers), len(QUERIES) + 1)
+        self.assertEqual(len(answers[0]['results']), 10)
+        years = [movie['Year'] for movie in answers[1]['results']]
+        self.assertEqual(years, sorted(years))
+        self.assertEqual(answers[4]['error'], "Unknown category 'No Such Language'.")
+        for answer in answers[5:]:
+            self.assertIn('error', answer)
+        self.assertTrue(answers[-1]['error'].startswith('Invalid JSON'))
+        self.assertEqual(closers, [str(os.getpid())])
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == 'fork',
+                         'the patched close only reaches forked workers')
+    def test_workers_match_and_close_their_engines(self):
+        expected, _ = self.run_batch(1)
+        answers, closers = self.run_batch(2)
+        self.assertEqual(answers, expected)
+        self.assertEqual(len(closers), 2)
+        self.assertNotIn(str(os.getpid()), closers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+"""
+############################## Final Projec: Checkpoint Tests ############################
+
+Test the checkpoint of the streaming pipeline in Data Proccessing.py: a
+truncated last line is dropped, and the outputs have one entry per IMDb ID.
+
+"""
+
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from support import ROOT
+
+from json_stream import iter_json_items
+
+spec = importlib.util.spec_from_file_location('data_processing', os.path.join(ROOT, 'Data Proccessing.py'))
+data_processing = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(data_processing)
+
+
+def record(tmdb_id, imdb_id, popularity, movie=True):
+    return {'tmdb_id': tmdb_id, 'popularity': popularity, 'imdb_id': imdb_id,
+            'movie': {'imdbID': imdb_id, 'Response': 'True', 'tmdb_popularity': popularity} if movie else None}
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='movies_test_')
+        self.checkpoint = os.path.join(self.directory, 'checkpoint.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def output(self, name):
+        return list(iter_json_items(os.path.join(self.directory, name)))
+
+    def test_truncated_line_is_dropped(self):
+        data_processing.write_checkpoint([record(1, 'tt1', 1.0), record(2, 'tt2', 2.0)], self.checkpoint)
+        with open(self.checkpoint, 'a', encoding='utf-8') as file:
+            file.write('{"tmdb_id": 3, "popul')
+        self.assertEqual(data_processing.count_checkpoint(self.checkpoint), 2)
+        self.assertEqual([line['tmdb_id'] for line in data_processing.read_checkpoint(self.checkpoint)], [1, 2])
+
+    def test_duplicate_imdb_ids_are_written_once(self):
+        records = [record(1, 'tt1', 1.0), record(2, 'tt2', 2.0), record(3, 'tt1', 3.0), record(4, None, 4.0, False),
+                   dict(record(5, 'tt5', 5.0), movie={'Response': 'False', 'Error': 'Incorrect IMDb ID.'})]
+        data_processing.write_checkpoint(records, self.checkpoint)
+        data_processing.write_checkpoint_outputs(self.checkpoint, os.path.join(self.directory, 'popularity.json'),
+                                                 os.path.join(self.directory, 'movies.json'))
+        self.assertEqual(self.output('popularity.json'), [('tt1', 1.0), ('tt2', 2.0)])
+        self.assertEqual([imdb_id for imdb_id, movie in self.output('movies.json')], ['tt1', 'tt2'])
+        with open(os.path.join(self.directory, 'popularity.json'), encoding='utf-8') as file:
+            self.assertEqual(json.load(file), {'tt1': 1.0, 'tt2': 2.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+"""
+############################## Final Projec: Retry Tests ############################
+
+Test the retries of get_with_retry in Data Proccessing.py against a local
+stub server answering a scripted list of status codes.
+
+Usage:
+    python -m unittest discover tests
+
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+spec = importlib.util.spec_from_file_location('data_processing', os.path.join(ROOT, 'Data Proccessing.py'))
+data_processing = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(data_processing)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answer every GET with the next status code of the server's script, 200 once it is used up.
+
+    A 429 is sent with the server's retry_after as its 'Retry-After' header.
+    """
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.paths.append(self.path)
+            status = server.script.pop(0) if server.script else 200
+        body = json.dumps({'Response': 'True', 'Title': 'Stub'} if status == 200 else {}).encode()
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', server.retry_after)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class GetWithRetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.server.lock = threading.Lock()
+        self.server.script = []
+        self.server.paths = []
+        self.server.retry_after = '0'
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+        self.session = requests.Session()
+
+    def tearDown(self):
+        self.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get(self, script, retries=3):
+        self.server.script = list(script)
+        return data_processing.get_with_retry(self.session, self.url, retries=retries, backoff=0)
+
+    def test_retries_server_errors_until_success(self):
+        response = self.get([500, 502, 503])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.server.paths), 4)
+
+    def test_retries_rate_limited_requests(self):
+        response = self.get([429, 429])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.server.paths), 3)
+
+    def test_returns_last_response_when_retries_run_out(self):
+        response = self.get([503, 503, 503], retries=2)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(self.server.paths), 3)
+
+    def test_does_not_retry_client_errors(self):
+        response = self.get([404])
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(len(self.server.paths), 1)
+
+    def test_retry_after_is_capped(self):
+        self.server.retry_after = '86400'
+        with mock.patch.object(data_processing, 'MAX_RETRY_DELAY', 0.01), \
+                mock.patch.object(data_processing.time, 'sleep') as sleep:
+            response = self.get([429])
+        self.assertEqual(response.status_code, 200)
+        sleep.assert_called_once_with(0.01)
+
+    def test_fetch_movie_info_uses_base_url(self):
+        self.server.script = [429, 504]
+        movie = data_processing.fetch_movie_info('key', 'tt0000001', self.session,
+                                                 data_processing.RateLimiter(1000), base_url=self.url)
+        self.assertEqual(movie['Title'], 'Stub')
+        self.assertEqual(len(self.server.paths), 3)
+        self.assertIn('i=tt0000001', self.server.paths[-1])
+
+
+
+class RateTest(unittest.TestCase):
+
+    def test_positive_rate(self):
+        self.assertEqual(data_processing.positive_rate('2.5'), 2.5)
+        for text in ['0', '-1', 'abc', 'nan', 'inf']:
+            with self.subTest(text=text), self.assertRaises(argparse.ArgumentTypeError):
+                data_processing.positive_rate(text)
+
+    def test_limiter_rejects_non_positive_rates(self):
+        for rate in [0, -3]:
+            with self.subTest(rate=rate), self.assertRaises(ValueError):
+                data_processing.RateLimiter(rate)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+"""
+############################## Final Projec: Incremental Build Tests ############################
+
+Test that Build Trees.py --incremental, after movies were added, changed
+and removed, writes the same content as a full build of the new catalog.
+The order of the children of a node and of the movies of a leaf follows
+the history of the updates, so it is not compared: listings are sorted
+through the rank arrays, which must be the same.
+
+"""
+
+import json
+import os
+import sqlite3
+import unittest
+from collections import Counter
+
+from support import CATALOG_SIZE, build_catalog, remove_directory, run_build
+
+from generate_catalog import generate_catalog
+from json_stream import read_json, write_json
+from movie_catalog import FACET_TABLES
+from tree_snapshot import TreeSnapshot
+
+# JSON files decoding to the same value after both builds
+SAME_FILES = ['movies_tree_manifest.json', 'movies_index.json', 'movies_title_index.json']
+
+
+def edit_catalog(catalog):
+    """
+    Add, change and remove movies of a catalog, so that a country disappears and a new one appears.
+
+    Returns
+    -------
+    dict
+        The edited catalog.
+    """
+    catalog = dict(catalog)
+    movie_ids = list(catalog)
+    for movie_id in movie_ids[:5]:
+        del catalog[movie_id]
+    extra = generate_catalog(CATALOG_SIZE + 10, seed=1)
+    for movie_id in list(extra)[CATALOG_SIZE:]:
+        catalog[movie_id] = extra[movie_id]
+    # Every movie of the rarest country moves to a new one
+    countries = Counter(country for movie in catalog.values() for country in movie['Country'].split(', '))
+    rare = min(countries, key=countries.get)
+    for movie_id, movie in list(catalog.items()):
+        if rare in movie['Country'].split(', '):
+            catalog[movie_id] = dict(movie, Country='Atlantis')
+    for movie_id in movie_ids[10:20]:
+        catalog[movie_id] = dict(catalog[movie_id], imdbRating='9.9', Genre='Drama, Mystery')
+    for movie_id in movie_ids[20:23]:
+        catalog[movie_id] = dict(catalog[movie_id], Title=catalog[movie_id]['Title'] + ' II', Director='New Person')
+    return catalog
+
+
+def unordered(node):
+    """
+    Turn a tree, or a node of a snapshot or node store, into nested dictionaries with sets of movies as leaves.
+    """
+    if hasattr(node, 'items'):
+        return {key: unordered(child) for key, child in node.items()}
+    return set(node)
+
+
+def catalog_contents(fileName):
+    """
+    Read the rows of a catalog, with value names in place of their IDs.
+    """
+    connection = sqlite3.connect(fileName)
+    contents = {'movies': sorted(connection.execute("SELECT * FROM movies").fetchall())}
+    for join_table, value_table, key in FACET_TABLES.values():
+        contents[join_table] = sorted(connection.execute(
+            f"SELECT m.imdb_id, v.name, j.position FROM {join_table} j JOIN movies m ON m.id = j.movie_id"
+            f" JOIN {value_table} v ON v.id = j.{key}").fetchall())
+        contents[value_table] = sorted(row[0] for row in connection.execute(f"SELECT name FROM {value_table}"))
+    # The statistics start with the number of rows they were gathered on
+    contents['statistics'] = sorted(connection.execute(
+        "SELECT idx, CAST(stat AS INTEGER) FROM sqlite_stat1 WHERE tbl = 'movies'").fetchall())
+    connection.close()
+    return contents
+
+
+class IncrementalBuildTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.incremental = build_catalog()
+        catalog = edit_catalog(read_json(os.path.join(cls.incremental, 'movies_info_updated.json')))
+        write_json(os.path.join(cls.incremental, 'movies_info_updated.json'), catalog)
+        run_build(cls.incremental, '--incremental')
+        cls.full = build_catalog()
+        write_json(os.path.join(cls.full, 'movies_info_updated.json'), catalog)
+        run_build(cls.full)
+
+    @classmethod
+    def tearDownClass(cls):
+        remove_directory(cls.incremental)
+        remove_directory(cls.full)
+
+    def path(self, directory, name):
+        return os.path.join(directory, name)
+
+    def test_same_files(self):
+        for name in SAME_FILES:
+            with self.subTest(name=name):
+                self.assertEqual(read_json(self.path(self.incremental, name)), read_json(self.path(self.full, name)))
+
+    def test_same_tree(self):
+        incremental = read_json(self.path(self.incremental, 'movies_tree.json'))
+        full = read_json(self.path(self.full, 'movies_tree.json'))
+        self.assertEqual(list(incremental['movies'].items()), list(full['movies'].items()))
+        self.assertEqual(incremental['ranks'], full['ranks'])
+        self.assertEqual(unordered(incremental['tree']), unordered(full['tree']))
+
+    def test_same_snapshot(self):
+        incremental = TreeSnapshot(self.path(self.incremental, 'movies_tree.bin'))
+        full = TreeSnapshot(self.path(self.full, 'movies_tree.bin'))
+        try:
+            self.assertEqual(unordered(incremental['tree']), unordered(full['tree']))
+            for sort_key in full['ranks']:
+                self.assertEqual(list(incremental['ranks'][sort_key]), list(full['ranks'][sort_key]))
+        finally:
+            incremental.close()
+            full.close()
+
+    def test_same_node_store(self):
+        def entries(directory):
+            connection = sqlite3.connect(self.path(directory, 'movies_tree_nodes.sqlite'))
+            rows = {key: json.loads(value) for key, value in connection.execute("SELECT key, value FROM entries")}
+            connection.close()
+            # Leaf entries are lists of movies, node entries hold their children counts
+            return {key: set(value) if key.startswith('node:') and isinstance(value, list) else value
+                    for key, value in rows.items()}
+        self.assertEqual(entries(self.incremental), entries(self.full))
+
+    def test_same_catalog(self):
+        incremental = catalog_contents(self.path(self.incremental, 'movies_catalog.sqlite'))
+        full = catalog_contents(self.path(self.full, 'movies_catalog.sqlite'))
+        self.assertIn('Atlantis', incremental['countries'])
+        for table in full:
+            with self.subTest(table=table):
+                if table == 'movies':
+                    # Row IDs differ, removed rows leave gaps
+                    self.assertEqual([row[1:] for row in incremental[table]], [row[1:] for row in full[table]])
+                else:
+                    self.assertEqual(incremental[table], full[table])
+
+    def test_other_options_rebuild(self):
+        directory = build_catalog(50)
+        try:
+            run_build(directory, '--incremental', '--levels', 'Genre', 'Decade')
+            manifest = read_json(self.path(directory, 'movies_tree_manifest.json'))
+            self.assertEqual(manifest['levels'], ['Genre', 'Decade'])
+            self.assertEqual(list(read_json(self.path(directory, 'movies_tree.json'))['tree']),
+                             list(read_json(self.path(directory, 'movies_index.json'))['Genre']))
+        finally:
+            remove_directory(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
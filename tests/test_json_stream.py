@@ -0,0 +1,102 @@
+"""
+############################## Final Projec: JSON Stream Tests ############################
+
+Test that json_stream.py writes the same text as json.dumps and reads back
+what json.loads does, also when values span the read buffer.
+
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import support  # noqa: F401, puts the project on the path
+import json_stream
+from json_stream import find_json, iter_json_items, read_json, write_items, write_json
+
+
+def sample():
+    """
+    Build a document with streamed and plain dictionaries, long strings, escapes and every kind of number.
+    """
+    movies = {f'tt{number:07d}': {'Title': f'Movie «{number}» "quoted" \\ \n', 'Year': 1900 + number % 120,
+                                  'imdbRating': number / 7 if number % 5 else None, 'imdbVotes': -number * 10 ** 12,
+                                  'Genre': ['Drama', 'Comedy'][:number % 3], 'Empty': {}}
+              for number in range(json_stream.STREAM_ENTRIES + 50)}
+    return {
+        'movies': movies,
+        'tree': {'English': {'United States': {'Drama': {'Awards': ['tt0000001', 'tt0000002']}}}, 'Empty': {}},
+        'ranks': {'Year': sorted(movies)},
+        'text': 'x' * 3 * json_stream.READ_SIZE + 'é中\U0001f3ac',
+        'numbers': [0, -0.0, 1e-7, 1.5e300, 12345678901234567890, True, False, None],
+    }
+
+
+class JSONStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='movies_test_')
+        self.data = sample()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def read_text(self, name):
+        with open(self.path(name), encoding='utf-8') as file:
+            return file.read()
+
+    def test_write_matches_json_dumps(self):
+        write_json(self.path('compact.json'), self.data)
+        self.assertEqual(self.read_text('compact.json'),
+                         json.dumps(self.data, ensure_ascii=False, separators=(',', ':')))
+        write_json(self.path('indented.json'), self.data, indent=4)
+        self.assertEqual(self.read_text('indented.json'), json.dumps(self.data, ensure_ascii=False, indent=4))
+
+    def test_round_trip(self):
+        for indent in (None, 2):
+            write_json(self.path('data.json'), self.data, indent)
+            self.assertEqual(read_json(self.path('data.json')), self.data)
+
+    def test_round_trip_with_small_buffer(self):
+        write_json(self.path('data.json'), self.data, indent=1)
+        for size in (1, 7, 64):
+            with self.subTest(size=size), mock.patch.object(json_stream, 'READ_SIZE', size):
+                self.assertEqual(read_json(self.path('data.json')), self.data)
+                self.assertEqual(dict(iter_json_items(self.path('data.json'), ('tree',))), self.data['tree'])
+
+    def test_iter_json_items(self):
+        write_json(self.path('data.json'), self.data)
+        self.assertEqual(list(iter_json_items(self.path('data.json'), ('movies',))), list(self.data['movies'].items()))
+        self.assertEqual([key for key, value in iter_json_items(self.path('data.json'))], list(self.data))
+
+    def test_write_items_from_generator(self):
+        write_items(self.path('items.json'), ((str(number), number * 2) for number in range(5000)))
+        self.assertEqual(read_json(self.path('items.json')), {str(number): number * 2 for number in range(5000)})
+
+    def test_gzip(self):
+        write_json(self.path('data.json.gz'), self.data)
+        self.assertEqual(find_json(self.path('data.json')), self.path('data.json.gz'))
+        self.assertEqual(read_json(self.path('data.json.gz')), self.data)
+
+    @unittest.skipIf(json_stream.zstandard is None, 'zstandard is not installed')
+    def test_zstd(self):
+        write_json(self.path('data.json.zst'), self.data)
+        self.assertEqual(read_json(self.path('data.json.zst')), self.data)
+
+    def test_invalid_files(self):
+        for text in ['{"a": 1} {"b": 2}', '{"a": [1, 2}', '{"a": "unterminated', '']:
+            with self.subTest(text=text):
+                with open(self.path('bad.json'), 'w', encoding='utf-8') as file:
+                    file.write(text)
+                with self.assertRaises(ValueError):
+                    read_json(self.path('bad.json'))
+
+
+if __name__ == '__main__':
+    unittest.main()
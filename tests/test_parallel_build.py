@@ -0,0 +1,55 @@
+"""
+############################## Final Projec: Parallel Build Tests ############################
+
+Test that Build Trees.py --workers N writes the same files, byte for byte,
+as the serial build.
+
+"""
+
+import os
+import unittest
+
+from support import build_catalog, remove_directory, run_build
+
+# The files written from the tree, the manifest and the indexes
+SAME_FILES = ['movies_tree.json', 'movies_tree_manifest.json', 'movies_index.json', 'movies_tree.bin',
+              'movies_title_index.json']
+
+
+def read_bytes(fileName):
+    with open(fileName, 'rb') as file:
+        return file.read()
+
+
+class ParallelBuildTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = build_catalog(500)
+        cls.serial = {name: read_bytes(os.path.join(cls.directory, name)) for name in SAME_FILES}
+
+    @classmethod
+    def tearDownClass(cls):
+        remove_directory(cls.directory)
+
+    def test_same_files(self):
+        for workers in ['2', '3']:
+            run_build(self.directory, '--workers', workers)
+            for name in SAME_FILES:
+                with self.subTest(workers=workers, name=name):
+                    self.assertEqual(read_bytes(os.path.join(self.directory, name)), self.serial[name])
+
+    def test_same_files_in_other_levels(self):
+        directory = build_catalog(200, 0, '--levels', 'Genre', 'Decade', 'Rating')
+        try:
+            serial = {name: read_bytes(os.path.join(directory, name)) for name in SAME_FILES}
+            run_build(directory, '--workers', '2', '--levels', 'Genre', 'Decade', 'Rating')
+            for name in SAME_FILES:
+                with self.subTest(name=name):
+                    self.assertEqual(read_bytes(os.path.join(directory, name)), serial[name])
+        finally:
+            remove_directory(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
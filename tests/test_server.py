@@ -0,0 +1,108 @@
+"""
+############################## Final Projec: Server Tests ############################
+
+Test the error responses of recommendation_server.py: malformed request
+heads and parameters answer 400, unknown endpoints, categories and movies
+404, and other methods than GET 405.
+
+"""
+
+import asyncio
+import json
+import os
+import socket
+import threading
+import unittest
+
+from support import build_catalog, remove_directory
+
+from recommendation_engine import RecommendationEngine
+from recommendation_server import MAX_BODY_SIZE, MAX_HEADER_SIZE, RecommendationServer
+
+
+class ServerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = build_catalog()
+        cls.cwd = os.getcwd()
+        os.chdir(cls.directory)
+        cls.engine = RecommendationEngine.load('json', use_cache=False)
+        cls.loop = asyncio.new_event_loop()
+        threading.Thread(target=cls.loop.run_forever, daemon=True).start()
+        handler = RecommendationServer(cls.engine).handle
+        cls.server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(handler, '127.0.0.1', 0, limit=MAX_HEADER_SIZE), cls.loop).result()
+        cls.port = cls.server.sockets[0].getsockname()[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.close()
+        asyncio.run_coroutine_threadsafe(cls.server.wait_closed(), cls.loop).result()
+        cls.loop.call_soon_threadsafe(cls.loop.stop)
+        cls.engine.close()
+        os.chdir(cls.cwd)
+        remove_directory(cls.directory)
+
+    def send(self, head, body=b''):
+        """
+        Send one raw request and read the response until the server closes the connection.
+
+        Returns
+        -------
+        tuple
+            (status code, decoded JSON body).
+        """
+        with socket.create_connection(('127.0.0.1', self.port), timeout=5) as connection:
+            connection.sendall(head.encode('latin-1') + b'\r\n\r\n' + body)
+            response = b''
+            while chunk := connection.recv(65536):
+                response += chunk
+        self.assertTrue(response, 'the server closed the connection without a response')
+        status_line, _, rest = response.partition(b'\r\n')
+        return int(status_line.split()[1]), json.loads(rest.partition(b'\r\n\r\n')[2])
+
+    def get(self, target, *headers):
+        return self.send('\r\n'.join([f'GET {target} HTTP/1.1', 'Connection: close', *headers]))
+
+    def test_browse(self):
+        status, body = self.get('/browse')
+        self.assertEqual(status, 200)
+        self.assertEqual(body['options'], list(self.engine.options()))
+
+    def test_malformed_content_length(self):
+        for length in ['abc', '-1', '1.5', '\xb2', str(MAX_BODY_SIZE + 1)]:
+            with self.subTest(length=length):
+                status, body = self.get('/browse', f'Content-Length: {length}')
+                self.assertEqual(status, 400)
+                self.assertIn('Content-Length', body['error'])
+
+    def test_body_is_skipped(self):
+        head = 'GET /browse HTTP/1.1\r\nContent-Length: 5\r\nConnection: close'
+        self.assertEqual(self.send(head, b'12345')[0], 200)
+
+    def test_malformed_request_line(self):
+        status, body = self.send('GARBAGE')
+        self.assertEqual(status, 400)
+
+    def test_invalid_parameters(self):
+        for target, message in [('/movies?limit=%C2%B2', "'limit' must be a non-negative integer."),
+                                ('/movies?offset=-3', "'offset' must be a non-negative integer."),
+                                ('/movies?sort=Title', "Unknown sort key 'Title'."),
+                                ('/movies?order=sideways', "Unknown order 'sideways'.")]:
+            with self.subTest(target=target):
+                self.assertEqual(self.get(target), (400, {'error': message}))
+
+    def test_not_found(self):
+        for target in ['/', '/nothing', '/movie/tt9999999', '/similar/tt9999999', '/browse/No Such Language',
+                       '/movie/tt0000001/extra']:
+            with self.subTest(target=target):
+                self.assertEqual(self.get(target.replace(' ', '%20'))[0], 404)
+
+    def test_method_not_allowed(self):
+        status, body = self.send('POST /browse HTTP/1.1\r\nConnection: close')
+        self.assertEqual(status, 405)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+"""
+############################## Final Projec: Similarity Tests ############################
+
+Test the hashed projection of similarity.py: it is stable, its vectors
+have unit length, and a copy of a movie is its most similar movie.
+
+"""
+
+import unittest
+
+import support  # noqa: F401, puts the project on the path
+from generate_catalog import generate_catalog
+from movie_records import Movie
+
+try:
+    import numpy as np
+    from similarity import DIMENSIONS, SimilarityIndex, feature_projection
+except ImportError:  # NumPy is not installed
+    SimilarityIndex = None
+
+
+@unittest.skipIf(SimilarityIndex is None, 'NumPy is not installed')
+class SimilarityIndexTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        catalog = generate_catalog(200)
+        catalog['tt9999999'] = dict(catalog['tt0000007'], imdbID='tt9999999')
+        cls.movies = {movie_id: Movie.from_omdb(movie_id, movie) for movie_id, movie in catalog.items()}
+        cls.index = SimilarityIndex.from_movies_info(cls.movies)
+
+    def test_projection_is_stable(self):
+        self.assertEqual(feature_projection('word:heist'), feature_projection('word:heist'))
+        self.assertNotEqual(feature_projection('word:heist'), feature_projection('word:heists'))
+        again = SimilarityIndex.from_movies_info(self.movies)
+        self.assertTrue(np.array_equal(again.vectors, self.index.vectors))
+
+    def test_vectors_have_unit_length(self):
+        self.assertEqual(self.index.vectors.shape, (len(self.movies), DIMENSIONS))
+        self.assertTrue(np.allclose(np.linalg.norm(self.index.vectors, axis=1), 1, atol=1e-5))
+
+    def test_copy_is_most_similar(self):
+        movie_id, score = self.index.most_similar('tt9999999', 5)[0]
+        self.assertEqual(movie_id, 'tt0000007')
+        self.assertAlmostEqual(score, 1, places=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
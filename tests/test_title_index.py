@@ -0,0 +1,127 @@
+"""
+############################## Final Projec: Title Index Tests ############################
+
+Test the edit distance, the BK-tree and the lookups of title_index.py
+against brute force over a synthetic catalog.
+
+"""
+
+import random
+import unittest
+
+import support  # noqa: F401, puts the project on the path
+from generate_catalog import generate_catalog
+from title_index import MAX_EDITS, BKTree, TitleIndex, edit_distance, normalize_title
+
+
+def levenshtein(first, second):
+    """
+    Compute the Levenshtein distance with the plain dynamic programming table.
+    """
+    previous = list(range(len(second) + 1))
+    for i, character in enumerate(first, 1):
+        current = [i]
+        for j, other in enumerate(second, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (character != other)))
+        previous = current
+    return previous[-1]
+
+
+def typo(text, rng):
+    """
+    Replace, drop or insert one character of a text.
+    """
+    i = rng.randrange(len(text))
+    kind = rng.randrange(3)
+    if kind == 0:
+        return text[:i] + 'q' + text[i + 1:]
+    if kind == 1:
+        return text[:i] + text[i + 1:]
+    return text[:i] + 'z' + text[i:]
+
+
+class EditDistanceTest(unittest.TestCase):
+
+    def test_matches_dynamic_programming(self):
+        rng = random.Random(0)
+        for _ in range(500):
+            # Strings longer than 64 characters take more than one machine word of bits
+            first = ''.join(rng.choice('abcé ') for _ in range(rng.randint(0, 90)))
+            second = ''.join(rng.choice('abcé ') for _ in range(rng.randint(0, 90)))
+            with self.subTest(first=first, second=second):
+                self.assertEqual(edit_distance(first, second), levenshtein(first, second))
+
+    def test_limit(self):
+        rng = random.Random(1)
+        for _ in range(300):
+            first = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 12)))
+            second = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 12)))
+            limit = rng.randint(0, 4)
+            with self.subTest(first=first, second=second, limit=limit):
+                self.assertEqual(edit_distance(first, second, limit), min(levenshtein(first, second), limit + 1))
+
+
+class TitleIndexTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.movies = generate_catalog(support.CATALOG_SIZE, 0)
+        cls.index = TitleIndex.from_movies(cls.movies)
+        cls.normalized = {movie_id: normalize_title(movie['Title']) for movie_id, movie in cls.movies.items()}
+
+    def test_bk_tree_matches_brute_force(self):
+        titles = sorted(set(self.normalized.values()))
+        tree = BKTree(titles)
+        rng = random.Random(2)
+        for query in rng.sample(titles, 40) + [typo(title, rng) for title in rng.sample(titles, 40)]:
+            for max_distance in range(4):
+                expected = sorted((edit_distance(query, title), title) for title in titles
+                                  if edit_distance(query, title) <= max_distance)
+                with self.subTest(query=query, max_distance=max_distance):
+                    self.assertEqual(sorted(tree.search(query, max_distance)), expected)
+
+    def test_exact_lookup(self):
+        for movie_id, movie in list(self.movies.items())[:50]:
+            with self.subTest(movie_id=movie_id):
+                matches = self.index.search(f"the {movie['Title'].upper()}!", limit=len(self.movies))
+                exact = {other for other, title in self.normalized.items() if title == self.normalized[movie_id]}
+                self.assertEqual(set(matches[:len(exact)]), exact)
+                self.assertTrue(self.index.is_exact(movie['Title'], movie_id))
+
+    def test_year_ranks_movies_of_that_year_first(self):
+        for movie_id, movie in list(self.movies.items())[:50]:
+            same_year = {other for other, title in self.normalized.items() if title == self.normalized[movie_id]
+                         and self.movies[other]['Year'] == movie['Year']}
+            with self.subTest(movie_id=movie_id):
+                matches = self.index.search(f"{movie['Title']} ({movie['Year']})", limit=len(same_year))
+                self.assertEqual(set(matches), same_year)
+                self.assertIn(self.index.resolve(f"{movie['Title']} {movie['Year']}"), same_year)
+
+    def test_typos_find_every_title_within_max_edits(self):
+        rng = random.Random(3)
+        for movie_id in rng.sample(sorted(self.movies), 50):
+            query = typo(self.normalized[movie_id], rng)
+            close = {other for other, title in self.normalized.items()
+                     if levenshtein(query, title) <= MAX_EDITS}
+            with self.subTest(query=query):
+                matches = self.index.search(query, limit=len(self.movies))
+                self.assertIn(movie_id, close)
+                self.assertEqual(set(matches[:len(close)]), close)
+
+    def test_nonsense_resolves_to_nothing(self):
+        for text in ['', '   ', '!!!', 'xqzjvwkp', 'zzzzzzzzzzzzzzzzzzzzzzzzzzzz']:
+            with self.subTest(text=text):
+                self.assertIsNone(self.index.resolve(text))
+
+    def test_round_trip(self):
+        loaded = TitleIndex.from_dict(self.index.to_dict())
+        rng = random.Random(4)
+        for movie_id in rng.sample(sorted(self.movies), 30):
+            title = self.movies[movie_id]['Title']
+            for text in [title, typo(title, rng), f"{title} {self.movies[movie_id]['Year']}"]:
+                with self.subTest(text=text):
+                    self.assertEqual(loaded.search(text, limit=10), self.index.search(text, limit=10))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+############################## Final Projec: Snapshot Tests ############################
+
+Test that a binary snapshot decodes to the JSON tree it was written from,
+and that rewriting it leaves an open snapshot readable.
+
+"""
+
+import os
+import unittest
+
+from support import build_catalog, remove_directory
+
+from json_stream import read_json
+from tree_snapshot import TreeSnapshot, write_snapshot
+
+
+def plain(node):
+    """
+    Decode a node of a snapshot into the dictionaries and lists of the JSON tree.
+    """
+    if isinstance(node, list) or not hasattr(node, 'items'):
+        return list(node)
+    return {key: plain(child) for key, child in node.items()}
+
+
+class TreeSnapshotTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = build_catalog()
+        cls.fileName = os.path.join(cls.directory, 'movies_tree.bin')
+        cls.movies_tree = read_json(os.path.join(cls.directory, 'movies_tree.json'))
+
+    @classmethod
+    def tearDownClass(cls):
+        remove_directory(cls.directory)
+
+    def test_matches_json_tree(self):
+        snapshot = TreeSnapshot(self.fileName)
+        try:
+            self.assertEqual(plain(snapshot['tree']), self.movies_tree['tree'])
+            for sort_key, order in self.movies_tree['ranks'].items():
+                ranks = snapshot['ranks'][sort_key]
+                self.assertEqual(list(ranks), order)
+                self.assertEqual(list(reversed(ranks)), order[::-1])
+                self.assertEqual(ranks[-1], order[-1])
+                self.assertEqual(list(ranks[3:9]), order[3:9])
+            movie_id = next(iter(self.movies_tree['movies']))
+            self.assertEqual(snapshot['movies'][movie_id]['Title'], self.movies_tree['movies'][movie_id]['Title'])
+        finally:
+            snapshot.close()
+
+    def test_rewrite_keeps_open_snapshot_readable(self):
+        snapshot = TreeSnapshot(self.fileName)
+        try:
+            before = plain(snapshot['tree'])
+            # A smaller tree, which a rewrite in place would show through the old mapping
+            tree = dict(self.movies_tree['tree'])
+            tree.pop(next(iter(tree)))
+            write_snapshot(dict(self.movies_tree, tree=tree), self.fileName)
+            self.assertEqual(plain(snapshot['tree']), before)
+            self.assertFalse(os.path.exists(self.fileName + '.tmp'))
+        finally:
+            snapshot.close()
+            write_snapshot(self.movies_tree, self.fileName)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+############################## Final Projec: Wikipedia Tests ############################
+
+Test that SummaryPrefetcher fetches again the titles of a failed batch,
+and drops the prefetches it has returned. The Wikipedia API is replaced
+by a function answering from a dictionary of extracts.
+
+"""
+
+import unittest
+from unittest import mock
+
+import requests
+
+import support  # noqa: F401, puts the project on the path
+import wikipedia
+from wikipedia import SummaryPrefetcher
+
+
+class FakeWikipedia:
+    """
+    Answer the requests of wikipedia.py with the extracts of a dictionary, failing the first `failures` requests.
+    """
+
+    def __init__(self, extracts, failures=0):
+        self.extracts = extracts
+        self.failures = failures
+        self.requests = []
+
+    def get(self, url, params=None, timeout=None):
+        titles = params['titles'].split('|')
+        self.requests.append(titles)
+        if timeout is None:
+            raise AssertionError('request sent without a timeout')
+        if self.failures:
+            self.failures -= 1
+            raise requests.ConnectionError('network down')
+        pages = {str(number): {'title': title, 'extract': self.extracts.get(title, '')}
+                 for number, title in enumerate(titles)}
+        response = mock.Mock()
+        response.json.return_value = {'query': {'pages': pages}}
+        return response
+
+
+class SummaryPrefetcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.prefetcher = SummaryPrefetcher()
+
+    def tearDown(self):
+        self.prefetcher.close()
+
+    def prefetch(self, fake, titles):
+        with mock.patch.object(wikipedia.requests, 'get', fake.get):
+            self.prefetcher.prefetch(titles)
+            for title in titles:
+                future = self.prefetcher.futures.get(title)
+                if future is not None:
+                    future.result()
+
+    def test_failed_batch_is_fetched_again(self):
+        fake = FakeWikipedia({'Alien (film)': 'A 1979 film.'}, failures=1)
+        self.prefetch(fake, ['Alien (film)', 'Alien'])
+        self.assertNotIn('Alien (film)', self.prefetcher.futures)
+        with mock.patch.object(wikipedia.requests, 'get', fake.get):
+            self.assertEqual(self.prefetcher.get_first(['Alien (film)', 'Alien']), 'A 1979 film.')
+        self.assertEqual(len(fake.requests), 2)
+
+    def test_prefetch_is_dropped_once_read(self):
+        fake = FakeWikipedia({'Heat': 'A 1995 film.'})
+        self.prefetch(fake, ['Heat'])
+        self.assertTrue(self.prefetcher.ready('Heat'))
+        with mock.patch.object(wikipedia.requests, 'get', fake.get):
+            self.assertEqual(self.prefetcher.get('Heat'), 'A 1995 film.')
+        self.assertEqual(len(self.prefetcher.futures), 0)
+        self.assertEqual(len(fake.requests), 1)
+
+    def test_prefetches_are_bounded(self):
+        fake = FakeWikipedia({})
+        with mock.patch.object(wikipedia, 'MAX_PREFETCHED', 30):
+            self.prefetch(fake, [f'Movie {number}' for number in range(100)])
+        self.assertLessEqual(len(self.prefetcher.futures), 30)
+
+    def test_single_summary_survives_network_errors(self):
+        fake = FakeWikipedia({}, failures=1)
+        with mock.patch.object(wikipedia.requests, 'get', fake.get), mock.patch('builtins.print'):
+            self.assertEqual(wikipedia.get_wikipedia_summary('Heat'), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,474 @@
+"""
+############################## Final Projec: Title Index ############################
+
+A local index of movie titles, written by Build Trees.py and used by
+User Interaction.py to resolve "enter the name of the movie" to an IMDb ID.
+
+Titles are normalized (case, accents, punctuation, a leading article) and
+looked up in three steps: an exact hash map lookup, a trigram inverted
+index that shortlists similar titles, and a search for titles within a
+small edit distance when the trigrams do not overlap enough. That search
+filters the trigram matches for long inputs, and walks a BK-tree for
+inputs too short for the trigrams to survive a typo.
+
+"""
+
+import heapq
+import itertools
+import re
+import unicodedata
+from collections import Counter
+
+# Number of edits a title may be away from the input for a BK-tree match
+MAX_EDITS = 2
+
+# Minimum share of the input's trigrams a shortlisted title must contain
+MIN_TRIGRAM_OVERLAP = 0.3
+
+# Number of shortlisted titles, with the best trigram overlap, ranked by edit distance
+SHORTLIST_SIZE = 50
+
+YEAR_PATTERN = re.compile(r'\s*\(?\b(1[89]\d\d|20\d\d)\b\)?\s*$')
+
+
+def normalize_title(title):
+    """
+    Normalize a title for matching.
+
+    Accents and punctuation are removed, the text is lower-cased, white
+    space is collapsed and a leading 'the', 'a' or 'an' is dropped.
+
+    Parameters
+    ----------
+    title : str
+        The title as entered or as stored.
+
+    Returns
+    -------
+    str
+        The normalized title.
+    """
+    title = unicodedata.normalize('NFKD', title)
+    title = ''.join(character for character in title if not unicodedata.combining(character))
+    title = re.sub(r'[^\w\s]', ' ', title.lower().replace('&', ' and '))
+    title = ' '.join(title.split())
+    return re.sub(r'^(the|a|an) ', '', title)
+
+
+def split_year(text):
+    """
+    Split a trailing release year such as 'Heat 1995' or 'Heat (1995)' off a title.
+
+    Parameters
+    ----------
+    text : str
+        The text entered by the user.
+
+    Returns
+    -------
+    tuple
+        (title, year), year is None if there was none.
+    """
+    match = YEAR_PATTERN.search(text)
+    if match is None or match.start() == 0:
+        return text, None
+    return text[:match.start()], int(match.group(1))
+
+
+def trigrams(title):
+    """
+    Get the character trigrams of a normalized title, padded at both ends.
+
+    Parameters
+    ----------
+    title : str
+        A normalized title.
+
+    Returns
+    -------
+    set of str
+        The trigrams.
+    """
+    padded = f'  {title} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(first, second, limit=None):
+    """
+    Compute the Levenshtein distance between two strings.
+
+    Uses the bit-parallel algorithm of Myers, as formulated by Hyyrö: a
+    column of the dynamic programming table is kept as the bits of two
+    integers, so each character of the longer string costs a few integer
+    operations instead of a pass over the shorter string.
+
+    Parameters
+    ----------
+    first, second : str
+        The strings to compare.
+    limit : int, optional
+        Return limit + 1 for any distance above limit.
+
+    Returns
+    -------
+    int
+        The number of single-character edits.
+    """
+    if len(first) < len(second):
+        first, second = second, first
+    if limit is not None and len(first) - len(second) > limit:
+        return limit + 1
+    if not second:
+        distance = len(first)
+    else:
+        # Bit i of a mask is set where second[i] is the character
+        masks = {}
+        for i, character in enumerate(second):
+            masks[character] = masks.get(character, 0) | (1 << i)
+        full = (1 << len(second)) - 1
+        top = 1 << (len(second) - 1)
+        # The vertical deltas of the column, +1 in positive and -1 in negative
+        positive, negative = full, 0
+        distance = len(second)
+        for character in first:
+            equal = masks.get(character, 0)
+            vertical = equal | negative
+            horizontal = (((equal & positive) + positive) ^ positive) | equal
+            horizontal_positive = (negative | ~(horizontal | positive)) & full
+            horizontal_negative = positive & horizontal
+            if horizontal_positive & top:
+                distance += 1
+            elif horizontal_negative & top:
+                distance -= 1
+            horizontal_positive = (horizontal_positive << 1) | 1
+            horizontal_negative <<= 1
+            positive = (horizontal_negative | ~(vertical | horizontal_positive)) & full
+            negative = horizontal_positive & vertical & full
+    return distance if limit is None else min(distance, limit + 1)
+
+
+def wikipedia_titles(title, year):
+    """
+    Get the Wikipedia page titles to try for a movie, most precise first.
+
+    Parameters
+    ----------
+    title : str
+        The title of the movie.
+    year : int or None
+        The release year of the movie.
+
+    Returns
+    -------
+    list of str
+        'Title (Year film)', 'Title (film)' and 'Title'.
+    """
+    candidates = [f'{title} (film)', title]
+    if year is not None:
+        candidates.insert(0, f'{title} ({year} film)')
+    return candidates
+
+
+class BKTree:
+    """
+    A Burkhard-Keller tree over normalized titles for edit distance queries.
+
+    Parameters
+    ----------
+    titles : iterable of str
+        The normalized titles to insert.
+    """
+
+    def __init__(self, titles=()):
+        self.root = None
+        for title in titles:
+            self.add(title)
+
+    def add(self, title):
+        """
+        Insert a title.
+
+        Parameters
+        ----------
+        title : str
+            The normalized title.
+        """
+        if self.root is None:
+            self.root = (title, {})
+            return
+        node = self.root
+        while True:
+            distance = edit_distance(title, node[0])
+            if distance == 0:
+                return
+            if distance not in node[1]:
+                node[1][distance] = (title, {})
+                return
+            node = node[1][distance]
+
+    def search(self, title, max_distance):
+        """
+        Find the titles within an edit distance of a title.
+
+        Parameters
+        ----------
+        title : str
+            The normalized title to search for.
+        max_distance : int
+            The largest accepted edit distance.
+
+        Returns
+        -------
+        list of tuple
+            (distance, title) pairs.
+        """
+        matches = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_title, children = stack.pop()
+            # Past this bound no child can match, so the exact distance is not needed
+            bound = max(children, default=0) + max_distance
+            distance = edit_distance(title, node_title, bound)
+            if distance <= max_distance:
+                matches.append((distance, node_title))
+            # By the triangle inequality only these children can match
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return matches
+
+    def to_list(self):
+        """
+        Convert the tree to nested [title, {distance: child}] lists for JSON.
+
+        Returns
+        -------
+        list or None
+            The root node.
+        """
+        def convert(node):
+            return [node[0], {str(distance): convert(child) for distance, child in node[1].items()}]
+        return convert(self.root) if self.root is not None else None
+
+    @classmethod
+    def from_list(cls, data):
+        """
+        Rebuild a tree stored with to_list.
+
+        Parameters
+        ----------
+        data : list or None
+            The stored root node.
+
+        Returns
+        -------
+        BKTree
+            The tree.
+        """
+        def convert(node):
+            return (node[0], {int(distance): convert(child) for distance, child in node[1].items()})
+        tree = cls()
+        tree.root = convert(data) if data is not None else None
+        return tree
+
+
+class TitleIndex:
+    """
+    Resolve free-text movie names to IMDb IDs.
+
+    Parameters
+    ----------
+    titles : dict
+        IMDb ID -> (title, year).
+    exact, postings, bk_tree : optional
+        The prebuilt structures, as stored by to_dict. Built from the titles
+        if omitted.
+    """
+
+    def __init__(self, titles, exact=None, postings=None, bk_tree=None):
+        self.titles = titles
+        if exact is None:
+            exact = {}
+            for movie_id, (title, year) in titles.items():
+                exact.setdefault(normalize_title(title), []).append(movie_id)
+        self.exact = exact
+        if postings is None:
+            postings = {}
+            for normalized in exact:
+                # Sorted, as the order of a set of strings changes with the hash seed of every run
+                for trigram in sorted(trigrams(normalized)):
+                    postings.setdefault(trigram, []).append(normalized)
+        self.postings = postings
+        # The number of distinct trigrams of every title, the number of postings it is in
+        self.sizes = Counter(itertools.chain.from_iterable(postings.values()))
+        self.bk_tree = bk_tree if bk_tree is not None else BKTree(exact)
+
+    @classmethod
+    def from_movies(cls, movies):
+        """
+        Build an index from the movie table of the tree.
+
+        Parameters
+        ----------
+        movies : Mapping
+            IMDb ID -> movie details with 'Title' and 'Year'.
+
+        Returns
+        -------
+        TitleIndex
+            The index.
+        """
+        return cls({movie_id: (movie['Title'], movie['Year']) for movie_id, movie in movies.items()})
+
+    def to_dict(self):
+        """
+        Get the data to store in movies_title_index.json.
+
+        Returns
+        -------
+        dict
+            The titles, the normalized-title hash map, the trigram postings
+            and the BK-tree.
+        """
+        return {'titles': self.titles, 'exact': self.exact, 'postings': self.postings, 'bk_tree': self.bk_tree.to_list()}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Load an index stored with to_dict.
+
+        Parameters
+        ----------
+        data : dict
+            The stored index.
+
+        Returns
+        -------
+        TitleIndex
+            The index.
+        """
+        return cls({movie_id: tuple(entry) for movie_id, entry in data['titles'].items()},
+                   data['exact'], data['postings'], BKTree.from_list(data['bk_tree']))
+
+    def search(self, text, limit=5):
+        """
+        Rank the movies whose title best matches free text.
+
+        Exact matches of the normalized title come first. Other titles are
+        ranked by edit distance (up to MAX_EDITS), then by trigram overlap. A year at the end of
+        the text is used to rank movies of that year first.
+
+        Parameters
+        ----------
+        text : str
+            The movie name entered by the user, e.g. 'godfather 1972'.
+        limit : int
+            The number of suggestions.
+
+        Returns
+        -------
+        list of str
+            IMDb IDs, best match first.
+        """
+        title, year = split_year(text)
+        normalized = normalize_title(title)
+        if not normalized:
+            return []
+
+        exact = self.exact.get(normalized, [])
+        # Exact matches of the year outrank every other title, so enough of them settle the search
+        matching = [movie_id for movie_id in exact if year is None or self.titles[movie_id][1] == year]
+        if len(matching) >= limit:
+            return sorted(matching)[:limit]
+
+        scores = {}
+        for movie_id in exact:
+            scores[movie_id] = (0, 0.0)
+
+        if len(scores) < limit:
+            # Shortlist the titles sharing enough trigrams with the input
+            query = trigrams(normalized)
+            shared = Counter(itertools.chain.from_iterable(self.postings.get(trigram, ()) for trigram in query))
+            # A title sharing fewer trigrams can neither overlap enough, nor contain the input, nor be
+            # within MAX_EDITS of it, since an edit removes at most three trigrams
+            floor = min(MIN_TRIGRAM_OVERLAP * len(query), len(query) - 3 * MAX_EDITS)
+            shared = {candidate: count for candidate, count in shared.items() if count >= floor}
+            candidates = {}
+            for candidate, count in shared.items():
+                # Distinct trigrams in either title, from the stored trigram counts
+                overlap = count / (len(query) + self.sizes[candidate] - count)
+                if overlap >= MIN_TRIGRAM_OVERLAP or normalized in candidate:
+                    candidates[candidate] = overlap
+            # Typos in short titles leave few shared trigrams, look for titles within MAX_EDITS too
+            if len(candidates) < limit:
+                if len(query) > 3 * MAX_EDITS:
+                    close = [candidate for candidate, count in shared.items()
+                             if count >= len(query) - 3 * MAX_EDITS
+                             and edit_distance(normalized, candidate, MAX_EDITS) <= MAX_EDITS]
+                else:
+                    close = [candidate for distance, candidate in self.bk_tree.search(normalized, MAX_EDITS)]
+                for candidate in close:
+                    candidates.setdefault(candidate, 0.0)
+            # Only the best overlaps, movies of the year first, are worth an edit distance
+            shortlist = heapq.nlargest(max(SHORTLIST_SIZE, limit), candidates.items(), key=lambda item: (
+                year is None or any(self.titles[movie_id][1] == year for movie_id in self.exact[item[0]]), item[1]))
+            for candidate, overlap in shortlist:
+                # Beyond MAX_EDITS the candidates are only ranked by trigram overlap
+                distance = edit_distance(normalized, candidate, MAX_EDITS)
+                for movie_id in self.exact[candidate]:
+                    scores.setdefault(movie_id, (distance, -overlap))
+
+        ranked = sorted(scores, key=lambda movie_id: (
+            year is not None and self.titles[movie_id][1] != year, scores[movie_id], movie_id))
+        return ranked[:limit]
+
+    def is_exact(self, text, movie_id):
+        """
+        Check whether free text names a movie exactly, up to normalization.
+
+        Parameters
+        ----------
+        text : str
+            The movie name entered by the user.
+        movie_id : str
+            The IMDb ID of a match.
+
+        Returns
+        -------
+        bool
+            True if the normalized titles are equal.
+        """
+        return normalize_title(split_year(text)[0]) == normalize_title(self.titles[movie_id][0])
+
+    def resolve(self, text):
+        """
+        Resolve free text to a single IMDb ID.
+
+        Parameters
+        ----------
+        text : str
+            The movie name entered by the user.
+
+        Returns
+        -------
+        str or None
+            The IMDb ID of the best match, None if nothing is close.
+        """
+        matches = self.search(text, limit=1)
+        return matches[0] if matches else None
+
+    def wikipedia_titles(self, movie_id):
+        """
+        Get the Wikipedia page titles to try for a movie, most precise first.
+
+        Parameters
+        ----------
+        movie_id : str
+            The IMDb ID of the movie.
+
+        Returns
+        -------
+        list of str
+            'Title (Year film)', 'Title (film)' and 'Title'.
+        """
+        return wikipedia_titles(*self.titles[movie_id])
@@ -0,0 +1,425 @@
+"""
+############################## Final Projec: Tree Snapshot ############################
+
+A compact binary snapshot of the movie tree, written by Build Trees.py and
+opened lazily by User Interaction.py.
+
+The file holds a string table, a table of fixed-width movie records, the
+rank arrays and the tree nodes. It is opened with mmap and nothing is
+decoded up front: a node is only read when the user navigates into it, and
+a movie only when it is shown.
+
+Layout (little-endian):
+    header   magic, the offsets of the movies, ranks and nodes sections
+             and the offset of the root node
+    strings  count, count + 1 byte offsets, UTF-8 data
+    movies   count, then one MOVIE_RECORD per movie in IMDb ID order
+    ranks    count, then per sort key: key string, length, movie numbers
+    nodes    per node: kind, length, then (key string, child offset, movie
+             count) triples for an internal node or movie numbers for a leaf.
+             The count is the number of distinct movies below the child.
+
+"""
+
+import mmap
+import os
+import struct
+from collections.abc import Mapping, Sequence
+
+MAGIC = b'MVTREE02'
+HEADER = struct.Struct('<8sQQQQ')
+COUNT = struct.Struct('<I')
+NODE = struct.Struct('<BI')
+# IMDb ID, Title, Director, Actors, Plot and Poster as string numbers, then
+# Year, imdbRating, popularity and imdbVotes
+MOVIE_RECORD = struct.Struct('<IIIIIIifdq')
+STRING_FIELDS = ['Title', 'Director', 'Actors', 'Plot', 'Poster']
+
+INTERNAL = 0
+LEAF = 1
+
+# Number of movie numbers of a rank array decoded at once when it is iterated
+RANK_CHUNK = 256
+
+
+def write_snapshot(movies_tree, fileName):
+    """
+    Write a movie tree to a binary snapshot.
+
+    Parameters
+    ----------
+    movies_tree : dict
+        A tree produced by organize_movies_info_into_tree.
+    fileName : str
+        The snapshot file to write. It is replaced at once, never rewritten in place.
+    """
+    strings = {}
+
+    def string_number(value):
+        return strings.setdefault(value, len(strings))
+
+    movie_ids = sorted(movies_tree['movies'])
+    movie_numbers = {movie_id: number for number, movie_id in enumerate(movie_ids)}
+
+    movies = bytearray(COUNT.pack(len(movie_ids)))
+    for movie_id in movie_ids:
+        movie = movies_tree['movies'][movie_id]
+        movies += MOVIE_RECORD.pack(
+            string_number(movie_id),
+            *(string_number(movie[field]) for field in STRING_FIELDS),
+            -1 if movie['Year'] is None else movie['Year'],
+            float('nan') if movie['imdbRating'] is None else movie['imdbRating'],
+            float('nan') if movie['popularity'] is None else movie['popularity'],
+            -1 if movie['imdbVotes'] is None else movie['imdbVotes'],
+        )
+
+    ranks = bytearray(COUNT.pack(len(movies_tree['ranks'])))
+    for sort_key, order in movies_tree['ranks'].items():
+        ranks += struct.pack(f'<II{len(order)}I', string_number(sort_key), len(order),
+                             *(movie_numbers[movie_id] for movie_id in order))
+
+    # The nodes are written children first, so that every node knows the
+    # offsets of its children. Offsets are relative to the nodes section.
+    nodes = bytearray()
+
+    def write_node(node):
+        if isinstance(node, list):
+            entries = [movie_numbers[movie_id] for movie_id in node]
+            kind = LEAF
+            ids = set(entries)
+        else:
+            entries = []
+            ids = set()
+            for key, child in node.items():
+                child_offset, child_ids = write_node(child)
+                entries += [string_number(key), child_offset, len(child_ids)]
+                ids |= child_ids
+            kind = INTERNAL
+        offset = len(nodes)
+        nodes.extend(NODE.pack(kind, len(node)))
+        nodes.extend(struct.pack(f'<{len(entries)}I', *entries))
+        return offset, ids
+
+    root = write_node(movies_tree['tree'])[0]
+
+    encoded = [value.encode('utf-8') for value in strings]
+    string_offsets = [0]
+    for value in encoded:
+        string_offsets.append(string_offsets[-1] + len(value))
+    string_table = COUNT.pack(len(encoded)) + struct.pack(f'<{len(string_offsets)}I', *string_offsets) + b''.join(encoded)
+
+    strings_offset = HEADER.size
+    movies_offset = strings_offset + len(string_table)
+    ranks_offset = movies_offset + len(movies)
+    nodes_offset = ranks_offset + len(ranks)
+    # A running session may have the old file mapped, truncating it in
+    # place would break its reads, so the new one is moved over it
+    temporary = fileName + '.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, movies_offset, ranks_offset, nodes_offset, nodes_offset + root))
+        file.write(string_table)
+        file.write(movies)
+        file.write(ranks)
+        file.write(nodes)
+    os.replace(temporary, fileName)
+
+
+class TreeSnapshot(Mapping):
+    """
+    A memory-mapped snapshot, usable wherever the JSON movie tree is.
+
+    It is a mapping with the keys 'movies', 'tree' and 'ranks', like the
+    dictionary loaded from movies_tree.json, but every part is decoded on
+    access.
+
+    Parameters
+    ----------
+    fileName : str
+        The snapshot file written by write_snapshot.
+
+    Raises
+    ------
+    ValueError
+        If the file is not a movie tree snapshot.
+    """
+
+    def __init__(self, fileName):
+        with open(fileName, 'rb') as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, movies_offset, ranks_offset, nodes_offset, root_offset = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"'{fileName}' is not a movie tree snapshot.")
+        self.string_count = COUNT.unpack_from(self.buffer, HEADER.size)[0]
+        self.string_offsets = HEADER.size + COUNT.size
+        self.string_data = self.string_offsets + (self.string_count + 1) * COUNT.size
+        self.nodes_offset = nodes_offset
+        self.parts = {
+            'movies': SnapshotMovies(self, movies_offset),
+            'tree': SnapshotNode(self, root_offset),
+            'ranks': SnapshotRanks(self, ranks_offset),
+        }
+
+    def string(self, number):
+        """
+        Decode one entry of the string table.
+
+        Parameters
+        ----------
+        number : int
+            The string number.
+
+        Returns
+        -------
+        str
+            The decoded string.
+        """
+        start, end = struct.unpack_from('<II', self.buffer, self.string_offsets + number * COUNT.size)
+        return self.buffer[self.string_data + start:self.string_data + end].decode('utf-8')
+
+    def unpack_numbers(self, offset, count):
+        """
+        Read an array of unsigned 32-bit numbers.
+
+        Parameters
+        ----------
+        offset : int
+            The position of the array in the file.
+        count : int
+            The length of the array.
+
+        Returns
+        -------
+        tuple of int
+            The numbers.
+        """
+        return struct.unpack_from(f'<{count}I', self.buffer, offset)
+
+    def __getitem__(self, key):
+        return self.parts[key]
+
+    def __iter__(self):
+        return iter(self.parts)
+
+    def __len__(self):
+        return len(self.parts)
+
+    def close(self):
+        """
+        Unmap the snapshot file.
+        """
+        self.buffer.close()
+
+
+class SnapshotNode(Mapping):
+    """
+    A category node of a snapshot. Its entries are read on first access.
+
+    Parameters
+    ----------
+    snapshot : TreeSnapshot
+        The snapshot the node belongs to.
+    offset : int
+        The position of the node in the file.
+    """
+
+    def __init__(self, snapshot, offset):
+        self.snapshot = snapshot
+        self.offset = offset
+        self.children = None
+        self.movie_counts = None
+
+    def load(self):
+        """
+        Decode the child names, offsets and movie counts of the node, once.
+        """
+        if self.children is None:
+            kind, count = NODE.unpack_from(self.snapshot.buffer, self.offset)
+            entries = self.snapshot.unpack_numbers(self.offset + NODE.size, 3 * count)
+            names = [self.snapshot.string(entries[i]) for i in range(0, len(entries), 3)]
+            self.children = dict(zip(names, entries[1::3]))
+            self.movie_counts = dict(zip(names, entries[2::3]))
+        return self.children
+
+    def counts(self):
+        """
+        Get the number of distinct movies below each child, without decoding them.
+
+        Returns
+        -------
+        dict
+            Child name -> movie count.
+        """
+        self.load()
+        return self.movie_counts
+
+    def __getitem__(self, key):
+        offset = self.snapshot.nodes_offset + self.load()[key]
+        kind, count = NODE.unpack_from(self.snapshot.buffer, offset)
+        if kind == LEAF:
+            movies = self.snapshot['movies']
+            return [movies.movie_id(number) for number in self.snapshot.unpack_numbers(offset + NODE.size, count)]
+        return SnapshotNode(self.snapshot, offset)
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def __len__(self):
+        return len(self.load())
+
+
+class SnapshotMovies(Mapping):
+    """
+    The movie table of a snapshot. Movies are decoded when they are looked up.
+
+    Parameters
+    ----------
+    snapshot : TreeSnapshot
+        The snapshot the table belongs to.
+    offset : int
+        The position of the table in the file.
+    """
+
+    def __init__(self, snapshot, offset):
+        self.snapshot = snapshot
+        self.count = COUNT.unpack_from(snapshot.buffer, offset)[0]
+        self.records = offset + COUNT.size
+        self.decoded = {}
+
+    def record(self, number):
+        """
+        Unpack the fixed-width record of a movie number.
+        """
+        return MOVIE_RECORD.unpack_from(self.snapshot.buffer, self.records + number * MOVIE_RECORD.size)
+
+    def movie_id(self, number):
+        """
+        Decode the IMDb ID of a movie number.
+        """
+        return self.snapshot.string(self.record(number)[0])
+
+    def number(self, movie_id):
+        """
+        Find the movie number of an IMDb ID by binary search over the sorted records.
+        """
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.movie_id(middle) < movie_id:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.count or self.movie_id(low) != movie_id:
+            raise KeyError(movie_id)
+        return low
+
+    def __getitem__(self, movie_id):
+        if movie_id not in self.decoded:
+            record = self.record(self.number(movie_id))
+            movie = {field: self.snapshot.string(number) for field, number in zip(STRING_FIELDS, record[1:6])}
+            year, rating, popularity, votes = record[6:]
+            movie['Year'] = None if year < 0 else year
+            movie['imdbRating'] = None if rating != rating else round(rating, 1)
+            movie['popularity'] = None if popularity != popularity else popularity
+            movie['imdbVotes'] = None if votes < 0 else votes
+            self.decoded[movie_id] = movie
+        return self.decoded[movie_id]
+
+    def __iter__(self):
+        return (self.movie_id(number) for number in range(self.count))
+
+    def __len__(self):
+        return self.count
+
+
+class SnapshotRanks(Mapping):
+    """
+    The rank arrays of a snapshot, decoded per sort key on access.
+
+    Parameters
+    ----------
+    snapshot : TreeSnapshot
+        The snapshot the rank arrays belong to.
+    offset : int
+        The position of the rank arrays in the file.
+    """
+
+    def __init__(self, snapshot, offset):
+        self.snapshot = snapshot
+        self.offsets = {}
+        count = COUNT.unpack_from(snapshot.buffer, offset)[0]
+        position = offset + COUNT.size
+        for _ in range(count):
+            key, length = struct.unpack_from('<II', snapshot.buffer, position)
+            self.offsets[snapshot.string(key)] = (position + 8, length)
+            position += 8 + 4 * length
+
+    def __getitem__(self, sort_key):
+        offset, length = self.offsets[sort_key]
+        return SnapshotRankArray(self.snapshot, offset, length)
+
+    def __iter__(self):
+        return iter(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets)
+
+
+class SnapshotRankArray(Sequence):
+    """
+    One rank array of a snapshot. IMDb IDs are decoded when they are read,
+    so walking a few positions from either end decodes only those.
+
+    Parameters
+    ----------
+    snapshot : TreeSnapshot
+        The snapshot the array belongs to.
+    offset : int
+        The position of the movie numbers in the file.
+    length : int
+        The number of movies.
+    """
+
+    def __init__(self, snapshot, offset, length):
+        self.snapshot = snapshot
+        self.offset = offset
+        self.length = length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError(index)
+        number = COUNT.unpack_from(self.snapshot.buffer, self.offset + COUNT.size * index)[0]
+        return self.snapshot['movies'].movie_id(number)
+
+    def chunks(self, starts):
+        """
+        Decode the array in chunks of RANK_CHUNK numbers.
+
+        Parameters
+        ----------
+        starts : iterable of int
+            The first positions of the chunks, in the order to decode them.
+
+        Yields
+        ------
+        list of str
+            The IMDb IDs of each chunk, in ascending order.
+        """
+        movies = self.snapshot['movies']
+        for start in starts:
+            numbers = self.snapshot.unpack_numbers(self.offset + COUNT.size * start, min(RANK_CHUNK, self.length - start))
+            yield [movies.movie_id(number) for number in numbers]
+
+    def __iter__(self):
+        for chunk in self.chunks(range(0, self.length, RANK_CHUNK)):
+            yield from chunk
+
+    def __reversed__(self):
+        for chunk in self.chunks(reversed(range(0, self.length, RANK_CHUNK))):
+            yield from reversed(chunk)
+
+    def __len__(self):
+        return self.length
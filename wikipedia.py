@@ -0,0 +1,324 @@
+"""
+############################## Final Projec: Wikipedia ############################
+
+Wikipedia summaries of movies, fetched one at a time or in batches, through
+the response cache, and prefetched on background threads.
+
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+import requests
+
+from profiling import timer
+
+WIKIPEDIA_ENDPOINT = "https://en.wikipedia.org/w/api.php"
+
+# The extracts API returns at most 20 intro extracts per request
+WIKIPEDIA_BATCH_SIZE = 20
+
+# Seconds to wait for a response of the Wikipedia API
+WIKIPEDIA_TIMEOUT = 10
+
+# Number of prefetched titles kept by a SummaryPrefetcher
+MAX_PREFETCHED = 1024
+
+def wikipedia_params(titles):
+    """
+    Build the Wikipedia API query for the intro extracts of some pages.
+
+    Parameters
+    ----------
+    titles : list of str
+        The page titles, at most WIKIPEDIA_BATCH_SIZE.
+
+    Returns
+    -------
+    dict
+        The query string parameters.
+    """
+    return {
+        "action": "query",
+        "format": "json",
+        "titles": "|".join(titles),
+        "prop": "extracts",
+        "exintro": True,
+        "explaintext": True,
+        "exlimit": len(titles),
+        "redirects": 1,
+    }
+
+def get_wikipedia_summary(movie_title, cache=None):
+    """
+    Fetches the Wikipedia summary for a given movie title.
+
+    This function queries the Wikipedia API to retrieve the introductory
+    extract of a Wikipedia page corresponding to the provided movie title.
+    If the data is successfully fetched and a summary is available, it is returned.
+    Otherwise, appropriate error messages are printed, and an empty string is returned.
+
+    Parameters
+    ----------
+    movie_title : str
+        The title of the movie for which the Wikipedia summary is to be fetched.
+    cache : ResponseCache, optional
+        The response cache to look the summary up in first. Found extracts and
+        titles without an extract are both stored in it.
+
+    Returns
+    -------
+    str
+        The introductory extract of the Wikipedia page of the movie, if available.
+        Returns an empty string if no extract is found or if there's an error in data fetching.
+
+    Notes
+    -----
+    The function makes an HTTP GET request to the Wikipedia API. Ensure that the
+    network connection is active while using this function. If the movie title does
+    not correspond to a Wikipedia page, or if there is an issue with the API request,
+    the function will print an error message and return an empty string.
+    """
+    endpoint = WIKIPEDIA_ENDPOINT
+    params = wikipedia_params([movie_title])
+    if cache is not None:
+        key = cache.make_key(endpoint, params)
+        hit, summary = cache.get(key)
+        if hit:
+            if not summary:
+                print(f"No summary available for '{movie_title}'.")
+            return summary
+
+    try:
+        with timer('http.en.wikipedia.org'):
+            data = requests.get(endpoint, params=params, timeout=WIKIPEDIA_TIMEOUT).json()
+    except (requests.RequestException, ValueError):
+        data = {}
+
+    # Check if the 'pages' field is in the response and if it contains data
+    if "query" in data and "pages" in data["query"]:
+        page = next(iter(data["query"]["pages"].values()))
+        summary = page.get("extract", "")
+        if cache is not None:
+            cache.set(key, summary, negative=not summary)
+        # Check if a page with a valid extract was found
+        if summary:
+            return summary
+        else:
+            print(f"No summary available for '{movie_title}'.")
+    else:
+        print(f"Failed to fetch data for '{movie_title}'.")
+
+    return ""
+
+def get_wikipedia_summaries(movie_titles, cache=None):
+    """
+    Fetch the Wikipedia summaries of several movies with batched requests.
+
+    Up to WIKIPEDIA_BATCH_SIZE pipe-separated titles are sent per request.
+    Titles found in the cache are not requested, and every result is stored
+    under the same key get_wikipedia_summary uses for that title. Nothing
+    is printed, so this is safe to run in the background.
+
+    Parameters
+    ----------
+    movie_titles : list of str
+        The titles of the movies.
+    cache : ResponseCache, optional
+        The response cache shared with get_wikipedia_summary.
+
+    Returns
+    -------
+    dict
+        Title -> introductory extract, an empty string if there is none.
+        Titles whose request failed are left out.
+    """
+    summaries = {}
+    missing = []
+    for title in dict.fromkeys(movie_titles):
+        if cache is not None:
+            hit, summary = cache.get(cache.make_key(WIKIPEDIA_ENDPOINT, wikipedia_params([title])))
+            if hit:
+                summaries[title] = summary
+                continue
+        missing.append(title)
+
+    for start in range(0, len(missing), WIKIPEDIA_BATCH_SIZE):
+        batch = missing[start:start + WIKIPEDIA_BATCH_SIZE]
+        try:
+            with timer('http.en.wikipedia.org.batch'):
+                data = requests.get(WIKIPEDIA_ENDPOINT, params=wikipedia_params(batch),
+                                    timeout=WIKIPEDIA_TIMEOUT).json()
+        except (requests.RequestException, ValueError):
+            continue
+        if "query" not in data or "pages" not in data["query"]:
+            continue
+
+        # Follow the title normalizations and redirects back to the requested titles
+        query = data["query"]
+        normalized = {entry["from"]: entry["to"] for entry in query.get("normalized", [])}
+        redirects = {entry["from"]: entry["to"] for entry in query.get("redirects", [])}
+        extracts = {page["title"]: page.get("extract", "") for page in query["pages"].values()}
+        for title in batch:
+            page_title = normalized.get(title, title)
+            page_title = redirects.get(page_title, page_title)
+            summary = extracts.get(page_title, "")
+            summaries[title] = summary
+            if cache is not None:
+                cache.set(cache.make_key(WIKIPEDIA_ENDPOINT, wikipedia_params([title])), summary, negative=not summary)
+
+    return summaries
+
+class SummaryPrefetcher:
+    """
+    Fetch Wikipedia summaries on background threads ahead of the user.
+
+    A prefetch is dropped once its summary is read, or when its batch
+    fails, so the title is fetched again on the next request. At most
+    MAX_PREFETCHED prefetches are kept, the oldest are dropped first.
+
+    Parameters
+    ----------
+    cache : ResponseCache, optional
+        The response cache shared with get_wikipedia_summary.
+    max_workers : int
+        The number of batched requests in flight at once.
+    """
+
+    def __init__(self, cache=None, max_workers=4):
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        # Title -> the future of its batch, in the order they were started
+        self.futures = OrderedDict()
+        self.lock = threading.Lock()
+
+    def prefetch(self, movie_titles):
+        """
+        Start fetching the summaries of titles that are not fetched yet.
+
+        Parameters
+        ----------
+        movie_titles : list of str
+            The titles, most likely to be picked first.
+        """
+        started = []
+        with self.lock:
+            titles = [title for title in dict.fromkeys(movie_titles) if title not in self.futures]
+            for start in range(0, len(titles), WIKIPEDIA_BATCH_SIZE):
+                batch = titles[start:start + WIKIPEDIA_BATCH_SIZE]
+                future = self.executor.submit(get_wikipedia_summaries, batch, self.cache)
+                for title in batch:
+                    self.futures[title] = future
+                started.append((batch, future))
+            while len(self.futures) > MAX_PREFETCHED:
+                self.futures.popitem(last=False)
+        # Outside the lock, a callback runs at once if its batch is done already
+        for batch, future in started:
+            future.add_done_callback(lambda future, batch=batch: self.forget_failed(batch, future))
+
+    def forget_failed(self, batch, future):
+        """
+        Drop the prefetches of the titles a batch could not fetch.
+
+        Parameters
+        ----------
+        batch : list of str
+            The titles of the batch.
+        future : concurrent.futures.Future
+            The finished future of the batch.
+        """
+        if future.cancelled() or future.exception() is not None:
+            failed = batch
+        else:
+            summaries = future.result()
+            failed = [title for title in batch if title not in summaries]
+        with self.lock:
+            for title in failed:
+                if self.futures.get(title) is future:
+                    del self.futures[title]
+
+    def take(self, movie_title):
+        """
+        Get the prefetched summary of a title, and drop its prefetch.
+
+        Parameters
+        ----------
+        movie_title : str
+            The title of the movie.
+
+        Returns
+        -------
+        str or None
+            The summary, an empty string if the page has none, or None if
+            the title was not prefetched or its batch failed.
+        """
+        with self.lock:
+            future = self.futures.pop(movie_title, None)
+        if future is None:
+            return None
+        try:
+            return future.result().get(movie_title)
+        except (requests.RequestException, CancelledError):
+            return None
+
+    def ready(self, movie_title):
+        """
+        Check whether the summary of a title can be returned without waiting.
+        """
+        future = self.futures.get(movie_title)
+        return future is not None and future.done()
+
+    def get_first(self, page_titles):
+        """
+        Get the first available summary among alternative page titles.
+
+        Titles that were not prefetched, or whose prefetch failed, are
+        fetched together in one batched request.
+
+        Parameters
+        ----------
+        page_titles : list of str
+            The page titles to try, most precise first.
+
+        Returns
+        -------
+        str
+            The summary of the first title that has one, an empty string if none does.
+        """
+        prefetched = {title: self.take(title) for title in page_titles}
+        summaries = get_wikipedia_summaries([title for title, summary in prefetched.items() if summary is None],
+                                            self.cache)
+        for title in page_titles:
+            summary = prefetched[title] if prefetched[title] is not None else summaries.get(title)
+            if summary:
+                return summary
+        return ""
+
+    def get(self, movie_title):
+        """
+        Get the summary of a title, from a prefetch if one was started.
+
+        Parameters
+        ----------
+        movie_title : str
+            The title of the movie.
+
+        Returns
+        -------
+        str
+            The summary, or an empty string if none is available.
+        """
+        summary = self.take(movie_title)
+        if summary:
+            return summary
+        if summary == "":
+            print(f"No summary available for '{movie_title}'.")
+            return ""
+        return get_wikipedia_summary(movie_title, self.cache)
+
+    def close(self):
+        """
+        Stop the background threads, dropping pending prefetches.
+        """
+        self.executor.shutdown(wait=False, cancel_futures=True)